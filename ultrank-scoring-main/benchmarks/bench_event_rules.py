@@ -0,0 +1,104 @@
+"""Compares the compiled event classifier against the original if-chain, and checks that they agree.
+
+Run from the ultrank-scoring-main directory:
+ python benchmarks/bench_event_rules.py [events.csv ...]
+
+Pass one or more `events.csv` files from earlier searches to use real tournament and
+event names. Without them, a synthetic corpus is generated.
+"""
+
+import csv
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ultrank_rules import EventClassifier, DEFAULT_EVENT_RULES
+
+sample_tournaments = ['Smash Ultimate Summit', 'Genesis', 'Battle of BC', 'Kagaribi', 'Tuesday Tussle', 'Arcadian Cup',
+                      'Smash Monthly', 'Collision', 'The Big House', 'Weekly Warriors', 'Port Priority', 'マエスマ',
+                      'Get On My Level', 'Low Tier City', 'Riptide', 'Supernova', 'Frostbite', 'Shine', 'DreamHack']
+sample_events = ['Ultimate Singles', 'Ultimate Doubles', 'Redemption Bracket', 'Amateur Bracket', 'Squad Strike',
+                 'Random Singles', 'Ladder', 'Waitlist', 'Pro Bracket', 'Amiibo Tournament', 'HDR Singles',
+                 'Crew Battle', 'Singles', 'Main Event', 'Resurrection', 'Bracket Buster', 'CPU Tournament']
+
+
+def reference_rule(tournament_name, event_name):
+    """The original chain of checks from retrieve_event_slugs, returning the rule pattern that fires."""
+
+    for pattern in ['weekly', 'weeklies', 'arcadian']:
+        if tournament_name.lower().find(pattern) != -1 or event_name.lower().find(pattern) != -1:
+            return pattern
+
+    for pattern in ['ladder', 'redemption', 'resurrection', 'buster', 'amateur', 'squad', 'random', 'cpu', 'amiibo',
+                    'hdr', 'wait']:
+        if event_name.lower().find(pattern) != -1:
+            return pattern
+
+    if tournament_name.lower().find('monthly') != -1 or event_name.lower().find('monthly') != -1:
+        return 'monthly'
+
+    return None
+
+
+def load_corpus(paths):
+    corpus = []
+
+    for path in paths:
+        with open(path, newline='', encoding='utf-8') as events_file:
+            for row in csv.DictReader(events_file):
+                corpus.append((row['Tournament'], row['Event']))
+
+    return corpus
+
+
+def synthetic_corpus(size, rng):
+    return [('{} {}'.format(rng.choice(sample_tournaments), rng.randint(1, 200)), rng.choice(sample_events))
+            for _ in range(size)]
+
+
+def classify_all(classifier, corpus):
+    results = []
+    last_tournament = None
+    tournament_match = None
+
+    for tournament_name, event_name in corpus:
+        if tournament_name != last_tournament:
+            tournament_match = classifier.match_tournament(tournament_name)
+            last_tournament = tournament_name
+
+        rule = classifier.classify(event_name, tournament_match)
+        results.append(rule.pattern if rule is not None else None)
+
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        corpus = load_corpus(sys.argv[1:])
+    else:
+        corpus = synthetic_corpus(200000, random.Random(0))
+
+    classifier = EventClassifier(DEFAULT_EVENT_RULES)
+
+    start = time.perf_counter()
+    expected = [reference_rule(tournament_name, event_name) for tournament_name, event_name in corpus]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = classify_all(classifier, corpus)
+    compiled_time = time.perf_counter() - start
+
+    mismatches = [(pair, want, got) for pair, want, got in zip(corpus, expected, actual) if want != got]
+
+    print('{} names: if-chain {:.4f}s, compiled {:.4f}s, {:.1f}x'.format(
+        len(corpus), reference_time, compiled_time, reference_time / compiled_time if compiled_time > 0 else float('inf')))
+    print('{} mismatches'.format(len(mismatches)))
+
+    for pair, want, got in mismatches[:20]:
+        print('  {} / {}: expected {}, got {}'.format(pair[0], pair[1], want, got))
+
+    if len(mismatches) > 0:
+        sys.exit(1)
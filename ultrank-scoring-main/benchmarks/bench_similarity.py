@@ -0,0 +1,84 @@
+"""Compares the batched similarity check against the original per-tournament loop.
+
+Run from the ultrank-scoring-main directory:
+ python benchmarks/bench_similarity.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Levenshtein import jaro_winkler
+from ultrank_similarity import similarity_rows
+
+MINIMUM_JARO_SIMILARITY = 0.8
+
+words = ['smash', 'ultimate', 'weekly', 'tuesday', 'thursday', 'friday', 'night', 'fights', 'brawl', 'bash', 'showdown',
+         'arena', 'clash', 'collegiate', 'open', 'invitational', 'battle', 'of', 'the', 'bay', 'coast', 'north', 'south',
+         'monthly', 'series', 'league', 'cup', 'masters', 'regional', 'local']
+
+
+def random_word(rng):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+
+
+def make_names(count, rng):
+    """Builds tournament names from a few common words and many unique ones, so most pairs are dissimilar."""
+
+    return ['{} {} #{}'.format(random_word(rng), ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3))),
+                               rng.randint(1, 300))
+            for _ in range(count)]
+
+
+def loop_check(candidates, history):
+    """The original check: a Python loop per candidate that stops at the first similar name."""
+
+    matches = 0
+
+    for candidate in candidates:
+        for name in history:
+            if jaro_winkler(candidate, name, score_cutoff=MINIMUM_JARO_SIMILARITY) != 0:
+                matches += 1
+                break
+
+    return matches
+
+
+def batched_check(candidates, history):
+    return len([row for row in similarity_rows(candidates, history, MINIMUM_JARO_SIMILARITY) if len(row) > 0])
+
+
+def run(num_candidates, history_size, repeat=3):
+    rng = random.Random(num_candidates * 100003 + history_size)
+    history = make_names(history_size, rng)
+
+    # About one in ten candidates is a new iteration of a series in the history
+    candidates = make_names(num_candidates, rng)
+    for index in range(0, num_candidates, 10):
+        candidates[index] = history[rng.randrange(history_size)].rsplit('#', 1)[0] + '#301'
+
+    timings = {}
+    for label, check in [('loop', loop_check), ('batched', batched_check)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            matches = check(candidates, history)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[label] = (best, matches)
+
+    return timings
+
+
+if __name__ == '__main__':
+    for num_candidates, history_size in [(10, 100), (50, 500), (200, 1000), (1000, 2000)]:
+        timings = run(num_candidates, history_size)
+        loop_time, loop_matches = timings['loop']
+        batched_time, batched_matches = timings['batched']
+
+        print('{} candidates x {} history: loop {:.4f}s ({} matches), batched {:.4f}s ({} matches), {:.1f}x'.format(
+            num_candidates, history_size, loop_time, loop_matches, batched_time, batched_matches,
+            loop_time / batched_time if batched_time > 0 else float('inf')))
@@ -0,0 +1,393 @@
+"""Times the tiering and search hot paths on synthetic data at several sizes and writes the timings as JSON.
+
+Run from the ultrank-scoring-main directory:
+ python benchmarks/bench_suite.py [--quick] [--out benchmark_results.json] [--compare earlier.json]
+
+Measures:
+ - read_players / read_regions loading CSVs of 1k-50k players and 1k-10k regions
+ - get_dqs over 10k-100k sets, replayed through send_request page by page
+ - Tournament.score player and tag matching for 64-8,192 entrants against 1k-50k players
+ - find_region for a batch of addresses over 1k-10k regions
+ - search classification (series index, weekly checks and event rules) of 1k-5k tournaments, starting
+   with no owner histories, which are downloaded through send_request from canned pages
+
+Everything runs against generated data in a temporary directory, so no API key, CSVs
+or network access are needed. `--quick` only runs the smaller sizes. With `--compare`,
+each timing is printed next to the earlier one and the script exits with status 1 if
+any benchmark is more than `--tolerance` times slower.
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+REPO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+sys.path.insert(0, REPO_DIRECTORY)
+
+PLAYER_SIZES = [1000, 10000, 50000]
+REGION_SIZES = [1000, 10000]
+SET_SIZES = [10000, 50000, 100000]
+ENTRANT_SIZES = [64, 512, 2048, 8192]
+TOURNAMENT_SIZES = [1000, 5000]
+
+SETS_PER_PAGE = 50
+
+# Share of entrants that are valued by id, or only match a valued player's tag
+VALUED_SHARE = 0.3
+TAG_ONLY_SHARE = 0.01
+DQ_SHARE = 0.02
+
+EVENT_DATE = datetime.date(2025, 6, 1)
+
+words = ['smash', 'ultimate', 'weekly', 'tuesday', 'thursday', 'friday', 'night', 'fights', 'brawl', 'bash', 'showdown',
+         'arena', 'clash', 'collegiate', 'open', 'invitational', 'battle', 'of', 'the', 'bay', 'coast', 'north', 'south',
+         'monthly', 'series', 'league', 'cup', 'masters', 'regional', 'local']
+event_names = ['Ultimate Singles', 'Ultimate Doubles', 'Redemption Bracket', 'Amateur Bracket', 'Squad Strike', 'Ladder',
+               'Waitlist', 'Pro Bracket', 'Main Event', 'Singles']
+countries = ['us', 'ca', 'mx', 'jp', 'gb', 'fr', 'de', 'au']
+
+
+def player_tag(index):
+    return 'player{}'.format(index)
+
+
+def write_dataset(directory, num_players, num_regions, rng):
+    """Writes the four dataset CSVs with `num_players` players and `num_regions` regions to `directory`."""
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with open(os.path.join(directory, 'ultrank_players.csv'), mode='w', newline='', encoding='utf-8') as players_file:
+        writer = csv.writer(players_file)
+        writer.writerow(['Player', 'Start.gg Num ID', 'Start.gg Hex ID', 'Points', 'Category', 'Note', 'Start Date', 'End Date'])
+
+        for index in range(num_players):
+            # Some players have a value that changes partway through
+            writer.writerow([player_tag(index), index + 1, '{:08x}'.format(index), rng.choice([5, 10, 25, 50, 100]),
+                             'Top Player', 'Rank {}'.format(index + 1), '', '2025-01-01' if index % 10 == 0 else ''])
+            if index % 10 == 0:
+                writer.writerow([player_tag(index), index + 1, '{:08x}'.format(index), rng.choice([5, 10, 25]),
+                                 'Top Player', 'Rank {}'.format(index + 1), '2025-01-01', ''])
+
+    with open(os.path.join(directory, 'ultrank_tags.csv'), mode='w', newline='', encoding='utf-8') as tags_file:
+        writer = csv.writer(tags_file)
+        writer.writerow(['Player', 'Alternative Tags'])
+
+        for index in range(0, num_players, 20):
+            writer.writerow([player_tag(index), 'alt{}'.format(index)])
+
+    with open(os.path.join(directory, 'ultrank_invitational.csv'), mode='w', newline='', encoding='utf-8') as invit_file:
+        writer = csv.writer(invit_file)
+        writer.writerow(['Rank', 'Name', 'Hex', 'Num', 'Additional Points', 'Start Date', 'End Date'])
+
+        for index in range(min(num_players, 100)):
+            writer.writerow([index + 1, player_tag(index), '{:08x}'.format(index), index + 1, 100 - index, '', ''])
+
+    with open(os.path.join(directory, 'ultrank_regions.csv'), mode='w', newline='', encoding='utf-8') as regions_file:
+        writer = csv.writer(regions_file)
+        writer.writerow(['Note', 'Multiplier', 'Entity', 'country_code', 'ISO3166-2', 'county', 'city', 'state_district',
+                         'jp-postal-code', 'Start Date', 'End Date'])
+
+        writer.writerow(['Default', 1, 'World', '', '', '', '', '', '', '', ''])
+        for index in range(num_regions - 1):
+            country = countries[index % len(countries)]
+            writer.writerow(['Region {}'.format(index), rng.choice([1, 2, 3]), country, country,
+                             '{}-{}'.format(country.upper(), index % 50), 'County {}'.format(index % 200), '', '', '',
+                             '', ''])
+
+
+def random_address(rng):
+    country = rng.choice(countries)
+
+    return {'country_code': country, 'ISO3166-2-lvl4': '{}-{}'.format(country.upper(), rng.randrange(50)),
+            'county': 'County {}'.format(rng.randrange(200)), 'city': 'City', 'postcode': '{:07d}'.format(rng.randrange(10 ** 7))}
+
+
+def synthetic_sets(num_sets, num_entrants, rng):
+    """Builds completed sets between random entrants, as the sets query returns them. About 2% are DQs."""
+
+    def slot(entrant, score):
+        return {'entrant': {'id': entrant, 'participants': [{'player': {'id': entrant, 'gamerTag': player_tag(entrant)}}]},
+                'standing': {'stats': {'score': {'value': score}}}}
+
+    sets = []
+    for _ in range(num_sets):
+        winner, loser = rng.sample(range(1, num_entrants + 1), 2)
+        dq = rng.random() < DQ_SHARE
+        sets.append({'wPlacement': 1, 'winnerId': winner,
+                     'slots': [slot(winner, 0 if dq else 3), slot(loser, -1 if dq else rng.randrange(3))]})
+
+    return sets
+
+
+def replay_pages(sets):
+    """Returns a stand-in for send_request that answers the sets query from `sets`, one page at a time."""
+
+    total_pages = (len(sets) + SETS_PER_PAGE - 1) // SETS_PER_PAGE
+
+    def send_request(query, variables, quiet=False):
+        page = json.loads(variables)['pageNum']
+        nodes = sets[(page - 1) * SETS_PER_PAGE:page * SETS_PER_PAGE]
+
+        return {'data': {'event': {'sets': {'pageInfo': {'page': page, 'totalPages': total_pages}, 'nodes': nodes}}}}
+
+    return send_request
+
+
+def replay_owner_pages(tournaments, histories):
+    """Returns a stand-in for send_request that answers owner tournament queries from the owners' histories
+    and their tournaments in the search window, newest first, one page at a time."""
+
+    owners = {tournament['slug']: tournament['owner']['id'] for tournament in tournaments}
+
+    owned = {}
+    for owner, history in histories.items():
+        owned[owner] = [{'startAt': start_at, 'name': name, 'slug': slug, 'owner': {'id': owner}, 'hasOfflineEvents': offline}
+                        for start_at, name, slug, offline in history]
+    for tournament in tournaments:
+        owned[tournament['owner']['id']].append({'startAt': tournament['startAt'], 'name': tournament['name'],
+                                                 'slug': tournament['slug'], 'owner': tournament['owner'],
+                                                 'hasOfflineEvents': True})
+    for nodes in owned.values():
+        nodes.sort(key=lambda node: -node['startAt'])
+
+    def send_request(query, variables, quiet=False):
+        variables = json.loads(variables)
+        nodes = owned[owners[variables['tournamentSlug']]]
+        page, per_page = variables['pageNum'], variables['perPage']
+
+        return {'data': {'tournament': {'owner': {'tournaments': {
+            'pageInfo': {'totalPages': max(1, (len(nodes) + per_page - 1) // per_page)},
+            'nodes': nodes[(page - 1) * per_page:page * per_page]}}}}}
+
+    return send_request
+
+
+def event_inputs(num_entrants, num_players, rng):
+    """Builds `Tournament.from_inputs` inputs for an event where some entrants are valued players."""
+
+    participants = []
+    for index in range(num_entrants):
+        roll = rng.random()
+
+        if roll < VALUED_SHARE:
+            player = rng.randrange(num_players)
+            participants.append([player + 1, player_tag(player)])
+        elif roll < VALUED_SHARE + TAG_ONLY_SHARE:
+            # An account the dataset doesn't know, using a valued player's tag
+            participants.append([10 ** 8 + index, player_tag(rng.randrange(num_players))])
+        else:
+            participants.append([10 ** 9 + index, 'unranked{}'.format(index)])
+
+    dq_list = [[id_, id_, tag, 1] for id_, tag in rng.sample(participants, max(1, int(num_entrants * DQ_SHARE)))]
+
+    return {'event_slug': 'tournament/bench/event/ultimate-singles', 'tournament_name': 'Bench', 'event_name': 'Ultimate Singles',
+            'start_time': EVENT_DATE.isoformat(), 'address': {'country_code': 'us', 'ISO3166-2-lvl4': 'US-1'},
+            'phases': [{'id': 1, 'name': 'Bracket', 'state': 'COMPLETED', 'isExhibition': False}],
+            'total_entrants': num_entrants, 'total_dqs': -1, 'participants': participants, 'dq_list': dq_list}
+
+
+def synthetic_tournaments(count, rng):
+    """Builds search results for `count` tournaments run by a few hundred owners, with their owner histories."""
+
+    base = int(datetime.datetime(2025, 6, 1).timestamp())
+    num_owners = max(1, count // 5)
+    series = {owner: ' '.join(rng.choice(words) for _ in range(rng.randint(2, 3))) for owner in range(num_owners)}
+
+    tournaments = []
+    histories = {}
+
+    for index in range(count):
+        owner = rng.randrange(num_owners)
+        start_at = base + rng.randrange(30 * 24 * 60 * 60)
+        name = '{} #{}'.format(series[owner], rng.randint(1, 300)) if rng.random() < 0.5 else \
+            '{} {}'.format(' '.join(rng.choice(words) for _ in range(3)), index)
+        slug = 'tournament/bench-{}'.format(index)
+
+        events = [{'name': rng.choice(event_names), 'slug': '{}/event/event-{}'.format(slug, event), 'type': 1,
+                   'videogame': {'id': 1386}, 'numEntrants': rng.randint(8, 400)} for event in range(rng.randint(1, 6))]
+
+        tournaments.append({'name': name, 'slug': slug, 'startAt': start_at, 'events': events,
+                            'owner': {'id': owner, 'discriminator': 'owner{}'.format(owner)}})
+
+        histories.setdefault(owner, []).append([start_at - 7 * 24 * 60 * 60, '{} #0'.format(series[owner]),
+                                                'tournament/bench-history-{}'.format(index), True])
+
+    return tournaments, histories
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return {'best': min(timings), 'mean': sum(timings) / len(timings), 'repeat': repeat}
+
+
+def run_benchmarks(directory, quick, repeat):
+    # Both read their key and CSVs when imported
+    # Each case seeds its own generator, so a size gets the same data with or without --quick
+    import ultrank_tiering
+    import ultrank_search
+
+    results = []
+
+    def record(name, params, timing):
+        results.append(dict({'name': name, 'params': params}, **timing))
+        print('{:<24} {:<40} best {:.4f}s, mean {:.4f}s'.format(name, json.dumps(params), timing['best'], timing['mean']))
+
+    def sizes(all_sizes):
+        return all_sizes[:2] if quick else all_sizes
+
+    # Loading the CSVs
+    for num_players in sizes(PLAYER_SIZES):
+        dataset_directory = os.path.join(directory, 'players-{}'.format(num_players))
+        write_dataset(dataset_directory, num_players, 10, random.Random('players-{}'.format(num_players)))
+
+        record('read_players', {'players': num_players},
+               measure(lambda: ultrank_tiering.read_players(dataset_directory), repeat))
+
+    for num_regions in sizes(REGION_SIZES):
+        dataset_directory = os.path.join(directory, 'regions-{}'.format(num_regions))
+        write_dataset(dataset_directory, 10, num_regions, random.Random('regions-{}'.format(num_regions)))
+
+        record('read_regions', {'regions': num_regions},
+               measure(lambda: ultrank_tiering.read_regions(dataset_directory), repeat))
+
+    # get_dqs over replayed pages of sets
+    send_request = ultrank_tiering.send_request
+    try:
+        for num_sets in sizes(SET_SIZES):
+            ultrank_tiering.send_request = replay_pages(synthetic_sets(num_sets, 2048, random.Random('sets-{}'.format(num_sets))))
+            record('get_dqs', {'sets': num_sets},
+                   measure(lambda: ultrank_tiering.get_dqs('tournament/bench/event/ultimate-singles', [1]), repeat))
+    finally:
+        ultrank_tiering.send_request = send_request
+
+    # Player and tag matching
+    for num_players in sizes(PLAYER_SIZES):
+        dataset_directory = os.path.join(directory, 'players-{}'.format(num_players))
+        players, tags = ultrank_tiering.read_players(dataset_directory)
+        regions = ultrank_tiering.read_regions(dataset_directory)
+        dataset = ultrank_tiering.Dataset(players, tags, regions, 'bench')
+
+        for num_entrants in sizes(ENTRANT_SIZES):
+            inputs = event_inputs(num_entrants, num_players, random.Random('score-{}-{}'.format(num_entrants, num_players)))
+            tournament = ultrank_tiering.Tournament.from_inputs(inputs)
+            record('score', {'entrants': num_entrants, 'players': num_players},
+                   measure(lambda: tournament.score(dataset), repeat))
+
+    # Region resolution
+    for num_regions in sizes(REGION_SIZES):
+        regions = ultrank_tiering.read_regions(os.path.join(directory, 'regions-{}'.format(num_regions)))
+        rng = random.Random('addresses')
+        addresses = [random_address(rng) for _ in range(100)]
+
+        record('region_resolution', {'regions': num_regions, 'addresses': len(addresses)},
+               measure(lambda: [ultrank_tiering.find_region(regions, address, EVENT_DATE) for address in addresses], repeat))
+
+    # Search classification, downloading owner histories from replayed pages as a first search would
+    send_request = ultrank_search.send_request
+    try:
+        for num_tournaments in sizes(TOURNAMENT_SIZES):
+            tournaments, histories = synthetic_tournaments(num_tournaments, random.Random('tournaments-{}'.format(num_tournaments)))
+            ultrank_search.send_request = replay_owner_pages(tournaments, histories)
+            window_start = min(tournament['startAt'] for tournament in tournaments)
+
+            def classify_all():
+                ultrank_search.owner_histories.histories = {}
+                ultrank_search.owner_histories.begin(window_start - ultrank_search.WEEKLY_LOOKBACK_DAYS * 24 * 60 * 60)
+
+                series_index = ultrank_search.build_series_index(tournaments)
+                similarity_check = ultrank_search.WeeklySimilarityCheck(tournaments)
+                event_classifier = ultrank_search.EventClassifier(ultrank_search.load_event_rules())
+
+                for tournament in tournaments:
+                    ultrank_search.classify_tournament(tournament, series_index, similarity_check, event_classifier)
+
+            record('classification', {'tournaments': num_tournaments}, measure(classify_all, repeat))
+    finally:
+        ultrank_search.send_request = send_request
+
+    return results
+
+
+def compare(results, earlier_path, tolerance):
+    """Prints each timing against the earlier run's and returns the benchmarks that got slower than `tolerance` allows."""
+
+    with open(earlier_path, encoding='utf-8') as earlier_file:
+        earlier = {(result['name'], json.dumps(result['params'], sort_keys=True)): result
+                   for result in json.load(earlier_file)['results']}
+
+    regressions = []
+
+    for result in results:
+        previous = earlier.get((result['name'], json.dumps(result['params'], sort_keys=True)))
+        if previous is None:
+            continue
+
+        ratio = result['best'] / previous['best'] if previous['best'] > 0 else float('inf')
+        print('{:<24} {:<40} {:.4f}s -> {:.4f}s ({:.2f}x)'.format(
+            result['name'], json.dumps(result['params']), previous['best'], result['best'], ratio))
+
+        if ratio > tolerance:
+            regressions.append(result)
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the tiering and search hot paths on synthetic data.')
+    parser.add_argument('--out', default='benchmark_results.json', help='where to write the timings')
+    parser.add_argument('--quick', action='store_true', help='only run the smaller sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark; the best is compared')
+    parser.add_argument('--compare', metavar='PATH', help='timings from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='with --compare, how many times slower a benchmark may get before failing')
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out)
+    compare_path = os.path.abspath(args.compare) if args.compare is not None else None
+    working_directory = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        key_path = os.path.join(directory, 'smashgg.key')
+        with open(key_path, mode='w') as key_file:
+            key_file.write('benchmark')
+        os.environ['SMASHGG_KEY_FILE'] = key_path
+        os.environ['ULTRANK_DATA_DIR'] = directory
+
+        # The dataset loaded on import
+        write_dataset(directory, 100, 10, random.Random(1))
+        os.chdir(directory)
+
+        try:
+            results = run_benchmarks(directory, args.quick, args.repeat)
+        finally:
+            os.chdir(working_directory)
+
+    with open(out_path, mode='w', encoding='utf-8') as out_file:
+        json.dump({'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'quick': args.quick,
+                   'results': results}, out_file, indent=1)
+
+    print('wrote {}'.format(out_path))
+
+    if compare_path is not None:
+        regressions = compare(results, compare_path, args.tolerance)
+
+        if len(regressions) > 0:
+            print('{} benchmarks are more than {}x slower'.format(len(regressions), args.tolerance))
+            sys.exit(1)
@@ -1,13 +1,22 @@
 # Contains scripts to assist with interacting with the start.gg API.
 # Requires a file "smashgg.key" in the same directory with your start.gg API key inside.
+# Set SMASHGG_KEY_FILE to read the key from a different file instead.
 
+import collections
+import json
+import os
 import requests 
 import re 
+import threading
 import time
 
 SMASH_GG_ENDPOINT = 'https://api.smash.gg/gql/alpha'
 
-ggkeyfile = open('smashgg.key')
+# start.gg allows 80 requests per minute per key
+REQUESTS_PER_MINUTE = 80
+REQUEST_BURST = 10
+
+ggkeyfile = open(os.environ.get('SMASHGG_KEY_FILE', 'smashgg.key'))
 ggkey = ggkeyfile.read()
 ggkeyfile.close()
 ggheader = {"Authorization": "Bearer " + ggkey}
@@ -19,7 +28,161 @@ startgg_slug_regex = re.compile(
 class InvalidEventUrlException(Exception):
     pass
 
+
+class SingleFlightMemo:
+    """Memoizes fetched values by key for the lifetime of the object.
+
+    Concurrent callers asking for a key that is already being fetched wait for
+    that fetch instead of starting their own. Failed fetches aren't stored.
+    `absorbed` counts the callers that waited for another caller's fetch.
+    With `max_size`, only that many values are kept, dropping the least recently used.
+    """
+
+    def __init__(self, max_size=None):
+        self.lock = threading.Lock()
+        self.values = collections.OrderedDict()
+        self.in_flight = {}
+        self.absorbed = 0
+        self.max_size = max_size
+
+    def get(self, key, fetch):
+        while True:
+            with self.lock:
+                if key in self.values:
+                    self.values.move_to_end(key)
+                    return self.values[key]
+
+                flight = self.in_flight.get(key)
+                if flight is None:
+                    flight = threading.Event()
+                    self.in_flight[key] = flight
+                    break
+
+                self.absorbed += 1
+
+            # Another caller is fetching; wait for it, then check again
+            flight.wait()
+
+        try:
+            value = fetch()
+
+            with self.lock:
+                self.values[key] = value
+
+                if self.max_size is not None and len(self.values) > self.max_size:
+                    self.values.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.set()
+
+        return value
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.values
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+class RateLimiter:
+    """Token bucket shared by every thread sending requests.
+
+    Callers block in `acquire` until the budget allows another request, so threads
+    that send more requests slow down instead of tripping the API's rate limit.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, burst=REQUEST_BURST):
+        self.lock = threading.Lock()
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+request_budget = RateLimiter()
+
+
+class RequestCoalescer:
+    """Lets concurrent callers making the same call share one call and its result.
+
+    Unlike SingleFlightMemo, nothing is kept once the call returns, so later callers
+    get fresh data. `calls` counts the calls made and `absorbed` the callers that
+    shared one instead.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.calls = 0
+        self.absorbed = 0
+
+    def call(self, key, fetch):
+        with self.lock:
+            flight = self.in_flight.get(key)
+
+            if flight is None:
+                flight = {'done': threading.Event(), 'value': None, 'error': None}
+                self.in_flight[key] = flight
+                self.calls += 1
+                leader = True
+            else:
+                self.absorbed += 1
+                leader = False
+
+        if not leader:
+            flight['done'].wait()
+
+            if flight['error'] is not None:
+                raise flight['error']
+
+            return flight['value']
+
+        try:
+            flight['value'] = fetch()
+        except BaseException as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight['done'].set()
+
+        return flight['value']
+
+
+request_coalescer = RequestCoalescer()
+
+
 def send_request(query, variables, quiet=False):
+    """Sends a request to the startgg server.
+
+    Identical requests sent at the same time from different threads share one request,
+    and receive the same response object.
+    """
+
+    key = (query, variables if isinstance(variables, str) else json.dumps(variables, sort_keys=True))
+
+    return request_coalescer.call(key, lambda: send_uncoalesced_request(query, variables, quiet))
+
+
+def send_uncoalesced_request(query, variables, quiet=False):
     # Sends a request to the startgg server.
     progress = False
 
@@ -32,6 +195,8 @@ def send_request(query, variables, quiet=False):
             "query": query,
             "variables": variables
         }
+        request_budget.acquire()
+
         try:
             response = requests.post(
                 SMASH_GG_ENDPOINT, json=json_payload, headers=ggheader, timeout=60)
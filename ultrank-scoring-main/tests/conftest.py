@@ -0,0 +1,88 @@
+"""Sets up a scratch working directory for the tests.
+
+The scripts read the API key and the dataset CSVs as soon as they are imported, so the
+tests run in a temporary directory with a placeholder key, a one-player
+ultrank_players.csv and copies of the other CSVs. Nothing is sent to start.gg.
+"""
+
+import atexit
+import csv
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+REPO_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+sys.path.insert(0, REPO_DIRECTORY)
+
+PLAYERS_HEADER = ['Player', 'Category', 'Note', 'Start.gg Hex ID', 'Start.gg Num ID', 'Points', 'Start Date', 'End Date']
+DEFAULT_PLAYERS = [['MkLeo', 'Top', 'Rank 1', '3f297e74', '222927', '100', '', '']]
+EVENT_PLAYERS = DEFAULT_PLAYERS + [['Sparg0', 'Top', 'Rank 2', '8f7d3a9b', '1234', '90', '', ''],
+                                   ['Tweek', 'Top', 'Rank 3', '5c3ad1e0', '5678', '80', '', '']]
+
+
+def write_dataset(directory, players=DEFAULT_PLAYERS):
+    """Writes ultrank_players.csv with the given rows to `directory`, along with copies of the other CSVs."""
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for name in ['ultrank_tags.csv', 'ultrank_invitational.csv', 'ultrank_regions.csv']:
+        shutil.copy(os.path.join(REPO_DIRECTORY, name), directory)
+
+    with open(os.path.join(directory, 'ultrank_players.csv'), mode='w', newline='', encoding='utf-8') as players_file:
+        writer = csv.writer(players_file)
+        writer.writerow(PLAYERS_HEADER)
+        writer.writerows(players)
+
+
+work_directory = tempfile.mkdtemp(prefix='ultrank-tests-')
+atexit.register(shutil.rmtree, work_directory, True)
+
+write_dataset(work_directory)
+
+with open(os.path.join(work_directory, 'smashgg.key'), mode='w') as key_file:
+    key_file.write('test')
+
+os.environ['SMASHGG_KEY_FILE'] = os.path.join(work_directory, 'smashgg.key')
+os.environ['ULTRANK_DATA_DIR'] = work_directory
+os.chdir(work_directory)
+
+
+def event_inputs(slug='tournament/test/event/ultimate-singles', num_entrants=40):
+    """`Tournament.from_inputs` inputs for an event in the US with MkLeo and Sparg0 playing, Tweek DQing out
+    and someone else entered as "Sparg0"."""
+
+    participants = [[222927, 'MkLeo'], [1234, 'Sparg0'], [5678, 'Tweek'], [99, 'sparg0']]
+    participants.extend([1000 + index, 'entrant{}'.format(index)] for index in range(num_entrants - len(participants)))
+
+    return {'event_slug': slug, 'tournament_name': 'Test', 'event_name': 'Ultimate Singles',
+            'start_time': '2025-03-01', 'address': {'country_code': 'us', 'ISO3166-2-lvl4': 'US-CA'},
+            'phases': [{'id': 1, 'name': 'Bracket', 'state': 'COMPLETED', 'isExhibition': False}],
+            'total_entrants': num_entrants - 1, 'total_dqs': 1, 'participants': participants,
+            'dq_list': [[5678, 5678, 'Tweek', 2]]}
+
+
+@pytest.fixture
+def dataset_directory(tmp_path):
+    """A directory with its own copy of the dataset CSVs."""
+
+    directory = str(tmp_path / 'data')
+    write_dataset(directory)
+
+    return directory
+
+
+@pytest.fixture
+def event_dataset(tmp_path):
+    """A Dataset with the players in `event_inputs`."""
+
+    import ultrank_tiering
+
+    directory = str(tmp_path / 'event-data')
+    write_dataset(directory, EVENT_PLAYERS)
+
+    return ultrank_tiering.DatasetManager(directory).current
@@ -0,0 +1,65 @@
+import os
+
+import ultrank_bulk
+
+
+def fake_scoring(monkeypatch, statuses):
+    """Replaces scoring with a stand-in that answers each slug with a status from `statuses`."""
+
+    scored = []
+
+    def score_slug(slug, invit, cache=None):
+        scored.append(slug)
+        return {'slug': slug, 'invit': invit, 'status': statuses.get(slug, 'invalid')}, slug
+
+    monkeypatch.setattr(ultrank_bulk, 'score_slug', score_slug)
+
+    return scored
+
+
+def test_resume_reads_journaled_records_from_disk(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    slugs = [{'slug': 'tournament/a/event/{}'.format(name), 'invit': False} for name in ['one', 'two', 'three', 'four']]
+
+    scored = fake_scoring(monkeypatch, {'tournament/a/event/two': 'failed'})
+    assert list(ultrank_bulk.iter_scores(slugs, directory)) == [slug_obj['slug'] for slug_obj in slugs]
+
+    # A crash partway through writing the last record
+    with open(os.path.join(directory, ultrank_bulk.JOURNAL_FILE), mode='a', encoding='utf-8') as journal_file:
+        journal_file.write('{"slug": "tournament/a/event/four", "inv')
+
+    index = ultrank_bulk.index_journal(directory)
+    assert sorted(index) == sorted(slug_obj['slug'] for slug_obj in slugs)
+    assert all(isinstance(entry[0], int) for entry in index.values())
+
+    del scored[:]
+    slugs[2]['invit'] = True
+    results = list(ultrank_bulk.iter_scores(slugs, directory, resume=True))
+
+    # Failures and slugs whose invitational flag changed are redone
+    assert scored == ['tournament/a/event/two', 'tournament/a/event/three']
+    assert results == [slug_obj['slug'] for slug_obj in slugs]
+
+
+def test_rescore_ignores_journal(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    slugs = [{'slug': 'tournament/a/event/one', 'invit': False}]
+
+    scored = fake_scoring(monkeypatch, {})
+    list(ultrank_bulk.iter_scores(slugs, directory))
+    list(ultrank_bulk.iter_scores([dict(slugs[0], rescore=True)], directory, resume=True))
+
+    assert scored == ['tournament/a/event/one', 'tournament/a/event/one']
+
+
+def test_record_after_cut_off_line_is_kept(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+
+    with open(os.path.join(directory, ultrank_bulk.JOURNAL_FILE), mode='w', encoding='utf-8') as journal_file:
+        journal_file.write('{"slug": "tournament/a/event/one", "inv')
+
+    scored = fake_scoring(monkeypatch, {})
+    list(ultrank_bulk.iter_scores([{'slug': 'tournament/a/event/one', 'invit': False}], directory, resume=True))
+
+    assert scored == ['tournament/a/event/one']
+    assert list(ultrank_bulk.index_journal(directory)) == ['tournament/a/event/one']
@@ -0,0 +1,99 @@
+import types
+
+import pytest
+
+import ultrank_cache
+from conftest import EVENT_PLAYERS, event_inputs, write_dataset
+from ultrank_tiering import DatasetManager, Tournament
+
+SLUG = 'tournament/test/event/ultimate-singles'
+FINISHED = '[[1, "COMPLETED"]]'
+
+
+class Offline:
+    """Stands in for start.gg: the event's phase state and a count of the times it was fetched."""
+
+    def __init__(self, monkeypatch, dataset):
+        self.state = FINISHED
+        self.fetched = []
+        self.datasets = types.SimpleNamespace(current=dataset)
+
+        offline = self
+
+        class FetchlessTournament(Tournament):
+            def __init__(self, event_slug, is_invitational=False, location=True, fetch=True):
+                super().__init__(event_slug, is_invitational, location, fetch=False)
+
+                if fetch:
+                    offline.fetched.append(self.event_slug)
+                    fetched = Tournament.from_inputs(event_inputs(self.event_slug))
+                    for name in ['tournament_name', 'event_name', 'start_time', 'address', 'phases', 'total_entrants',
+                                 'total_dqs', 'participants', 'dq_list']:
+                        setattr(self, name, getattr(fetched, name))
+
+        monkeypatch.setattr(ultrank_cache, 'Tournament', FetchlessTournament)
+        monkeypatch.setattr(ultrank_cache, 'event_state', lambda slug: self.state)
+        monkeypatch.setattr(ultrank_cache, 'datasets', self.datasets)
+
+
+@pytest.fixture
+def offline(monkeypatch, event_dataset):
+    return Offline(monkeypatch, event_dataset)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ultrank_cache.ResultCache(str(tmp_path / 'cache.sqlite'))
+
+    yield cache
+
+    cache.close()
+
+
+def test_finished_event_is_fetched_once(offline, cache):
+    result = cache.tier(SLUG, False)
+    cached = cache.tier('https://www.start.gg/{}/overview'.format(SLUG), False)
+
+    assert offline.fetched == [SLUG]
+    assert cached.to_dict() == result.to_dict()
+    assert cache.stats() == {'cache_hits': 1, 'cache_rescored': 0, 'cache_misses': 1, 'cache_unfinished': 0}
+
+    # The invitational flag is part of the key, but the stored inputs are shared
+    cache.tier(SLUG, True)
+    assert offline.fetched == [SLUG]
+    assert cache.rescored == 1
+
+
+def test_new_dataset_rescores_stored_inputs(offline, cache, tmp_path):
+    before = cache.tier(SLUG, False)
+
+    directory = str(tmp_path / 'changed')
+    write_dataset(directory, [row[:5] + ['150'] + row[6:] if row[0] == 'MkLeo' else row for row in EVENT_PLAYERS])
+    offline.datasets.current = DatasetManager(directory).current
+
+    after = cache.tier(SLUG, False)
+
+    assert offline.fetched == [SLUG]
+    assert cache.rescored == 1
+    assert after.score == before.score + 50
+    assert after.dataset_version == offline.datasets.current.version
+
+
+def test_changed_phases_fetch_again(offline, cache):
+    cache.tier(SLUG, False)
+
+    offline.state = '[[1, "COMPLETED"], [2, "COMPLETED"]]'
+    cache.tier(SLUG, False)
+
+    assert offline.fetched == [SLUG, SLUG]
+    assert cache.misses == 2
+
+
+def test_unfinished_event_is_not_cached(offline, cache):
+    offline.state = None
+    cache.tier(SLUG, False)
+    cache.tier(SLUG, False)
+
+    assert offline.fetched == [SLUG, SLUG]
+    assert cache.unfinished == 2
+    assert cache.counts() == (0, {})
@@ -0,0 +1,56 @@
+import os
+
+import ultrank_tiering
+from conftest import DEFAULT_PLAYERS, write_dataset
+
+
+def test_snapshot_is_written_next_to_the_csvs(dataset_directory, tmp_path, monkeypatch):
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    players, _, _, version = ultrank_tiering.load_dataset(dataset_directory)
+
+    assert 222927 in players
+    assert os.path.exists(os.path.join(dataset_directory, ultrank_tiering.DATASET_CACHE))
+    assert os.listdir(str(elsewhere)) == []
+
+    # Loaded again from the snapshot, with the same version
+    assert ultrank_tiering.load_dataset(dataset_directory)[3] == version
+
+
+def test_version_does_not_depend_on_directory(dataset_directory, tmp_path):
+    copy = str(tmp_path / 'copy')
+    os.mkdir(copy)
+    for name in ultrank_tiering.DATASET_FILES:
+        with open(os.path.join(dataset_directory, name), 'rb') as source, open(os.path.join(copy, name), 'wb') as target:
+            target.write(source.read())
+
+    assert ultrank_tiering.hash_dataset_files(copy) == ultrank_tiering.hash_dataset_files(dataset_directory)
+
+
+def bump_mtime(path):
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload_swaps_in_changed_csvs(dataset_directory):
+    manager = ultrank_tiering.DatasetManager(dataset_directory)
+    before = manager.current
+
+    # A touched file with the same contents keeps the current version
+    players_path = os.path.join(dataset_directory, 'ultrank_players.csv')
+    bump_mtime(players_path)
+    assert not manager.reload_if_changed()
+    assert manager.current is before
+
+    write_dataset(dataset_directory, DEFAULT_PLAYERS + [['Sparg0', 'Top', 'Rank 2', '8f7d3a9b', '1234', '90', '', '']])
+    bump_mtime(players_path)
+
+    assert manager.reload_if_changed()
+    assert manager.current.version != before.version
+    assert 1234 in manager.current.players
+
+    # A calculation holding the old version still sees the old data
+    assert 1234 not in before.players
+    assert not manager.reload_if_changed()
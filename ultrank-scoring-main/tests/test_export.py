@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+
+import ultrank_export
+from conftest import EVENT_PLAYERS, event_inputs, write_dataset
+from ultrank_store import ResultStore
+from ultrank_tiering import DatasetManager, Tournament
+
+# Two events in one shard and one in another
+EVENTS = [('tournament/a/event/singles', 'US-AK'), ('tournament/b/event/singles', 'US-AK'), ('tournament/c/event/singles', 'US-NC')]
+
+
+def scored_events(dataset):
+    return [Tournament.from_inputs(dict(event_inputs(slug), address={'country_code': 'us', 'ISO3166-2-lvl4': state})).score(dataset)
+            for slug, state in EVENTS]
+
+
+def write_store(path, results):
+    store = ResultStore(path)
+    for result in results:
+        store.write(result)
+    store.close()
+
+
+def fingerprints(path):
+    connection = sqlite3.connect(path)
+    try:
+        return ultrank_export.shard_fingerprints(connection)
+    finally:
+        connection.close()
+
+
+def test_only_changed_shards_are_rebuilt(tmp_path, event_dataset):
+    store_path = str(tmp_path / 'results.sqlite')
+    directory = str(tmp_path / 'dashboard')
+    results = scored_events(event_dataset)
+    write_store(store_path, results)
+
+    assert ultrank_export.export(store_path, directory) == (2, 2)
+    assert ultrank_export.export(store_path, directory) == (0, 2)
+
+    manifest = ultrank_export.read_manifest(directory)
+    alaska = [shard for shard in manifest['shards'].values() if shard['events'] == 2][0]
+
+    # MkLeo is worth more at one event in the first shard
+    edited = str(tmp_path / 'edited')
+    write_dataset(edited, [row[:5] + ['150'] + row[6:] if row[0] == 'MkLeo' else row for row in EVENT_PLAYERS])
+    write_store(store_path, scored_events(DatasetManager(edited).current)[:1])
+
+    assert ultrank_export.export(store_path, directory) == (1, 2)
+
+    manifest = ultrank_export.read_manifest(directory)
+    rebuilt = [shard for shard in manifest['shards'].values() if shard['events'] == 2][0]
+    assert rebuilt['file'] != alaska['file']
+    assert not os.path.exists(os.path.join(directory, alaska['file']))
+
+    with open(os.path.join(directory, rebuilt['file']), encoding='utf-8') as shard_file:
+        rows = json.load(shard_file)['rows']
+    assert [row[4] for row in rows] == [results[0].score + 50, results[1].score]
+
+
+def test_fingerprints_ignore_insertion_order(tmp_path, event_dataset):
+    results = scored_events(event_dataset)
+
+    write_store(str(tmp_path / 'forward.sqlite'), results)
+    write_store(str(tmp_path / 'reversed.sqlite'), list(reversed(results)))
+
+    assert fingerprints(str(tmp_path / 'forward.sqlite')) == fingerprints(str(tmp_path / 'reversed.sqlite'))
@@ -0,0 +1,80 @@
+import pytest
+
+import ultrank_queue
+from ultrank_queue import JobQueue, MAX_ATTEMPTS
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the queue's clock with one the test moves forward."""
+
+    now = [1000000.0]
+    monkeypatch.setattr(ultrank_queue.time, 'time', lambda: now[0])
+
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.sqlite'), lease_seconds=60)
+    queue.enqueue([{'slug': 'tournament/a/event/one', 'invit': False}])
+
+    yield queue
+
+    queue.close()
+
+
+def scored(slug):
+    return {'slug': slug, 'invit': False, 'status': 'scored'}
+
+
+def test_expired_lease_is_handed_to_another_worker(queue, clock):
+    job_id, slug, _ = queue.lease('a')
+    assert queue.lease('b') is None
+
+    clock[0] += 61
+    assert queue.lease('b')[0] == job_id
+
+    # The first worker lost its lease and can't post the job any more
+    queue.complete(job_id, 'a', dict(scored(slug), status='failed'))
+    assert queue.counts() == {'leased': 1}
+
+    queue.complete(job_id, 'b', scored(slug))
+    assert list(queue.records()) == [scored(slug)]
+    assert queue.unfinished() == 0
+
+
+def test_failed_jobs_stop_after_max_attempts(queue, clock):
+    for attempt in range(MAX_ATTEMPTS):
+        job_id, slug, _ = queue.lease('a')
+        queue.complete(job_id, 'a', {'slug': slug, 'invit': False, 'status': 'failed', 'error': str(attempt)})
+
+    assert queue.lease('a') is None
+    assert [record['error'] for record in queue.records()] == [str(MAX_ATTEMPTS - 1)]
+
+
+def test_expired_leases_stop_after_max_attempts(queue, clock):
+    for _ in range(MAX_ATTEMPTS):
+        assert queue.lease('a') is not None
+        clock[0] += 61
+
+    assert queue.lease('a') is None
+    assert [record['status'] for record in queue.records()] == ['failed']
+
+
+def test_error_rolls_back(queue, clock):
+    job_id, slug, _ = queue.lease('a')
+
+    with pytest.raises(RuntimeError):
+        with queue.transaction():
+            queue.connection.execute("UPDATE jobs SET status = 'done'")
+            raise RuntimeError()
+
+    assert queue.counts() == {'leased': 1}
+
+    with pytest.raises(TypeError):
+        queue.complete(job_id, 'a', {'slug': slug, 'status': 'scored', 'result': object()})
+
+    # The queue is still usable and the job still leased
+    queue.complete(job_id, 'a', scored(slug))
+    assert queue.unfinished() == 0
@@ -0,0 +1,140 @@
+import itertools
+
+import pytest
+
+import ultrank_rules
+from ultrank_rules import DEFAULT_EVENT_RULES, EventClassifier, EventRule, SubstringMatcher, load_event_rules
+
+tournament_names = ['Genesis 10', 'Tuesday WEEKLY 12', 'Bay Area Weeklies', 'Arcadian Cup', 'Smash Monthly', 'マエスマ 5',
+                    'Ladder League', 'Redemption Island', 'Low Tier City']
+event_names = ['Ultimate Singles', 'Ultimate Doubles', 'Redemption Bracket', 'Resurrection', 'Bracket Buster',
+               'Amateur Bracket', 'Squad Strike', 'Random Singles', 'CPU Tournament', 'Amiibo Tournament', 'HDR Singles',
+               'Ultimate Ladder', 'Waitlist', 'Monthly Singles', 'Weekly Singles', 'Arcadian', 'Redemption Ladder',
+               'Amateur Waitlist', 'Singles (Weeklies)']
+
+
+def reference_rule(tournament_name, event_name):
+    """The if-chain from the search before the rule table, as (action, skip reason) or None."""
+
+    for pattern, reason in [('weekly', 'Probable Weekly (contains string "weekly")'),
+                            ('weeklies', 'Probable Weekly (contains string "weeklies")'),
+                            ('arcadian', 'Probable Arcadian (contains string "arcadian")')]:
+        if tournament_name.lower().find(pattern) != -1 or event_name.lower().find(pattern) != -1:
+            return 'skip', reason
+
+    if event_name.lower().find('ladder') != -1:
+        return 'ladder', 'Probable Side Event (contains string "ladder")'
+
+    for pattern in ['redemption', 'resurrection', 'buster', 'amateur', 'squad', 'random', 'cpu', 'amiibo', 'hdr']:
+        if event_name.lower().find(pattern) != -1:
+            return 'skip', 'Probable Side Event (contains string "{}")'.format(pattern)
+
+    if event_name.lower().find('wait') != -1:
+        return 'skip', 'Probable Waitlist (contains string "wait")'
+
+    if tournament_name.lower().find('monthly') != -1 or event_name.lower().find('monthly') != -1:
+        return 'monthly', ''
+
+    return None
+
+
+@pytest.fixture(params=['automaton', 'substring'])
+def matcher_mode(request, monkeypatch):
+    """Runs a test with pyahocorasick (when installed) and with the plain substring fallback."""
+
+    if request.param == 'automaton':
+        if ultrank_rules.ahocorasick is None:
+            pytest.skip('pyahocorasick is not installed')
+    else:
+        monkeypatch.setattr(ultrank_rules, 'ahocorasick', None)
+
+    return request.param
+
+
+def classify(classifier, tournament_name, event_name):
+    rule = classifier.classify(event_name, classifier.match_tournament(tournament_name))
+
+    return (rule.action, rule.skip_reason) if rule is not None else None
+
+
+def test_default_rules_match_if_chain(matcher_mode):
+    classifier = EventClassifier(DEFAULT_EVENT_RULES)
+
+    for tournament_name, event_name in itertools.product(tournament_names, event_names):
+        assert classify(classifier, tournament_name, event_name) == reference_rule(tournament_name, event_name), \
+            (tournament_name, event_name)
+
+
+def test_first_matching_rule_wins(matcher_mode):
+    rules = [EventRule('bar', 'event', 'skip', 'first'),
+             EventRule('foobar', 'event', 'skip', 'second'),
+             EventRule('tour', 'any', 'skip', 'tournament'),
+             EventRule('foo', 'event', 'ladder', 'last')]
+    classifier = EventClassifier(rules)
+
+    assert classify(classifier, 'Plain', 'Foobar Singles') == ('skip', 'first')
+    assert classify(classifier, 'Plain', 'Foo Singles') == ('ladder', 'last')
+    # A tournament name match only wins over event rules listed after it
+    assert classify(classifier, 'Tour Stop', 'Foo Singles') == ('skip', 'tournament')
+    assert classify(classifier, 'Tour Stop', 'Foobar Singles') == ('skip', 'first')
+    assert classify(classifier, 'Plain', 'Singles') is None
+
+
+def test_event_scope_rules_ignore_tournament_name(matcher_mode):
+    classifier = EventClassifier(DEFAULT_EVENT_RULES)
+
+    assert classify(classifier, 'Redemption Island', 'Ultimate Singles') is None
+    assert classify(classifier, 'Ladder League', 'Ultimate Singles') is None
+
+
+def test_substring_matcher_prefers_earlier_patterns(matcher_mode):
+    matcher = SubstringMatcher(['night', 'Fight', 'fight'])
+
+    assert matcher.first('Friday Night FIGHTS') == 0
+    assert matcher.first('Friday Fights') == 1
+    assert matcher.first('Saturday') is None
+    assert matcher.search('friday night')
+    assert not SubstringMatcher([]).search('anything')
+
+
+def test_skip_weekly_check_matches_baseline_loop(matcher_mode):
+    import ultrank_search
+
+    matcher = SubstringMatcher(ultrank_search.skip_weekly_check)
+    names = ['{} {}'.format(prefix, skip.upper() if index % 2 == 0 else skip.lower())
+             for index, (prefix, skip) in enumerate(itertools.product(['Smash', ''], ultrank_search.skip_weekly_check))]
+    names.extend(['Tuesday Tussle 44', 'Smash Ultimate Summit', 'Monday Night Smash', 'Bay Area Quals', ''])
+
+    for name in names:
+        expected = any(skip.lower() in name.lower() for skip in ultrank_search.skip_weekly_check)
+        assert matcher.search(name) == expected, name
+
+
+def test_load_event_rules_from_file(tmp_path):
+    path = tmp_path / 'rules.csv'
+    path.write_text('Pattern,Scope,Action,Skip Reason\n'
+                    'Crew,Event,Skip,Probable Crew Battle\n'
+                    ',any,skip,ignored\n'
+                    'Monthly, ANY ,monthly,\n', encoding='utf-8')
+
+    rules = load_event_rules(str(path))
+
+    assert [(rule.pattern, rule.scope, rule.action, rule.skip_reason) for rule in rules] == [
+        ('crew', 'event', 'skip', 'Probable Crew Battle'),
+        ('monthly', 'any', 'monthly', '')]
+
+    classifier = EventClassifier(rules)
+    assert classify(classifier, 'Genesis', 'Crew Battle') == ('skip', 'Probable Crew Battle')
+    assert classify(classifier, 'Genesis', 'Redemption Bracket') is None
+
+
+def test_load_event_rules_defaults_without_file(tmp_path):
+    assert load_event_rules(str(tmp_path / 'missing.csv')) is DEFAULT_EVENT_RULES
+
+
+def test_load_event_rules_rejects_unknown_action(tmp_path):
+    path = tmp_path / 'rules.csv'
+    path.write_text('Pattern,Scope,Action,Skip Reason\ncrew,event,ignore,\n', encoding='utf-8')
+
+    with pytest.raises(ValueError):
+        load_event_rules(str(path))
@@ -0,0 +1,78 @@
+import pytest
+
+import ultrank_scenarios
+from conftest import EVENT_PLAYERS, event_inputs, write_dataset
+from ultrank_scenarios import Scenario, ScenarioInputs, run_scenario
+from ultrank_store import ResultStore
+from ultrank_tiering import DatasetManager, Tournament
+
+# (state, date, entrants): x1, x2 and x3 regions, above and below the entrant caps, before and after the new system
+EVENTS = [('US-CA', '2024-06-01', 40), ('US-NC', '2025-03-01', 300), ('US-AK', '2025-03-01', 200),
+          ('US-AK', '2025-03-01', 12), ('US-AK', '2024-06-01', 50), ('US-NC', '2024-06-01', 70)]
+
+
+def scored_events(dataset):
+    results = []
+
+    for index, (state, date, entrants) in enumerate(EVENTS):
+        inputs = dict(event_inputs('tournament/test-{}/event/ultimate-singles'.format(index), entrants),
+                      address={'country_code': 'us', 'ISO3166-2-lvl4': state}, start_time=date)
+        results.append(Tournament.from_inputs(inputs).score(dataset))
+
+    return results
+
+
+@pytest.fixture(params=['numpy', 'plain'])
+def numpy_mode(request, monkeypatch):
+    """Runs a test with numpy (when installed) and with the plain Python fallback."""
+
+    if request.param == 'numpy':
+        if ultrank_scenarios.numpy is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(ultrank_scenarios, 'numpy', None)
+
+    return request.param
+
+
+@pytest.fixture
+def scenario_inputs(tmp_path, event_dataset):
+    results = scored_events(event_dataset)
+
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    for result in results:
+        store.write(result)
+    store.close()
+
+    return ScenarioInputs(str(tmp_path / 'results.sqlite')), results
+
+
+def by_slug(inputs, scenario_result):
+    return {slug: (score, max_score, bool(meets))
+            for slug, score, max_score, meets in zip(inputs.slugs, scenario_result.scores, scenario_result.max_scores,
+                                                     scenario_result.meets_reqs)}
+
+
+def expected(results):
+    return {result.slug: (result.score, result.max_potential_score(), result.should_count()) for result in results}
+
+
+def test_baseline_matches_tournament_score(scenario_inputs, numpy_mode):
+    inputs, results = scenario_inputs
+
+    assert len({result.region.multiplier for result in results}) == 3
+    assert by_slug(inputs, run_scenario(inputs, Scenario())) == expected(results)
+
+
+def test_player_points_match_rescoring(scenario_inputs, numpy_mode, tmp_path):
+    inputs, _ = scenario_inputs
+
+    # MkLeo up to 150, and Tweek (who DQed) up to 200
+    players = [row[:5] + [{'MkLeo': '150', 'Tweek': '200'}.get(row[0], row[5])] + row[6:] for row in EVENT_PLAYERS]
+    directory = str(tmp_path / 'edited')
+    write_dataset(directory, players)
+    rescored = scored_events(DatasetManager(directory).current)
+
+    scenario = Scenario(player_points={'222927': 150, '5678': 200})
+
+    assert by_slug(inputs, run_scenario(inputs, scenario)) == expected(rescored)
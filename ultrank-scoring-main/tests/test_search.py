@@ -0,0 +1,173 @@
+import json
+import time
+
+import pytest
+
+import ultrank_bulk
+import ultrank_search
+
+START_TIME = 1735000000
+DAY = 24 * 60 * 60
+
+
+def tournament(number):
+    # Monthlies are used without the weekly check, so nothing is fetched from start.gg
+    slug = 'tournament/smash-monthly-{}'.format(number)
+
+    return {'slug': slug, 'name': 'Smash Monthly {}'.format(number), 'startAt': START_TIME + number * DAY,
+            'owner': {'id': number, 'discriminator': 'owner{}'.format(number)},
+            'events': [{'name': 'Ultimate Singles', 'slug': '{}/event/ultimate-singles'.format(slug), 'type': 1,
+                        'videogame': {'id': 1386}, 'numEntrants': 40}]}
+
+
+@pytest.fixture
+def search_window(monkeypatch):
+    tournaments = [tournament(number) for number in range(3)]
+
+    monkeypatch.setattr(ultrank_search, 'discover_tournaments',
+                        lambda start_time, end_time, updated_after=None: list(tournaments))
+
+    return tournaments
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    """Replaces scoring with a stand-in that records each slug it is asked to score."""
+
+    slugs = []
+
+    def score_slug(slug, invit, cache=None):
+        slugs.append(slug)
+        return {'slug': slug, 'invit': invit, 'status': 'invalid'}, slug
+
+    monkeypatch.setattr(ultrank_bulk, 'score_slug', score_slug)
+
+    return slugs
+
+
+@pytest.mark.parametrize('search', [ultrank_search.search_and_score, ultrank_search.pipelined_search])
+def test_resume_skips_journaled_slugs(tmp_path, search_window, scored, search):
+    directory = str(tmp_path)
+
+    slugs = search(START_TIME, START_TIME + 7 * DAY, directory)
+    assert sorted(scored) == sorted(slugs)
+    assert len(slugs) == len(search_window)
+
+    del scored[:]
+    search(START_TIME, START_TIME + 7 * DAY, directory, resume=True)
+    assert scored == []
+
+
+@pytest.mark.parametrize('search', [ultrank_search.search_and_score, ultrank_search.pipelined_search])
+def test_incremental_rescores_changed_tournaments(tmp_path, search_window, scored, search):
+    directory = str(tmp_path)
+
+    search(START_TIME, START_TIME + 7 * DAY, directory, incremental=True)
+
+    search_window[1]['events'][0]['numEntrants'] = 41
+    del scored[:]
+    search(START_TIME, START_TIME + 7 * DAY, directory, incremental=True)
+    assert scored == [search_window[1]['events'][0]['slug']]
+
+
+class OwnerPages:
+    """Answers owner tournament queries from a list, newest first, `per_page` at a time."""
+
+    def __init__(self, monkeypatch, tournaments, per_page=2):
+        self.tournaments = tournaments
+        self.per_page = per_page
+        self.pages = 0
+
+        monkeypatch.setattr(ultrank_search, 'send_request', self.send_request)
+
+    def send_request(self, query, variables, quiet=False):
+        page = json.loads(variables)['pageNum']
+        self.pages += 1
+
+        ordered = sorted(self.tournaments, key=lambda tournament: -tournament[0])
+        nodes = [{'startAt': start_at, 'name': name, 'slug': slug, 'owner': {'id': 7}, 'hasOfflineEvents': True}
+                 for start_at, name, slug in ordered[(page - 1) * self.per_page:page * self.per_page]]
+        total_pages = max(1, -(-len(ordered) // self.per_page))
+
+        return {'data': {'tournament': {'owner': {'tournaments': {'pageInfo': {'totalPages': total_pages}, 'nodes': nodes}}}}}
+
+
+def test_owner_history_picks_up_changes_behind_future_tournament(monkeypatch):
+    now = int(time.time())
+    pages = OwnerPages(monkeypatch, [[now + 300 * DAY, 'Far Future Major', 'tournament/future'],
+                                     [now - 1 * DAY, 'Weekly 1', 'tournament/weekly-1'],
+                                     [now - 8 * DAY, 'Weekly 0', 'tournament/weekly-0'],
+                                     [now - 100 * DAY, 'Old Cup', 'tournament/old']])
+
+    histories = ultrank_search.OwnerHistoryCache()
+    histories.begin(now - 15 * DAY)
+    histories.ensure(7, 'tournament/weekly-1')
+    histories.ensure(7, 'tournament/weekly-1')
+    assert pages.pages == 2
+
+    # Tournaments created after the refresh, one renamed and one removed
+    pages.tournaments.append([now + 200 * DAY, 'Next Major', 'tournament/next-major'])
+    pages.tournaments.append([now + 6 * DAY, 'Weekly 2', 'tournament/weekly-2'])
+    pages.tournaments[1][1] = 'Weekly #1'
+    del pages.tournaments[2]
+
+    histories.begin(now - 15 * DAY)
+    histories.ensure(7, 'tournament/weekly-2')
+
+    assert [entry[1] for entry in histories.tournaments(7)] == ['Old Cup', 'Weekly #1', 'Weekly 2', 'Next Major',
+                                                             'Far Future Major']
+    assert [tournament.name for tournament in histories.lookback(7, 'tournament/weekly-2', now + 6 * DAY, 15)] == ['Weekly #1']
+
+
+class DetailsApi:
+    """Answers the basic cache's details and changes queries from a dict of tournaments by id."""
+
+    def __init__(self, monkeypatch, tournaments):
+        self.tournaments = tournaments
+        self.changed = set()
+        self.requests = []
+
+        monkeypatch.setattr(ultrank_search, 'send_request', self.send_request)
+
+    def send_request(self, query, variables, quiet=False):
+        name = query.split()[1].split('(')[0]
+        ids = json.loads(variables)['ids']
+        self.requests.append((name, sorted(ids)))
+
+        if name == 'tournamentChangesQuery':
+            nodes = [{'slug': self.tournaments[id_]['slug']} for id_ in ids if id_ in self.changed]
+        else:
+            nodes = [self.tournaments[id_] for id_ in ids]
+
+        return {'data': {'tournaments': {'nodes': nodes}}}
+
+
+def test_basic_cache_revalidates_recent_details(tmp_path, monkeypatch):
+    now = int(time.time())
+    old = dict(tournament(1), startAt=now - 30 * DAY)
+    recent = dict(tournament(2), startAt=now - 2 * DAY)
+    api = DetailsApi(monkeypatch, {1: old, 2: recent})
+
+    cache_path = tmp_path / 'basic-cache.json'
+    cache_path.write_text(json.dumps({'tournaments': {'nodes': [
+        {'id': id_, 'slug': entry['slug'], 'startAt': entry['startAt'], 'events': [{'numEntrants': 40}]}
+        for id_, entry in api.tournaments.items()]}}), encoding='utf-8')
+    details_path = str(tmp_path / 'tournament_details.json')
+
+    def discover():
+        source = ultrank_search.BasicCacheSource(str(cache_path), details_path)
+        return [found['name'] for found in source.discover(old['startAt'], recent['startAt'])]
+
+    assert discover() == ['Smash Monthly 1', 'Smash Monthly 2']
+    assert api.requests == [('tournamentDetailsQuery', [1, 2])]
+
+    # Only the recent tournament is checked, and nothing changed
+    del api.requests[:]
+    assert discover() == ['Smash Monthly 1', 'Smash Monthly 2']
+    assert api.requests == [('tournamentChangesQuery', [2])]
+
+    api.tournaments[2] = dict(recent, name='Smash Monthly 2 (Moved)')
+    api.changed.add(2)
+    del api.requests[:]
+    assert discover() == ['Smash Monthly 1', 'Smash Monthly 2 (Moved)']
+    assert api.requests == [('tournamentChangesQuery', [2]), ('tournamentDetailsQuery', [2])]
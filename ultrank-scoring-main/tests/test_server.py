@@ -0,0 +1,102 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import ultrank_server
+import ultrank_tiering
+from conftest import event_inputs
+from startgg_toolkit import SingleFlightMemo
+from ultrank_tiering import Tournament
+
+FOUND = 'tournament/test/event/ultimate-singles'
+MISSING = 'tournament/test/event/missing'
+
+
+@pytest.fixture
+def server(monkeypatch, event_dataset):
+    """Runs the service on a free port, with start.gg knowing only FOUND (finished)."""
+
+    def send_request(query, variables):
+        if json.loads(variables)['eventSlug'] == MISSING:
+            return {'data': {'event': None}}
+
+        return {'data': {'event': {'phases': [{'id': 1, 'name': 'Bracket', 'state': 'COMPLETED', 'isExhibition': False}]}}}
+
+    scored = []
+
+    def score_slug(slug, invit, cache=None, state=None):
+        scored.append((slug, state))
+        result = Tournament.from_inputs(event_inputs(slug), invit).score(event_dataset)
+
+        return {'slug': slug, 'invit': invit, 'status': 'scored', 'result': result.to_dict()}, result
+
+    monkeypatch.setattr(ultrank_tiering, 'send_request', send_request)
+    monkeypatch.setattr(ultrank_server, 'score_slug', score_slug)
+    monkeypatch.setattr(ultrank_server, 'results', SingleFlightMemo(max_size=ultrank_server.RESULTS_KEPT))
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ultrank_server.TieringRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1]), scored
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(url, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+
+    try:
+        with urllib.request.urlopen(url, data=data) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_missing_event_is_a_failed_bulk_entry(server):
+    url, scored = server
+
+    status, entries = request(url + '/bulk', [MISSING, FOUND, {'invit': True}])
+
+    assert status == 200
+    assert [(entry['slug'], entry['status']) for entry in entries] == [(MISSING, 'failed'), (FOUND, 'scored'), (None, 'failed')]
+    assert 'no event found' in entries[0]['error']
+    assert scored == [(FOUND, '[[1, "COMPLETED"]]')]
+
+
+def test_missing_event_is_not_found(server):
+    url, scored = server
+
+    status, body = request(url + '/tier?slug=' + MISSING)
+
+    assert status == 404
+    assert 'no event found' in body['error']
+    assert scored == []
+
+
+def test_finished_event_is_scored_once(server):
+    url, scored = server
+
+    first = request(url + '/tier?slug=' + FOUND)
+    second = request(url + '/tier?slug=https://www.start.gg/' + FOUND)
+
+    assert first[0] == second[0] == 200
+    assert first[1] == second[1]
+    assert len(scored) == 1
+
+
+def test_memo_keeps_most_recently_used():
+    memo = SingleFlightMemo(max_size=2)
+
+    memo.get('a', lambda: 1)
+    memo.get('b', lambda: 2)
+    memo.get('a', lambda: None)
+    memo.get('c', lambda: 3)
+
+    assert 'a' in memo and 'c' in memo
+    assert 'b' not in memo
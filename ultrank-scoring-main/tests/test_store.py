@@ -0,0 +1,48 @@
+import io
+
+from conftest import event_inputs
+from ultrank_store import ResultStore
+from ultrank_tiering import Tournament
+
+
+def rendered(result):
+    out = io.StringIO()
+    result.write_result(out)
+
+    return out.getvalue()
+
+
+def test_result_round_trips(tmp_path, event_dataset):
+    result = Tournament.from_inputs(event_inputs()).score(event_dataset)
+    assert result.values and result.dqs and result.potential
+
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.write(result)
+    store.close()
+
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    loaded = store.load_result(result.slug)
+
+    assert loaded.score == result.score
+    assert loaded.dataset_version == event_dataset.version
+    assert rendered(loaded) == rendered(result)
+
+    out = io.StringIO()
+    store.render(result.slug, out)
+    assert out.getvalue() == rendered(result)
+
+    assert [row[0] for row in store.events_for_player(222927)] == [result.slug]
+    assert store.load_result('tournament/missing/event/singles') is None
+
+
+def test_rescore_clears_failure(tmp_path, event_dataset):
+    result = Tournament.from_inputs(event_inputs()).score(event_dataset)
+
+    store = ResultStore(str(tmp_path / 'results.sqlite'))
+    store.write('https://www.start.gg/{}/overview'.format(result.slug))
+    store.commit()
+    assert store.connection.execute('SELECT slug FROM failures').fetchall() == [(result.slug,)]
+
+    store.write(result)
+    store.commit()
+    assert store.connection.execute('SELECT slug FROM failures').fetchall() == []
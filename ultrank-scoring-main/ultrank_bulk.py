@@ -1,96 +1,291 @@
-from ultrank_tiering import Tournament, TournamentTieringResult
+from ultrank_tiering import Tournament, TournamentTieringResult, coalescing_stats
+from ultrank_store import ResultStore
+from ultrank_cache import ResultCache
+from ultrank_seasons import SeasonAggregator
+from ultrank_profile import profiler
 from startgg_toolkit import startgg_slug_regex
+import argparse
 import csv
+import json
 import os 
 import re
 import sys
 
 true_values = ['true', 't', '1']
 
-def bulk_score(slugs, directory='tts_values'):
-    """Scores multiple slugs, and returns the resultant result."""
+JOURNAL_FILE = 'journal.jsonl'
 
-    # Create results directory
-    if not os.path.isdir(directory):
-        os.mkdir(directory)
 
-    # Get values
-    results = []
+def index_journal(directory='tts_values'):
+    """Indexes the bulk journal, returning {slug: (byte offset, invit, status)} for each slug's latest record.
 
-    for slug_obj in slugs:
-        slug = slug_obj['slug']
-        invit = slug_obj['invit']
+    Only the offsets are kept, so resuming doesn't hold every stored result in memory;
+    `read_journal_record` reads a record back when it is needed. A record whose line
+    was cut off by a crash is ignored, so that slug is simply redone.
+    """
 
-        if startgg_slug_regex.fullmatch(slug):
-            print('calculating for slug {}'.format(slug))
+    index = {}
+    path = os.path.join(directory, JOURNAL_FILE)
 
+    if not os.path.exists(path):
+        return index
+
+    offset = 0
+
+    with open(path, mode='rb') as journal_file:
+        for line in journal_file:
             try:
-                t = Tournament(slug, invit)
-                result = t.calculate_tier()
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+
+            if record is not None:
+                index[record['slug']] = (offset, record['invit'], record['status'])
+
+            offset += len(line)
+
+    return index
+
+
+def read_journal_record(journal_file, offset):
+    journal_file.seek(offset)
+
+    return json.loads(journal_file.readline())
+
+
+def append_journal(journal_file, record):
+    """Appends a record to the journal and forces it to disk."""
 
-                results.append(result)
+    journal_file.write(json.dumps(record) + '\n')
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
 
-                print('writing for slug {}'.format(result.slug))
 
-                with open(os.path.join(directory, '{}.txt'.format(re.sub(r'tournament\/([a-z0-9-_]*)\/event\/([a-z0-9-_]*)', r'\1_\2', result.slug))), mode='w') as write_file:
-                    result.write_result(write_file)
+def journaled_result(journal_file, entry, invit):
+    """Returns the result of an indexed journal record, or None if the slug needs to be redone."""
 
-            except Exception as e:
-                print(e)
-                print('catastrophic failure')
-                results.append(slug)
+    # Failures are retried
+    if entry is None or entry[1] != invit or entry[2] == 'failed':
+        return None
+
+    return record_result(read_journal_record(journal_file, entry[0]))
+
+
+def score_slug(slug, invit, cache=None, state=None):
+    """Scores a single slug, returning a journal-style record for it.
+
+    With a `ResultCache`, finished events are answered from the cache when possible.
+    `state` is passed on to the cache when the event's phase state was already fetched.
+    """
+
+    if not startgg_slug_regex.fullmatch(slug):
+        print('skipping slug {}'.format(slug))
+        return {'slug': slug, 'invit': invit, 'status': 'invalid'}, slug
+
+    print('calculating for slug {}'.format(slug))
+
+    try:
+        if cache is not None:
+            result = cache.tier(slug, invit, state)
         else:
-            print('skipping slug {}'.format(slug))
-            results.append(slug)
+            t = Tournament(slug, invit)
+            result = t.calculate_tier()
+    except Exception as e:
+        print(e)
+        print('catastrophic failure')
+        return {'slug': slug, 'invit': invit, 'status': 'failed', 'error': str(e)}, slug
 
-    return results
+    return {'slug': slug, 'invit': invit, 'status': 'scored', 'result': result.to_dict()}, result
 
 
-def write_results(results, directory='tts_values'):
-    # Write CSV
+def record_result(record):
+    """Returns the result stored in a journal-style record: the scoring result, or the slug if it wasn't scored."""
+
+    if record['status'] == 'scored':
+        return TournamentTieringResult.from_dict(record['result'])
+
+    return record['slug']
 
-    print('writing summary file')
 
+def iter_scores(slugs, directory='tts_values', resume=False, cache=None):
+    """Scores multiple slugs, yielding each result (or the slug on failure) as soon as it completes.
+
+    Every completed slug is recorded in the journal. With `resume`, slugs already
+    in the journal are not scored again and their stored results are yielded instead,
+    unless the slug object has `rescore` set.
+
+    `slugs` can be any iterable, including one that is still being filled.
+    With a `ResultCache`, finished events are answered from the cache when possible.
+    """
+
+    # Create results directory
     if not os.path.isdir(directory):
         os.mkdir(directory)
 
-    with open(os.path.join(directory, 'summary.csv'), newline='', mode='w') as summary_file:
-        writer = csv.DictWriter(summary_file, ['Tournament', 'Event', 'Slug', 'URL', 'Invitational?', 'Score', 'Max Potential Score', 'Num Entrants', 'Meets Reqs'])
-        writer.writeheader()
+    path = os.path.join(directory, JOURNAL_FILE)
+    journal = index_journal(directory) if resume else {}
 
-        for result in results:
-            if isinstance(result, TournamentTieringResult):
-                writer.writerow({'Tournament': result.tournament,
-                                 'Event': result.event,
-                                 'Slug': result.slug,
-                                 'URL': 'https://start.gg/' + result.slug,
-                                 'Invitational?': str(result.is_invitational),
-                                 'Score': result.score,
-                                 'Max Potential Score': result.max_potential_score(),
-                                 'Num Entrants': result.entrants, 
-                                 'Meets Reqs': str(result.should_count())})
+    with open(path, mode='a' if resume else 'w', encoding='utf-8') as journal_file, \
+            open(path, mode='rb') as journal_reader:
+        # Start a new line after a record cut off by a crash, so the next record isn't joined to it
+        if journal_reader.seek(0, os.SEEK_END) > 0:
+            journal_reader.seek(-1, os.SEEK_END)
+            if journal_reader.read(1) != b'\n':
+                journal_file.write('\n')
+
+        for slug_obj in slugs:
+            slug = slug_obj['slug']
+            invit = slug_obj['invit']
+
+            entry = journal.pop(slug, None)
+            if entry is not None and not slug_obj.get('rescore', False):
+                previous = journaled_result(journal_reader, entry, invit)
             else:
-                writer.writerow({'Tournament': '',
-                                 'Event': '',
-                                 'Slug': str(result),
-                                 'URL': '',
-                                 'Invitational?': '',
-                                 'Score': '',
-                                 'Max Potential Score': '',
-                                 'Num Entrants': ''})
+                previous = None
+
+            if previous is not None:
+                print('already done slug {}'.format(slug))
+                yield previous
+                continue
+
+            with profiler.stage('score event'):
+                record, result = score_slug(slug, invit, cache)
+
+            with profiler.stage('result writing'):
+                append_journal(journal_file, record)
+
+            yield result
+
+
+def event_file_name(slug):
+    return '{}.txt'.format(re.sub(r'tournament\/([a-z0-9-_]*)\/event\/([a-z0-9-_]*)', r'\1_\2', slug))
+
+
+def summary_row(result):
+    if isinstance(result, TournamentTieringResult):
+        return {'Tournament': result.tournament,
+                'Event': result.event,
+                'Slug': result.slug,
+                'URL': 'https://start.gg/' + result.slug,
+                'Invitational?': str(result.is_invitational),
+                'Score': result.score,
+                'Max Potential Score': result.max_potential_score(),
+                'Num Entrants': result.entrants,
+                'Meets Reqs': str(result.should_count())}
+
+    return {'Tournament': '',
+            'Event': '',
+            'Slug': str(result),
+            'URL': '',
+            'Invitational?': '',
+            'Score': '',
+            'Max Potential Score': '',
+            'Num Entrants': ''}
+
+
+class EventDetailSink:
+    """Writes the per-event txt breakdown as each result completes."""
+
+    def __init__(self, directory='tts_values'):
+        self.directory = directory
+
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+
+    def write(self, result):
+        if not isinstance(result, TournamentTieringResult):
+            return
+
+        print('writing for slug {}'.format(result.slug))
+
+        with open(os.path.join(self.directory, event_file_name(result.slug)), mode='w') as write_file:
+            result.write_result(write_file)
+
+    def close(self):
+        pass
+
+
+class SummarySink:
+    """Writes a `summary.csv` row as each result completes.
+
+    The file is flushed every `flush_every` rows so it can be tailed while a run is in progress.
+    """
+
+    fieldnames = ['Tournament', 'Event', 'Slug', 'URL', 'Invitational?', 'Score', 'Max Potential Score', 'Num Entrants', 'Meets Reqs']
+
+    def __init__(self, directory='tts_values', flush_every=10):
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        self.flush_every = flush_every
+        self.pending = 0
+        self.summary_file = open(os.path.join(directory, 'summary.csv'), newline='', mode='w')
+        self.writer = csv.DictWriter(self.summary_file, self.fieldnames)
+        self.writer.writeheader()
+        self.summary_file.flush()
+
+    def write(self, result):
+        self.writer.writerow(summary_row(result))
+
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.summary_file.flush()
+            self.pending = 0
+
+    def close(self):
+        self.summary_file.close()
+
+
+def stream_score(slugs, directory='tts_values', resume=False, sinks=None, cache=None):
+    """Scores multiple slugs, handing every result to each sink as soon as it completes.
+
+    Results are not kept once the sinks have seen them, so memory does not grow with the number of events.
+    Defaults to writing the per-event txt files and `summary.csv`.
+    """
+
+    if sinks is None:
+        sinks = [EventDetailSink(directory), SummarySink(directory)]
+
+    try:
+        for result in iter_scores(slugs, directory, resume, cache):
+            with profiler.stage('result writing'):
+                for sink in sinks:
+                    sink.write(result)
+    finally:
+        with profiler.stage('result writing'):
+            for sink in sinks:
+                sink.close()
 
     print('done writing')
 
+    stats = coalescing_stats()
+    print('{} requests sent, {} duplicate requests absorbed'.format(stats['requests_sent'], stats['requests_absorbed']))
 
-if __name__ == '__main__':
-    # Get file
-    file = input('input file to read keys from: ')
+    if cache is not None:
+        stats = cache.stats()
+        print('{} cached results reused, {} rescored from cached inputs, {} fetched, {} not finished'.format(
+            stats['cache_hits'], stats['cache_rescored'], stats['cache_misses'], stats['cache_unfinished']))
 
-    if not os.path.exists(file):
-        print('file doesn\'t exist!')
-        sys.exit()
 
-    # Read in values
+def bulk_score(slugs, directory='tts_values', resume=False, cache=None):
+    """Scores multiple slugs, and returns the resultant result.
+
+    Writes the per-event txt files along the way. Prefer `stream_score` for large runs.
+    """
+
+    detail_sink = EventDetailSink(directory)
+    results = []
+
+    for result in iter_scores(slugs, directory, resume, cache):
+        detail_sink.write(result)
+        results.append(result)
+
+    return results
+
+
+def read_slugs(file):
+    """Reads slugs and invitational flags from a CSV or plain text input file."""
+
     slugs = []
 
     _, ext = os.path.splitext(file)
@@ -113,7 +308,68 @@ if __name__ == '__main__':
             for row in file_obj:
                 slugs.append({'slug': row.strip(), 'invit': False})
 
+    return slugs
+
+
+def write_results(results, directory='tts_values'):
+    # Write CSV
+
+    print('writing summary file')
+
+    summary_sink = SummarySink(directory)
+
+    try:
+        for result in results:
+            summary_sink.write(result)
+    finally:
+        summary_sink.close()
+
+    print('done writing')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiers multiple events from an input file.')
+    parser.add_argument('file', nargs='?', help='file containing the tournament keys to evaluate')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip slugs already completed in tts_values/journal.jsonl')
+    parser.add_argument('--store', action='store_true',
+                        help='also write results to tts_values/results.sqlite')
+    parser.add_argument('--no-txt', action='store_true',
+                        help='don\'t write a txt file per event (use ultrank_store.py render instead)')
+    parser.add_argument('--season', metavar='NAME',
+                        help='also add results to a season\'s totals in tts_values/seasons.sqlite')
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse results of finished events from tts_values/result_cache.sqlite')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each stage and write tts_values/profile.folded')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile, also write a cProfile to tts_values/profile.prof')
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler.enable(cprofile=args.cprofile)
+
+    # Get file
+    file = args.file if args.file else input('input file to read keys from: ')
+
+    if not os.path.exists(file):
+        print('file doesn\'t exist!')
+        sys.exit()
+
+    slugs = read_slugs(file)
+
     print('read values')
 
-    results = bulk_score(slugs)
-    write_results(results)
\ No newline at end of file
+    sinks = [SummarySink()]
+    if not args.no_txt:
+        sinks.append(EventDetailSink())
+    if args.store:
+        sinks.append(ResultStore())
+    if args.season is not None:
+        sinks.append(SeasonAggregator(args.season))
+
+    cache = ResultCache() if args.cache else None
+
+    stream_score(slugs, resume=args.resume, sinks=sinks, cache=cache)
+
+    profiler.finish()
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""Persistent cache of tiering results for finished events.
+
+A finished event's sets don't change, so its result only depends on the dataset it
+was scored with. Each cached result is keyed by the event slug, the invitational
+flag, the event's phase state and the dataset version:
+ - while the phase state and dataset are unchanged, the result is returned after a
+   single phase-list request;
+ - when only the dataset changes, the event's stored inputs (entrants, DQs, location,
+   date) are rescored offline, without fetching the event again;
+ - when the phase state changes (an event reopened or edited), the event is fetched
+   and scored again.
+
+Events that haven't finished are always scored normally and never cached.
+
+Usage:
+ python ultrank_cache.py stats              prints how many events and results are cached
+ python ultrank_cache.py prune              drops results scored with other dataset versions
+"""
+
+from ultrank_tiering import Tournament, TournamentTieringResult, datasets, event_state
+from startgg_toolkit import isolate_slug
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_CACHE = os.path.join('tts_values', 'result_cache.sqlite')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS event_inputs (
+    slug TEXT PRIMARY KEY,
+    state TEXT,
+    inputs TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    slug TEXT,
+    invit INTEGER,
+    state TEXT,
+    dataset_version TEXT,
+    result TEXT,
+    PRIMARY KEY (slug, invit)
+);
+'''
+
+
+class ResultCache:
+    """Caches tiering results and their inputs for finished events in SQLite.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE):
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+        # How each call to `tier` was answered
+        self.hits = 0
+        self.rescored = 0
+        self.misses = 0
+        self.unfinished = 0
+
+    def lookup_result(self, slug, invit, state, version):
+        with self.lock:
+            row = self.connection.execute('SELECT result FROM results WHERE slug = ? AND invit = ? AND state = ? AND dataset_version = ?',
+                                          (slug, int(invit), state, version)).fetchone()
+
+        return TournamentTieringResult.from_dict(json.loads(row[0])) if row is not None else None
+
+    def lookup_inputs(self, slug, state):
+        with self.lock:
+            row = self.connection.execute('SELECT inputs FROM event_inputs WHERE slug = ? AND state = ?',
+                                          (slug, state)).fetchone()
+
+        return json.loads(row[0]) if row is not None else None
+
+    def store(self, slug, invit, state, result, inputs=None):
+        """Stores a result, replacing the event's earlier result (and inputs, if given)."""
+
+        with self.lock:
+            if inputs is not None:
+                self.connection.execute('INSERT OR REPLACE INTO event_inputs VALUES (?, ?, ?)',
+                                        (slug, state, json.dumps(inputs)))
+
+            self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                    (slug, int(invit), state, result.dataset_version, json.dumps(result.to_dict())))
+            self.connection.commit()
+
+    def tier(self, slug, invit, state=None):
+        """Returns the result for an event, using the cache whenever the event is finished.
+
+        Pass the event's `event_state` as `state` if it was already fetched.
+        """
+
+        # Keyed like results everywhere else, so a URL and a bare slug share an entry
+        slug = isolate_slug(slug)
+
+        if state is None:
+            state = event_state(slug)
+
+        if state is None:
+            self.unfinished += 1
+            return Tournament(slug, invit).calculate_tier()
+
+        # Use one version of the dataset throughout, even if a new one is swapped in meanwhile
+        dataset = datasets.current
+
+        result = self.lookup_result(slug, invit, state, dataset.version)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        inputs = self.lookup_inputs(slug, state)
+        if inputs is not None:
+            self.rescored += 1
+            result = Tournament.from_inputs(inputs, invit).score(dataset)
+            self.store(slug, invit, state, result)
+            return result
+
+        self.misses += 1
+        tournament = Tournament(slug, invit)
+        result = tournament.score(dataset)
+        self.store(slug, invit, state, result, tournament.to_inputs())
+
+        return result
+
+    def prune(self, version):
+        """Drops results scored with any dataset version other than `version`, returning how many were dropped."""
+
+        with self.lock:
+            cursor = self.connection.execute('DELETE FROM results WHERE dataset_version != ?', (version,))
+            self.connection.commit()
+
+        return cursor.rowcount
+
+    def counts(self):
+        with self.lock:
+            events = self.connection.execute('SELECT COUNT(*) FROM event_inputs').fetchone()[0]
+            results = dict(self.connection.execute('SELECT dataset_version, COUNT(*) FROM results GROUP BY dataset_version'))
+
+        return events, results
+
+    def stats(self):
+        return {'cache_hits': self.hits, 'cache_rescored': self.rescored, 'cache_misses': self.misses,
+                'cache_unfinished': self.unfinished}
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspects the tiering result cache.')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='path of the cache database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='print how many events and results are cached')
+    subparsers.add_parser('prune', help='drop results scored with other dataset versions')
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache)
+
+    if args.command == 'stats':
+        events, results = cache.counts()
+        print('{} events with stored inputs'.format(events))
+        for version, count in results.items():
+            current = ' (current)' if version == datasets.current.version else ''
+            print('{} results for dataset {}{}'.format(count, version, current))
+    elif args.command == 'prune':
+        print('dropped {} results'.format(cache.prune(datasets.current.version)))
+
+    cache.close()
@@ -0,0 +1,190 @@
+"""Exports the results store as small JSON files for the dashboard.
+
+Events are split into one shard per month and region, so the dashboard only loads
+the months and regions it shows. Every file name contains a hash of its contents,
+so files can be cached forever; `manifest.json` lists the current files and is the
+only file that needs to be fetched fresh.
+
+Exports are incremental: a shard is only rebuilt when one of its events changed in
+the store since the last export, and files no longer in the manifest are deleted.
+
+Usage:
+ python ultrank_export.py [--store tts_values/results.sqlite] [--out tts_values/dashboard]
+"""
+
+from ultrank_tiering import datasets
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import types
+
+DEFAULT_STORE = os.path.join('tts_values', 'results.sqlite')
+DEFAULT_EXPORT = os.path.join('tts_values', 'dashboard')
+
+MANIFEST_FILE = 'manifest.json'
+
+EVENT_COLUMNS = ['slug', 'tournament', 'event', 'date', 'score', 'max_potential_score', 'entrants', 'meets_reqs',
+                 'multiplier', 'players']
+
+
+def _compact_json(data):
+    # Sorted keys and no whitespace, so equal contents always produce equal bytes
+    return json.dumps(data, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+
+def region_key(note):
+    key = re.sub(r'[^a-z0-9]+', '-', (note or '').lower()).strip('-')
+
+    return key if key != '' else 'other'
+
+
+def write_hashed(directory, prefix, data):
+    """Writes JSON to `<prefix>-<hash>.json` unless that file already exists, returning the file name."""
+
+    content = _compact_json(data)
+    name = '{}-{}.json'.format(prefix, hashlib.sha256(content).hexdigest()[:16])
+    path = os.path.join(directory, name)
+
+    if not os.path.exists(path):
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as export_file:
+            export_file.write(content)
+        os.replace(temp_path, path)
+
+    return name
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+
+    if not os.path.exists(path):
+        return {'shards': {}, 'player_points': None}
+
+    with open(path, encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def shard_fingerprints(connection):
+    """Returns {shard id: (month, region, fingerprint)}, where the fingerprint covers every exported column.
+
+    One query reads each event's exported columns with its valued players joined into a
+    single string; the rows are hashed per shard, and only shards whose hash changed are built.
+    """
+
+    rows = {}
+    for row in connection.execute(
+            'SELECT events.slug, tournament, event, date, score, max_potential_score, entrants, meets_reqs, region_multiplier, '
+            'region_note, players FROM events LEFT JOIN ('
+            # group_concat joins rows in the order it reads them, so they are sorted first
+            "  SELECT slug, group_concat(player_id || ':' || tag || ':' || points || ':' || position, ',') AS players "
+            '  FROM (SELECT slug, player_id, tag, points, position FROM valued_players ORDER BY slug, position) GROUP BY slug'
+            ') AS valued ON valued.slug = events.slug ORDER BY events.slug'):
+        date, region_note = row[3], row[9]
+        month = date[:7] if date is not None else 'undated'
+        region = region_key(region_note)
+        rows.setdefault('{}/{}'.format(month, region), (month, region, []))[2].append(json.dumps(row))
+
+    return {shard: (month, region, hashlib.sha256('\n'.join(members).encode('utf-8')).hexdigest())
+            for shard, (month, region, members) in rows.items()}
+
+
+def shard_data(connection, month, region):
+    """Builds a shard's contents: its events as rows under `columns`, each with its valued players."""
+
+    if month == 'undated':
+        date_filter, params = 'date IS NULL', ()
+    else:
+        date_filter, params = 'substr(date, 1, 7) = ?', (month,)
+
+    events = [row for row in connection.execute(
+        'SELECT slug, tournament, event, date, score, max_potential_score, entrants, meets_reqs, region_multiplier, region_note '
+        'FROM events WHERE {} ORDER BY date, slug'.format(date_filter), params) if region_key(row[9]) == region]
+
+    rows = []
+    for slug, tournament, event, date, score, max_potential_score, entrants, meets_reqs, multiplier, _ in events:
+        players = [[str(player_id), tag, points] for player_id, tag, points in connection.execute(
+            'SELECT player_id, tag, points FROM valued_players WHERE slug = ? ORDER BY position', (slug,))]
+
+        rows.append([slug, tournament, event, date, score, max_potential_score, entrants, bool(meets_reqs), multiplier,
+                     players])
+
+    return {'month': month, 'region': region, 'region_note': events[0][9] if len(events) > 0 else '',
+            'columns': EVENT_COLUMNS, 'rows': rows}
+
+
+def player_points(date=None):
+    """Returns {player id: points} for every player valued on `date` (today by default) in the current dataset."""
+
+    # retrieve_value only looks at the event's start time
+    on_date = types.SimpleNamespace(start_time=date if date is not None else datetime.date.today())
+
+    points = {}
+    for player_id, group in datasets.current.players.items():
+        value = group.retrieve_value(on_date)
+        if value is not None:
+            points[str(player_id)] = value.points
+
+    return points
+
+
+def export(store_path=DEFAULT_STORE, directory=DEFAULT_EXPORT):
+    """Brings the export directory up to date with the store, returning how many shards were rebuilt and how many there are."""
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    previous = read_manifest(directory)
+    connection = sqlite3.connect(store_path)
+
+    shards = {}
+    rebuilt = 0
+
+    for shard, (month, region, fingerprint) in shard_fingerprints(connection).items():
+        old = previous['shards'].get(shard)
+
+        if old is not None and old['fingerprint'] == fingerprint and os.path.exists(os.path.join(directory, old['file'])):
+            shards[shard] = old
+            continue
+
+        data = shard_data(connection, month, region)
+        shards[shard] = {'month': month, 'region': region, 'region_note': data['region_note'], 'events': len(data['rows']),
+                         'fingerprint': fingerprint, 'file': write_hashed(directory, 'events-{}-{}'.format(month, region), data)}
+        rebuilt += 1
+
+    connection.close()
+
+    manifest = {'shards': shards,
+                'player_points': write_hashed(directory, 'player-points', player_points()),
+                'dataset_version': datasets.current.version}
+
+    temp_path = os.path.join(directory, '{}.{}.tmp'.format(MANIFEST_FILE, os.getpid()))
+    with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(temp_path, os.path.join(directory, MANIFEST_FILE))
+
+    # Files from earlier exports are only removed once the new manifest no longer lists them
+    current = set(shard['file'] for shard in shards.values()) | {manifest['player_points'], MANIFEST_FILE}
+    for name in os.listdir(directory):
+        if name.startswith(('events-', 'player-points-')) and name.endswith('.json') and name not in current:
+            os.remove(os.path.join(directory, name))
+
+    return rebuilt, len(shards)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports the results store as sharded JSON for the dashboard.')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='results store written by ultrank_bulk.py --store')
+    parser.add_argument('--out', default=DEFAULT_EXPORT, help='directory to write the shards and manifest.json to')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.store):
+        print('store doesn\'t exist!')
+        sys.exit()
+
+    rebuilt, total = export(args.store, args.out)
+    print('rebuilt {} of {} shards in {}'.format(rebuilt, total, args.out))
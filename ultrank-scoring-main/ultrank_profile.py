@@ -0,0 +1,117 @@
+"""Per-stage timers for finding where a run spends its time.
+
+Code marks its major stages with `with profiler.stage('name'):`. While profiling is
+off a stage costs one attribute check. Once `profiler.enable()` has been called, each
+stage records its calls, wall time and CPU time, nested under whatever stage encloses
+it in the same thread. Stages in worker threads are added up, so their totals can
+exceed the run's wall time.
+
+`finish` prints a table of the stages and writes `profile.folded`: one line per stack
+of stages with the wall time spent in it (excluding nested stages) in microseconds,
+which flamegraph.pl, speedscope and inferno read directly. With `cprofile`, a cProfile
+of the main thread is also written to `profile.prof`.
+"""
+
+import contextlib
+import cProfile
+import os
+import threading
+import time
+
+FOLDED_FILE = 'profile.folded'
+CPROFILE_FILE = 'profile.prof'
+
+_not_profiling = contextlib.nullcontext()
+
+
+class StageProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.cprofile = None
+
+        # (stage, nested stage, ...) -> [calls, wall time, wall time excluding nested stages, CPU time]
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, cprofile=False):
+        self.enabled = True
+
+        if cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _not_profiling
+
+        return self.timed(name)
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+
+        # Each entry is [name, wall time of its nested stages]
+        entry = [name, 0.0]
+        stack.append(entry)
+        key = tuple(stage_name for stage_name, _ in stack)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+
+            stack.pop()
+            if len(stack) > 0:
+                stack[-1][1] += wall
+
+            with self.lock:
+                totals = self.totals.setdefault(key, [0, 0.0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += wall - entry[1]
+                totals[3] += cpu
+
+    def report(self):
+        """Prints each stack of stages with its calls, wall time, time excluding nested stages and CPU time."""
+
+        print('{:<60} {:>8} {:>10} {:>10} {:>10}'.format('stage', 'calls', 'wall (s)', 'self (s)', 'cpu (s)'))
+
+        for key, (calls, wall, self_wall, cpu) in sorted(self.totals.items()):
+            print('{:<60} {:>8} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                '  ' * (len(key) - 1) + key[-1], calls, wall, self_wall, cpu))
+
+    def write_folded(self, path):
+        with open(path, mode='w', encoding='utf-8') as folded_file:
+            for key, (_, _, self_wall, _) in sorted(self.totals.items()):
+                microseconds = int(self_wall * 1000000)
+                if microseconds > 0:
+                    folded_file.write('{} {}\n'.format(';'.join(key), microseconds))
+
+    def finish(self, directory='tts_values'):
+        """Prints the report and writes the profile files to `directory`."""
+
+        if not self.enabled:
+            return
+
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        self.report()
+
+        self.write_folded(os.path.join(directory, FOLDED_FILE))
+        print('wrote {}'.format(os.path.join(directory, FOLDED_FILE)))
+
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(os.path.join(directory, CPROFILE_FILE))
+            print('wrote {}'.format(os.path.join(directory, CPROFILE_FILE)))
+
+
+profiler = StageProfiler()
@@ -0,0 +1,238 @@
+"""Spreads bulk scoring across several worker processes with a shared SQLite job queue.
+
+Usage:
+ python ultrank_queue.py enqueue <input file>   adds the slugs of a bulk input file to the queue
+ python ultrank_queue.py work                   leases and scores jobs until the queue is drained
+ python ultrank_queue.py merge                  writes summary.csv from every finished job
+ python ultrank_queue.py status                 prints job counts
+
+Start as many workers as you like, on any machine that can see the queue file.
+Give each one its own API key with the SMASHGG_KEY_FILE environment variable.
+Jobs leased by a worker that crashes are handed out again once their lease expires.
+"""
+
+from ultrank_bulk import score_slug, record_result, read_slugs, SummarySink, EventDetailSink
+from ultrank_store import ResultStore
+from ultrank_cache import ResultCache, DEFAULT_CACHE
+from ultrank_seasons import SeasonAggregator
+from ultrank_tiering import datasets
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+
+DEFAULT_QUEUE = os.path.join('tts_values', 'queue.sqlite')
+
+# Seconds a worker may hold a job before it is handed out again
+LEASE_SECONDS = 15 * 60
+
+# Times a job is tried before it is recorded as failed
+MAX_ATTEMPTS = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    slug TEXT,
+    invit INTEGER,
+    status TEXT,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER,
+    record TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+'''
+
+
+class JobQueue:
+    """SQLite-backed queue of slugs to score.
+
+    Jobs move from `pending` to `leased` to `done`. A leased job whose lease has expired
+    counts as pending again.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE, lease_seconds=LEASE_SECONDS):
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        # Transactions are managed explicitly so leasing can take the write lock up front
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.executescript(SCHEMA)
+        self.lease_seconds = lease_seconds
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Runs a block holding the write lock. Commits if it finishes, rolls back if it raises."""
+
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+        self.connection.execute('COMMIT')
+
+    def enqueue(self, slugs):
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT INTO jobs (slug, invit, status, attempts) VALUES (?, ?, 'pending', 0)",
+                [(slug_obj['slug'], int(slug_obj['invit'])) for slug_obj in slugs])
+
+    def lease(self, worker):
+        """Claims the next available job for a worker. Returns (id, slug, invit), or None if nothing is available.
+
+        Expired jobs that have used up their attempts are recorded as failed instead of being handed out again.
+        """
+
+        now = time.time()
+
+        with self.transaction():
+            # Jobs whose workers kept crashing or hanging on them
+            for job_id, slug, invit in self.connection.execute(
+                    "SELECT id, slug, invit FROM jobs WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, MAX_ATTEMPTS)).fetchall():
+                record = {'slug': slug, 'invit': bool(invit), 'status': 'failed',
+                          'error': 'lease expired after {} attempts'.format(MAX_ATTEMPTS)}
+                self.connection.execute("UPDATE jobs SET status = 'done', record = ?, worker = NULL WHERE id = ?",
+                                        (json.dumps(record), job_id))
+
+            row = self.connection.execute(
+                "SELECT id, slug, invit FROM jobs WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "AND attempts < ? ORDER BY id LIMIT 1", (now, MAX_ATTEMPTS)).fetchone()
+
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.lease_seconds, row[0]))
+
+        if row is None:
+            return None
+
+        return row[0], row[1], bool(row[2])
+
+    def complete(self, job_id, worker, record):
+        """Posts a worker's record for a finished job. Failures are put back in the queue until they run out of attempts.
+
+        A worker whose lease expired and was handed to another worker can't post the job any more.
+        """
+
+        with self.transaction():
+            if record['status'] == 'failed':
+                self.connection.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'done' ELSE 'pending' END, record = ?, worker = NULL "
+                    "WHERE id = ? AND status = 'leased' AND worker = ?", (MAX_ATTEMPTS, json.dumps(record), job_id, worker))
+            else:
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'done', record = ?, worker = NULL WHERE id = ? AND status = 'leased' AND worker = ?",
+                    (json.dumps(record), job_id, worker))
+
+    def unfinished(self):
+        return self.connection.execute("SELECT COUNT(*) FROM jobs WHERE status != 'done'").fetchone()[0]
+
+    def counts(self):
+        return dict(self.connection.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def records(self):
+        """Yields the record of every finished job in the order they were enqueued."""
+
+        for (record,) in self.connection.execute("SELECT record FROM jobs WHERE status = 'done' ORDER BY id"):
+            yield json.loads(record)
+
+    def close(self):
+        self.connection.close()
+
+
+def work(queue, poll_seconds=30, cache=None):
+    """Scores jobs from the queue until no job is pending or leased."""
+
+    worker = '{}-{}'.format(socket.gethostname(), os.getpid())
+
+    while True:
+        # Pick up a new export of the CSVs between jobs
+        datasets.reload_if_changed()
+
+        job = queue.lease(worker)
+
+        if job is None:
+            if queue.unfinished() == 0:
+                break
+
+            # Other workers still hold jobs; wait in case their leases expire
+            time.sleep(poll_seconds)
+            continue
+
+        job_id, slug, invit = job
+        record, _ = score_slug(slug, invit, cache)
+        queue.complete(job_id, worker, record)
+
+    print('queue drained')
+
+
+def merge(queue, sinks):
+    """Hands every finished job's result to the sinks."""
+
+    try:
+        for record in queue.records():
+            result = record_result(record)
+            for sink in sinks:
+                sink.write(result)
+    finally:
+        for sink in sinks:
+            sink.close()
+
+    print('done writing')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributes bulk scoring over a shared job queue.')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, help='path to the shared queue file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    enqueue_parser = subparsers.add_parser('enqueue', help='add the slugs of a bulk input file to the queue')
+    enqueue_parser.add_argument('file')
+    work_parser = subparsers.add_parser('work', help='score jobs until the queue is drained')
+    work_parser.add_argument('--lease', type=int, default=LEASE_SECONDS, help='seconds before a leased job is retried')
+    work_parser.add_argument('--cache', metavar='PATH', nargs='?', const=DEFAULT_CACHE,
+                             help='reuse results of finished events from a result cache (tts_values/result_cache.sqlite by default)')
+    merge_parser = subparsers.add_parser('merge', help='write summary.csv from the finished jobs')
+    merge_parser.add_argument('--store', action='store_true', help='also write results to tts_values/results.sqlite')
+    merge_parser.add_argument('--txt', action='store_true', help='also write a txt file per event')
+    merge_parser.add_argument('--season', metavar='NAME', help='also add results to a season\'s totals')
+    subparsers.add_parser('status', help='print job counts')
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue, lease_seconds=getattr(args, 'lease', LEASE_SECONDS))
+
+    if args.command == 'enqueue':
+        if not os.path.exists(args.file):
+            print('file doesn\'t exist!')
+            sys.exit()
+
+        slugs = read_slugs(args.file)
+        queue.enqueue(slugs)
+        print('enqueued {} slugs'.format(len(slugs)))
+    elif args.command == 'work':
+        work(queue, cache=ResultCache(args.cache) if args.cache is not None else None)
+    elif args.command == 'merge':
+        if queue.unfinished() != 0:
+            print('warning: {} jobs are not finished yet'.format(queue.unfinished()))
+
+        sinks = [SummarySink()]
+        if args.txt:
+            sinks.append(EventDetailSink())
+        if args.store:
+            sinks.append(ResultStore())
+        if args.season is not None:
+            sinks.append(SeasonAggregator(args.season))
+
+        merge(queue, sinks)
+    elif args.command == 'status':
+        for status, count in sorted(queue.counts().items()):
+            print('{}: {}'.format(status, count))
+
+    queue.close()
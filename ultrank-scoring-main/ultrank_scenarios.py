@@ -0,0 +1,286 @@
+"""What-if scenarios over stored tiering results.
+
+Recomputes every event in the results store (see `ultrank_store.py`) under a set of
+overrides and reports which events gain or lose qualification and how scores move.
+A stored result already separates the entrant score from each player's points, so
+nothing is fetched or matched again; all events are recomputed together with numpy
+when it is installed, or one at a time otherwise.
+
+Scenarios are JSON files; every key is optional:
+ {
+   "score_floor": {"1": 250, "2": 200, "3": 200},
+   "entrant_floor": {"1": 64, "2": 48, "3": 32},
+   "entrant_caps": [256, 128],
+   "new_mult_system_date": "2024-12-16",
+   "region_multipliers": {"Florida": 3},
+   "player_points": {"222927": 500}
+ }
+
+`region_multipliers` is keyed by the region's note in ultrank_regions.csv.
+`player_points` is keyed by start.gg player id and replaces the points the player
+counts for at every event they were valued at (including any invitational value)
+or DQed from. Players who weren't valued at an event can't be added this way.
+Potential matches keep their stored points: the store only has the id of the
+attendee whose tag matched, not the id of the valued player it matched.
+
+Usage:
+ python ultrank_scenarios.py <scenario.json> [--store tts_values/results.sqlite] [--out tts_values/scenario.csv]
+"""
+
+from ultrank_tiering import SCORE_FLOOR, ENTRANT_FLOOR, ENTRANT_CAPS, NEW_MULT_SYSTEM_DATE, NUM_PLAYERS_FLOOR, _str_to_date
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_STORE = os.path.join('tts_values', 'results.sqlite')
+
+MULTIPLIERS = [1, 2, 3]
+
+
+class Scenario:
+    """A set of overrides to the tiering rules. Anything not overridden uses the current rules."""
+
+    def __init__(self, score_floor=None, entrant_floor=None, entrant_caps=None, new_mult_system_date=None,
+                 region_multipliers=None, player_points=None):
+        self.score_floor = dict(SCORE_FLOOR)
+        self.score_floor.update(score_floor or {})
+        self.entrant_floor = dict(ENTRANT_FLOOR)
+        self.entrant_floor.update(entrant_floor or {})
+        self.entrant_caps = list(entrant_caps) if entrant_caps is not None else ENTRANT_CAPS
+        self.new_mult_system_date = new_mult_system_date if new_mult_system_date is not None else NEW_MULT_SYSTEM_DATE
+        self.region_multipliers = region_multipliers or {}
+        self.player_points = {str(id_): points for id_, points in (player_points or {}).items()}
+
+        for multiplier in self.region_multipliers.values():
+            if multiplier not in MULTIPLIERS:
+                raise ValueError('region multipliers must be one of {}, not {}'.format(MULTIPLIERS, multiplier))
+
+        if len(self.entrant_caps) != 2:
+            raise ValueError('entrant_caps needs the x2 and x3 caps')
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(score_floor={int(mult): floor for mult, floor in data.get('score_floor', {}).items()},
+                   entrant_floor={int(mult): floor for mult, floor in data.get('entrant_floor', {}).items()},
+                   entrant_caps=data.get('entrant_caps'),
+                   new_mult_system_date=_str_to_date(data.get('new_mult_system_date')),
+                   region_multipliers=data.get('region_multipliers'),
+                   player_points=data.get('player_points'))
+
+
+class PlayerRows:
+    """Per-player rows of one kind (valued players, DQs or potential matches) across all events."""
+
+    def __init__(self, rows):
+        # (event index, player id as str, points)
+        self.events = [row[0] for row in rows]
+        self.ids = [row[1] for row in rows]
+        self.points = [row[2] for row in rows]
+
+    def edited_points(self, player_points):
+        if len(player_points) == 0:
+            return self.points
+
+        return [player_points.get(id_, points) for id_, points in zip(self.ids, self.points)]
+
+
+class ScenarioInputs:
+    """Everything the scenarios need from the results store, loaded once."""
+
+    def __init__(self, store_path=DEFAULT_STORE):
+        connection = sqlite3.connect(store_path)
+
+        events = connection.execute(
+            'SELECT slug, tournament, event, date, entrants, region_multiplier, region_note, score FROM events ORDER BY slug').fetchall()
+
+        self.slugs = [row[0] for row in events]
+        self.tournaments = [row[1] for row in events]
+        self.events = [row[2] for row in events]
+        self.dates = [_str_to_date(row[3]) for row in events]
+        self.entrants = [row[4] for row in events]
+        self.multipliers = [row[5] for row in events]
+        self.region_notes = [row[6] for row in events]
+        self.stored_scores = [row[7] for row in events]
+
+        index = {slug: position for position, slug in enumerate(self.slugs)}
+
+        def player_rows(query):
+            return PlayerRows([(index[slug], str(id_), points) for slug, id_, points in connection.execute(query)])
+
+        self.valued = player_rows('SELECT slug, player_id, points FROM valued_players')
+        self.dqs = player_rows('SELECT slug, player_id, points FROM dqs')
+        self.potential = player_rows('SELECT slug, player_id, points FROM potential_matches')
+
+        connection.close()
+
+    def __len__(self):
+        return len(self.slugs)
+
+
+class ScenarioResult:
+    def __init__(self, scores, max_scores, meets_reqs):
+        self.scores = scores
+        self.max_scores = max_scores
+        self.meets_reqs = meets_reqs
+
+
+def _best_per_player(rows, points, num_events):
+    """Sums, per event, the highest points of each distinct player (as `max_potential_score` does)."""
+
+    best = {}
+    for event, id_, value in zip(rows.events, rows.ids, points):
+        key = (event, id_)
+        if value > best.get(key, 0):
+            best[key] = value
+
+    totals = [0] * num_events
+    for (event, _), value in best.items():
+        totals[event] += value
+
+    return totals
+
+
+def _player_counts(inputs):
+    counts = [0] * len(inputs)
+    for rows in [inputs.valued, inputs.dqs, inputs.potential]:
+        for event in rows.events:
+            counts[event] += 1
+
+    return counts
+
+
+def run_scenario(inputs, scenario):
+    """Recomputes every event's score, max potential score and qualification under a scenario."""
+
+    num_events = len(inputs)
+
+    multipliers = [scenario.region_multipliers.get(note, multiplier)
+                   for note, multiplier in zip(inputs.region_notes, inputs.multipliers)]
+    new_system = [date is not None and date > scenario.new_mult_system_date for date in inputs.dates]
+
+    valued_points = inputs.valued.edited_points(scenario.player_points)
+    extra_points = [dq + potential for dq, potential in zip(
+        _best_per_player(inputs.dqs, inputs.dqs.edited_points(scenario.player_points), num_events),
+        _best_per_player(inputs.potential, inputs.potential.points, num_events))]
+    counts = _player_counts(inputs)
+
+    cap2, cap3 = scenario.entrant_caps
+
+    if numpy is not None:
+        entrants = numpy.array(inputs.entrants, dtype=numpy.int64)
+        mults = numpy.array(multipliers, dtype=numpy.int64)
+
+        new_entrant_scores = entrants + (mults >= 2) * numpy.minimum(cap2, entrants) + (mults >= 3) * numpy.minimum(cap3, entrants)
+        entrant_scores = numpy.where(numpy.array(new_system, dtype=bool), new_entrant_scores, entrants * mults)
+
+        player_scores = numpy.bincount(numpy.array(inputs.valued.events, dtype=numpy.int64),
+                                       weights=numpy.array(valued_points, dtype=numpy.float64), minlength=num_events)
+
+        scores = entrant_scores + player_scores.astype(numpy.int64)
+        max_scores = scores + numpy.array(extra_points, dtype=numpy.int64)
+
+        entrant_floors = numpy.array([0] + [scenario.entrant_floor[mult] for mult in MULTIPLIERS])[mults]
+        score_floors = numpy.array([0] + [scenario.score_floor[mult] for mult in MULTIPLIERS])[mults]
+
+        meets_reqs = (entrants >= entrant_floors) | (
+            (max_scores >= score_floors) & (numpy.array(counts, dtype=numpy.int64) >= NUM_PLAYERS_FLOOR))
+
+        return ScenarioResult(scores.tolist(), max_scores.tolist(), meets_reqs.tolist())
+
+    player_scores = [0] * num_events
+    for event, points in zip(inputs.valued.events, valued_points):
+        player_scores[event] += points
+
+    scores = []
+    max_scores = []
+    meets_reqs = []
+
+    for entrants, mult, is_new, player_score, extra, count in zip(inputs.entrants, multipliers, new_system, player_scores,
+                                                                   extra_points, counts):
+        if is_new:
+            entrant_score = entrants + (min(cap2, entrants) if mult >= 2 else 0) + (min(cap3, entrants) if mult >= 3 else 0)
+        else:
+            entrant_score = entrants * mult
+
+        score = entrant_score + player_score
+        max_score = score + extra
+
+        scores.append(score)
+        max_scores.append(max_score)
+        meets_reqs.append(entrants >= scenario.entrant_floor[mult] or
+                          (max_score >= scenario.score_floor[mult] and count >= NUM_PLAYERS_FLOOR))
+
+    return ScenarioResult(scores, max_scores, meets_reqs)
+
+
+def compare(inputs, baseline, result):
+    """Returns a row for every event whose score or qualification differs between two scenario results."""
+
+    rows = []
+
+    for index in range(len(inputs)):
+        old_score, new_score = baseline.scores[index], result.scores[index]
+        old_meets, new_meets = baseline.meets_reqs[index], result.meets_reqs[index]
+
+        if old_score == new_score and old_meets == new_meets:
+            continue
+
+        rows.append({'Tournament': inputs.tournaments[index],
+                     'Event': inputs.events[index],
+                     'Slug': inputs.slugs[index],
+                     'Score': old_score,
+                     'New Score': new_score,
+                     'Delta': new_score - old_score,
+                     'Meets Reqs': str(bool(old_meets)),
+                     'New Meets Reqs': str(bool(new_meets))})
+
+    return rows
+
+
+def write_diff(rows, path):
+    with open(path, newline='', mode='w') as diff_file:
+        writer = csv.DictWriter(diff_file, ['Tournament', 'Event', 'Slug', 'Score', 'New Score', 'Delta', 'Meets Reqs',
+                                            'New Meets Reqs'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reports how a change to the tiering rules would affect stored results.')
+    parser.add_argument('scenario', help='JSON file with the overrides')
+    parser.add_argument('--store', default=DEFAULT_STORE, help='results store written by ultrank_bulk.py --store')
+    parser.add_argument('--out', default=os.path.join('tts_values', 'scenario.csv'), help='where to write the changed events')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.store):
+        print('store doesn\'t exist!')
+        sys.exit()
+
+    with open(args.scenario, encoding='utf-8') as scenario_file:
+        scenario = Scenario.from_dict(json.load(scenario_file))
+
+    inputs = ScenarioInputs(args.store)
+    baseline = run_scenario(inputs, Scenario())
+    result = run_scenario(inputs, scenario)
+    rows = compare(inputs, baseline, result)
+
+    gained = [row for row in rows if row['Meets Reqs'] == 'False' and row['New Meets Reqs'] == 'True']
+    lost = [row for row in rows if row['Meets Reqs'] == 'True' and row['New Meets Reqs'] == 'False']
+
+    print('{} events, {} with a different score'.format(len(inputs), len([row for row in rows if row['Delta'] != 0])))
+    print('{} events gain qualification, {} lose it'.format(len(gained), len(lost)))
+
+    for label, changed in [('gains', gained), ('loses', lost)]:
+        for row in changed:
+            print('  {} {} - {} ({} -> {})'.format(label, row['Tournament'], row['Event'], row['Score'], row['New Score']))
+
+    write_diff(rows, args.out)
+    print('wrote {}'.format(args.out))
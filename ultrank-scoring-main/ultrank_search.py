@@ -1,18 +1,64 @@
 # Requires dateparser, which you can install via `pip install dateparser`.
 
-from startgg_toolkit import send_request
+from startgg_toolkit import send_request, SingleFlightMemo
+import argparse
+import bisect
+import concurrent.futures
 import dateparser
 import csv
+import json
 import os
+import queue
+import re
+import time
 import traceback
 from Levenshtein import jaro_winkler
 from datetime import datetime, timedelta
-from ultrank_bulk import bulk_score, write_results
+from ultrank_bulk import stream_score
+from ultrank_cache import ResultCache
+from ultrank_profile import profiler
+from ultrank_tiering import get_tournament_info
+from ultrank_similarity import similarity_rows
+from ultrank_rules import EventClassifier, SubstringMatcher, load_event_rules
 
 # defines the minimum Jaro-Winkler similarity to
 # categorize a tournament as a related iteration.
 MINIMUM_JARO_SIMILARITY = 0.8
 
+# days before a tournament searched for an earlier iteration of it
+WEEKLY_LOOKBACK_DAYS = 15
+
+OWNER_HISTORY_FILE = 'owner_history.json'
+SEARCH_STATE_FILE = 'search_state.json'
+TOURNAMENT_DETAILS_FILE = 'tournament_details.json'
+
+# tournaments from basic-cache.json whose details are fetched per request
+DETAILS_PER_REQUEST = 75
+
+# tournaments whose details were fetched at least this long after they started are assumed not to change any more
+SETTLED_DAYS = 7
+
+EVENTS_FIELDS = ['Tournament', 'Event', 'Slug', 'Used', 'Skip Reason']
+
+# length of the time shards searched concurrently, and how many to search at once
+SHARD_DAYS = 7
+DISCOVERY_WORKERS = 4
+
+# shards with more pages than this are split in half, down to a minimum length
+SHARD_PAGE_CAP = 20
+MINIMUM_SHARD_SECONDS = 60 * 60
+
+# number of qualifying slugs the search can get ahead of scoring in pipelined mode
+PIPELINE_QUEUE_SIZE = 50
+
+# number of words of a normalized tournament name used to group a series
+SERIES_PREFIX_WORDS = 3
+
+month_names = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october',
+               'november', 'december', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec']
+series_date_regex = re.compile(r'\d{1,4}[/.\-]\d{1,2}(?:[/.\-]\d{1,4})?|\b(?:' + '|'.join(month_names) + r')\b\.?(?:\s*\d{1,2}(?:st|nd|rd|th)?)?')
+series_numbering_regex = re.compile(r'#\s*\d+|\b(?:vol|volume|ep|episode|no|part|pt)\b\.?\s*\d+')
+
 # certain event names to skip string similarity check for
 skip_weekly_check = ['Smash Mouth', 'The Big Bang Hadoken edition', 'Gengar League', 'To The Top',
     'IR Training: Special Edition', 'DAT BlastZone', 'Boss Stage', 'Bonus Stage', 'Smash on Titan',
@@ -20,7 +66,9 @@ skip_weekly_check = ['Smash Mouth', 'The Big Bang Hadoken edition', 'Gengar Leag
     'qualifier', 'lcq', 'Ultimate Gaiden', 'Xenosaga', 'Macrospacing Vancouver', 'Ultimate Challenger Series',
     '月', 'monthly', 'seasonal', 'mensual', 'CLUTCH United Mayhem', '4o4 by Sh33rz: Smash Bowl',
     'Undiscovered Turbo', 'BeeSmash BIG', 'Smash Pro League']
-organizer_blacklist = ['f014e14d', '6d94b652', 'fef75a6a', 'ebbf7fac', '4472fa92', '886decc2']
+skip_weekly_check_matcher = SubstringMatcher(skip_weekly_check)
+
+organizer_blacklist = {'f014e14d', '6d94b652', 'fef75a6a', 'ebbf7fac', '4472fa92', '886decc2'}
 
 class Tournament:
     def __init__(self, name, slug, start_at):
@@ -31,8 +79,8 @@ class Tournament:
         self.similarity = 0
 
 
-def tournaments_query(start_time, end_time, page=1, per_page=75):
-    query = '''query tournamentsQuery($pageNum: Int!, $perPage: Int!, $startTime: Timestamp!, $endTime: Timestamp!) {
+def tournaments_query(start_time, end_time, page=1, per_page=75, updated_after=None):
+    query = '''query tournamentsQuery($pageNum: Int!, $perPage: Int!, $startTime: Timestamp!, $endTime: Timestamp!, $updatedAfter: Timestamp) {
   tournaments (
     query: {
       page: $pageNum,
@@ -41,7 +89,8 @@ def tournaments_query(start_time, end_time, page=1, per_page=75):
         hasOnlineEvents: false,
         videogameIds: [1386],
         afterDate: $startTime,
-        beforeDate: $endTime
+        beforeDate: $endTime,
+        computedUpdatedAt: $updatedAfter
       }
     }
   ) {
@@ -51,6 +100,11 @@ def tournaments_query(start_time, end_time, page=1, per_page=75):
     nodes {
       slug
       name
+      startAt
+      owner {
+        id
+        discriminator
+      }
       events {
         name
         type
@@ -67,8 +121,78 @@ def tournaments_query(start_time, end_time, page=1, per_page=75):
         "pageNum": {},
         "perPage": {},
         "startTime": {},
-        "endTime": {}
-    }}'''.format(page, per_page, start_time, end_time)
+        "endTime": {},
+        "updatedAfter": {}
+    }}'''.format(page, per_page, start_time, end_time, json.dumps(updated_after))
+
+    return query, variables
+
+
+def tournament_details_query(tournament_ids):
+    query = '''query tournamentDetailsQuery($ids: [ID], $perPage: Int!) {
+  tournaments (
+    query: {
+      page: 1,
+      perPage: $perPage,
+      filter: {
+        ids: $ids,
+        hasOnlineEvents: false,
+        videogameIds: [1386]
+      }
+    }
+  ) {
+    nodes {
+      slug
+      name
+      startAt
+      owner {
+        id
+        discriminator
+      }
+      events {
+        name
+        type
+        videogame {
+          id
+        }
+        slug
+        numEntrants
+      }
+    }
+  }
+}'''
+    variables = '''{{
+        "ids": {},
+        "perPage": {}
+    }}'''.format(json.dumps(tournament_ids), len(tournament_ids))
+
+    return query, variables
+
+
+def tournament_changes_query(tournament_ids, updated_after):
+    """Generates a query for which of the given tournaments were updated after `updated_after`, online or not."""
+
+    query = '''query tournamentChangesQuery($ids: [ID], $perPage: Int!, $updatedAfter: Timestamp) {
+  tournaments (
+    query: {
+      page: 1,
+      perPage: $perPage,
+      filter: {
+        ids: $ids,
+        computedUpdatedAt: $updatedAfter
+      }
+    }
+  ) {
+    nodes {
+      slug
+    }
+  }
+}'''
+    variables = '''{{
+        "ids": {},
+        "perPage": {},
+        "updatedAfter": {}
+    }}'''.format(json.dumps(tournament_ids), len(tournament_ids), json.dumps(updated_after))
 
     return query, variables
 
@@ -116,73 +240,143 @@ def admin_query(tournament_slug, page=1, per_page=75):
 
     return query, variables
 
-def tournament_owner_query(tournament_slug):
-    query = '''query tournamentOwnerQuery($tournamentSlug: String!) {
-  tournament(slug: $tournamentSlug) {
-    owner {
-      discriminator
-    }
-  }
-}'''
-    variables = '''{{
-        "tournamentSlug": "{}"
-    }}'''.format(tournament_slug)
 
-    return query, variables
+class OwnerHistoryCache:
+    """Every Ultimate tournament run by each tournament owner, keyed by owner id.
 
+    Each owner's history is refreshed at most once per run. A refresh downloads the
+    tournaments starting after the previous refresh (which may have been created or
+    changed since) and those starting in the run's lookback window, and replaces the
+    cached entries in that range. The cache can be saved between runs.
+    """
 
-def get_admined_tournaments(tournament_slug, day_range=15):
-    """Gather all tournament names with the same owner as the requested tournament,
-    within the specified day range prior.
+    def __init__(self):
+        self.histories = {}
+        self.start_times = {}
+        self.refreshed = SingleFlightMemo()
+        self.since = None
 
-    Puts the requested tournament as the first item in the returned array.
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding='utf-8') as history_file:
+            self.histories = json.load(history_file)
+
+    def save(self, path):
+        with open(path, mode='w', encoding='utf-8') as history_file:
+            json.dump(self.histories, history_file)
+
+    def begin(self, since):
+        """Starts a run: histories are refreshed again, re-fetching tournaments that start from `since` on."""
+
+        self.since = since
+        self.refreshed.clear()
+
+    def refresh(self, owner_id, tournament_slug):
+        key = str(owner_id)
+        history = self.histories.get(key, {'fetched_at': None, 'tournaments': []})
+
+        fetched_at = int(time.time())
+
+        # Histories saved before refreshes were timed are downloaded again in full
+        cutoff = history.get('fetched_at')
+        if cutoff is not None and self.since is not None:
+            cutoff = min(cutoff, self.since)
+
+        fetched = fetch_owner_tournaments(tournament_slug, owner_id, cutoff)
+        fetched_slugs = {entry[2] for entry in fetched}
+
+        # Cached entries in the re-fetched range are dropped, so removed tournaments go too
+        kept = [entry for entry in history['tournaments']
+                if cutoff is not None and entry[0] < cutoff and entry[2] not in fetched_slugs]
+
+        tournaments = sorted(kept + fetched, key=lambda entry: entry[0])
+
+        self.histories[key] = {'fetched_at': fetched_at, 'tournaments': tournaments}
+        self.start_times[key] = [entry[0] for entry in tournaments]
+
+    def ensure(self, owner_id, tournament_slug):
+        """Refreshes the owner's history if it hasn't been refreshed yet this run."""
+
+        self.refreshed.get(owner_id, lambda: self.refresh(owner_id, tournament_slug))
+
+    def is_refreshed(self, owner_id):
+        return owner_id in self.refreshed
+
+    def has_history(self, owner_id):
+        return str(owner_id) in self.histories
+
+    def tournaments(self, owner_id):
+        """Returns the cached [startAt, name, slug, hasOfflineEvents] entries of an owner, oldest first."""
+
+        return self.histories.get(str(owner_id), {'tournaments': []})['tournaments']
+
+    def lookback(self, owner_id, tournament_slug, start_at, day_range):
+        """Returns the owner's offline tournaments in the `day_range` days up to `start_at`, most recent first."""
+
+        self.ensure(owner_id, tournament_slug)
+
+        tournaments = self.histories[str(owner_id)]['tournaments']
+        start_times = self.start_times[str(owner_id)]
+
+        range_start = (datetime.fromtimestamp(start_at) - timedelta(days=day_range)).timestamp()
+
+        lower = bisect.bisect_left(start_times, range_start)
+        upper = bisect.bisect_right(start_times, start_at)
+
+        return [Tournament(name, slug, entry_start) for entry_start, name, slug, has_offline_events in reversed(tournaments[lower:upper])
+                if slug != tournament_slug and has_offline_events]
+
+
+def fetch_owner_tournaments(tournament_slug, owner_id, since=None):
+    """Gathers [startAt, name, slug, hasOfflineEvents] for the tournaments owned by the owner of a tournament.
+
+    With `since`, stops after the first page that reaches tournaments starting before it.
     """
 
     page = 1
     tournaments = []
-    tournament_name = None
-    tournament_owner_id = None
-    tournament_start = None
-    range_start = None
 
     while True:
         query, variables = admin_query(tournament_slug, page)
         resp = send_request(query, variables, quiet=True)
-        # print(resp)
-
-        # Set tournament-specific variables if not set
-        if tournament_name == None:
-            tournament_name = resp['data']['tournament']['name']
-        if tournament_owner_id == None:
-            tournament_owner_id = resp['data']['tournament']['owner']['id']
-        if tournament_start == None:
-            tournament_start = resp['data']['tournament']['startAt']
-        if range_start == None:
-            tournament_start_datetime = datetime.fromtimestamp(
-                tournament_start)
-            range_start_timedelta = timedelta(days=day_range)
-            range_start = (tournament_start_datetime -
-                           range_start_timedelta).timestamp()
-
-        if resp['data']['tournament']['owner']['tournaments'] is None:
+
+        owner_tournaments = resp['data']['tournament']['owner']['tournaments']
+
+        if owner_tournaments is None:
             break
 
-        # Gather tournaments
-        tournaments.extend([Tournament(tournament['name'], tournament['slug'], tournament['startAt']) for tournament in resp['data']['tournament']['owner']['tournaments']['nodes'] if (
-            tournament['owner']['id'] == tournament_owner_id and tournament['slug'] != tournament_slug and tournament['startAt'] >= range_start and tournament['startAt'] <= tournament_start
-            and tournament['hasOfflineEvents'])])
+        tournaments.extend([[tournament['startAt'], tournament['name'], tournament['slug'], tournament['hasOfflineEvents']]
+                            for tournament in owner_tournaments['nodes'] if tournament['owner']['id'] == owner_id])
 
-        # Check if all tournaments are before the requested tournament.
-        # Since the API returns tournaments in reverse chronological order, this means that we don't need to check the rest.
-        if len([tournament for tournament in resp['data']['tournament']['owner']['tournaments']['nodes'] if (tournament['owner']['id'] == resp['data']['tournament']['owner']['id'] and tournament['startAt'] < tournament_start)]) == 0:
+        # Since the API returns tournaments in reverse chronological order, everything past this page starts before `since`.
+        if since is not None and len([tournament for tournament in owner_tournaments['nodes'] if tournament['startAt'] < since]) != 0:
             break
 
-        if page >= resp['data']['tournament']['owner']['tournaments']['pageInfo']['totalPages']:
+        if page >= owner_tournaments['pageInfo']['totalPages']:
             break
         page += 1
 
+    return tournaments
+
+
+owner_histories = OwnerHistoryCache()
+
+
+def get_admined_tournaments(tournament_slug, day_range=WEEKLY_LOOKBACK_DAYS):
+    """Gather all tournament names with the same owner as the requested tournament,
+    within the specified day range prior.
+
+    Puts the requested tournament as the first item in the returned array.
+    """
+
+    info = get_tournament_info(tournament_slug)
+
+    tournaments = owner_histories.lookback(info['owner_id'], tournament_slug, info['start_at'], day_range)
+
     tournaments.insert(0, Tournament(
-        tournament_name, tournament_slug, tournament_start))
+        info['name'], tournament_slug, info['start_at']))
 
     return tournaments
 
@@ -201,240 +395,765 @@ def check_potential_weekly(tournament_slug):
 
     return None
 
-def check_blacklist(tournament_slug):
-    query, variables = tournament_owner_query(tournament_slug)
-    resp = send_request(query, variables)
+def normalize_series_name(name):
+    """Reduces a tournament name to the part shared by every iteration of its series.
+
+    Lowercases the name and strips dates, numbering ("#12", "Vol. 3") and punctuation,
+    then keeps the first few words.
+    """
+
+    name = name.lower()
+    name = series_date_regex.sub(' ', name)
+    name = series_numbering_regex.sub(' ', name)
+    name = re.sub(r'\d+', ' ', name)
+    name = re.sub(r'[\W_]+', ' ', name)
+
+    return ' '.join(name.split()[:SERIES_PREFIX_WORDS])
+
+
+class SeriesIndex:
+    """Buckets tournaments by owner and normalized series name.
+
+    Looking up a tournament's bucket finds earlier iterations of the same series
+    without comparing it against every other tournament.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.seen = set()
+        self.merged_owners = set()
+
+    def add(self, owner_id, name, slug, start_at):
+        if slug in self.seen or start_at is None:
+            return
 
-    return resp['data']['tournament']['owner']['discriminator'] in organizer_blacklist
+        key = normalize_series_name(name)
+        if key == '':
+            return
 
+        self.seen.add(slug)
+        bisect.insort(self.series.setdefault((str(owner_id), key), []), (start_at, name, slug))
+
+    def add_owner_history(self, owner_id):
+        """Adds an owner's cached history, once per owner."""
+
+        if str(owner_id) in self.merged_owners:
+            return
+
+        self.merged_owners.add(str(owner_id))
+
+        for start_at, name, slug, has_offline_events in owner_histories.tournaments(owner_id):
+            if has_offline_events:
+                self.add(owner_id, name, slug, start_at)
+
+    def find_prior(self, owner_id, name, slug, start_at, day_range=WEEKLY_LOOKBACK_DAYS):
+        """Returns the most recent iteration of the same series within `day_range` days before `start_at`, or None.
+
+        Iterations whose full names are less similar than MINIMUM_JARO_SIMILARITY don't count, as in the baseline check.
+        """
+
+        key = normalize_series_name(name)
+        if key == '':
+            return None
+
+        iterations = self.series.get((str(owner_id), key), [])
+
+        range_start = (datetime.fromtimestamp(start_at) - timedelta(days=day_range)).timestamp()
+        upper = bisect.bisect_right(iterations, (start_at, chr(0x10ffff)))
+
+        for prior_start, prior_name, prior_slug in reversed(iterations[:upper]):
+            if prior_start < range_start:
+                break
+            if prior_slug == slug:
+                continue
+
+            similarity = jaro_winkler(name, prior_name, score_cutoff=MINIMUM_JARO_SIMILARITY)
+            if similarity == 0:
+                continue
+
+            prior = Tournament(prior_name, prior_slug, prior_start)
+            prior.time_since = start_at - prior_start
+            prior.similarity = similarity
+
+            return prior
+
+        return None
+
+
+def build_series_index(tournaments):
+    """Builds a series index from the tournaments in the search window plus any owner histories already cached."""
+
+    series_index = SeriesIndex()
+
+    for tournament in tournaments:
+        if tournament['owner'] is not None:
+            series_index.add(tournament['owner']['id'], tournament['name'], tournament['slug'], tournament['startAt'])
+
+            if owner_histories.has_history(tournament['owner']['id']):
+                series_index.add_owner_history(tournament['owner']['id'])
+
+    return series_index
+
+
+class WeeklySimilarityCheck:
+    """Runs the string-similarity weekly check for all of an owner's tournaments in the search window at once.
+
+    The first time any of an owner's tournaments is checked, every one of them is compared
+    against the owner's cached history in one batch and the results are kept.
+    """
+
+    def __init__(self, tournaments):
+        self.candidates = {}
+        self.results = {}
+
+        for tournament in tournaments:
+            if tournament['owner'] is not None and tournament['startAt'] is not None:
+                self.candidates.setdefault(str(tournament['owner']['id']), []).append(tournament)
+
+    def check(self, tournament, day_range=WEEKLY_LOOKBACK_DAYS):
+        if tournament['slug'] not in self.results:
+            self.check_owner(tournament['owner']['id'], day_range)
+
+        return self.results[tournament['slug']]
+
+    def check_owner(self, owner_id, day_range):
+        candidates = self.candidates[str(owner_id)]
+
+        history = [entry for entry in owner_histories.tournaments(owner_id) if entry[3]]
+        start_times = [entry[0] for entry in history]
+
+        rows = similarity_rows([candidate['name'] for candidate in candidates], [entry[1] for entry in history],
+                               MINIMUM_JARO_SIMILARITY)
+
+        for candidate, row in zip(candidates, rows):
+            self.results[candidate['slug']] = None
+
+            range_start = (datetime.fromtimestamp(candidate['startAt']) - timedelta(days=day_range)).timestamp()
+            lower = bisect.bisect_left(start_times, range_start)
+            upper = bisect.bisect_right(start_times, candidate['startAt'])
+
+            # Most recent first, stopping at the first similar name
+            for index in range(upper - 1, lower - 1, -1):
+                start_at, name, slug, _ = history[index]
+
+                if slug == candidate['slug'] or index not in row:
+                    continue
+
+                prior = Tournament(name, slug, start_at)
+                prior.time_since = candidate['startAt'] - start_at
+                prior.similarity = row[index]
+                self.results[candidate['slug']] = prior
+                break
+
+
+def find_probable_weekly(tournament, series_index, similarity_check):
+    """Finds an earlier iteration of a tournament's series, or returns None.
+
+    Checks the series index first. If that finds nothing, the owner's history is refreshed
+    and added to the index, and the string-similarity check runs as a fallback.
+    """
+
+    if tournament['owner'] is None or tournament['startAt'] is None:
+        return check_potential_weekly(tournament['slug'])
+
+    owner_id = tournament['owner']['id']
+
+    prior = series_index.find_prior(owner_id, tournament['name'], tournament['slug'], tournament['startAt'])
+    if prior is not None:
+        return prior
+
+    if not owner_histories.is_refreshed(owner_id):
+        owner_histories.ensure(owner_id, tournament['slug'])
+        series_index.merged_owners.discard(str(owner_id))
+        series_index.add_owner_history(owner_id)
+
+        prior = series_index.find_prior(owner_id, tournament['name'], tournament['slug'], tournament['startAt'])
+        if prior is not None:
+            return prior
+
+    return similarity_check.check(tournament)
+
+
+def check_blacklist(tournament):
+    """Checks a tournament's owner against the blacklist, using the owner from the search when it's there."""
+
+    if tournament['owner'] is not None and 'discriminator' in tournament['owner']:
+        return tournament['owner']['discriminator'] in organizer_blacklist
+
+    return get_tournament_info(tournament['slug'])['owner_discriminator'] in organizer_blacklist
+
+
+def fetch_shard(start_time, end_time, page_cap=SHARD_PAGE_CAP, updated_after=None):
+    """Retrieves every tournament in one time shard, or only those updated since `updated_after`.
+
+    Returns None without fetching past the first page if the shard has more than
+    `page_cap` pages and can still be split.
+    """
 
-def retrieve_event_slugs(start_time, end_time, directory='tts_values'):
     page = 1
+    tournaments = []
+
+    while True:
+        query, variables = tournaments_query(
+            start_time, end_time, page=page, updated_after=updated_after)
+        resp = send_request(query, variables, quiet=True)
+
+        tournaments.extend(resp['data']['tournaments']['nodes'])
+
+        total_pages = resp['data']['tournaments']['pageInfo']['totalPages']
+
+        if page == 1 and total_pages > page_cap:
+            if end_time - start_time > MINIMUM_SHARD_SECONDS:
+                return None
+
+            print('warning: {} pages between {} and {}, fetching them all'.format(total_pages, start_time, end_time))
+
+        if page >= total_pages:
+            break
+        page += 1
+
+    return tournaments
+
+
+def discover_tournaments(start_time, end_time, workers=DISCOVERY_WORKERS, updated_after=None):
+    """Retrieves every tournament in the search window, or only those updated since `updated_after`.
+
+    The window is split into shards of SHARD_DAYS days which are fetched concurrently.
+    Shards with too many pages are split in half until they fit, so the API's
+    pagination limits never cut results off.
+    """
+
+    shard_seconds = SHARD_DAYS * 24 * 60 * 60
+    shards = [(shard_start, min(shard_start + shard_seconds, end_time))
+              for shard_start in range(start_time, end_time, shard_seconds)] or [(start_time, end_time)]
+
+    tournaments = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(fetch_shard, shard_start, shard_end, updated_after=updated_after): (shard_start, shard_end)
+                   for shard_start, shard_end in shards}
+
+        while len(pending) > 0:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                shard_start, shard_end = pending.pop(future)
+                shard_tournaments = future.result()
+
+                if shard_tournaments is None:
+                    middle = (shard_start + shard_end) // 2
+                    pending[pool.submit(fetch_shard, shard_start, middle, updated_after=updated_after)] = (shard_start, middle)
+                    pending[pool.submit(fetch_shard, middle, shard_end, updated_after=updated_after)] = (middle, shard_end)
+                    continue
+
+                print('found {} tournaments'.format(len(shard_tournaments)))
+
+                # Shards share their boundaries, so drop duplicates
+                for tournament in shard_tournaments:
+                    tournaments[tournament['slug']] = tournament
+
+    return sorted(tournaments.values(), key=lambda tournament: (tournament['startAt'] or 0, tournament['slug']))
+
+
+def classify_tournament(tournament, series_index, similarity_check, event_classifier):
+    """Decides which events of a tournament to use.
+
+    Returns the events.csv rows for every event, and the slugs of the events to use.
+    """
+
+    rows = []
     slugs = []
 
+    try:
+        events = [event for event in tournament['events'] if (
+            event['type'] == 1 and event['videogame']['id'] == 1386 and event['numEntrants'] != None)]
+
+        events.sort(
+            reverse=True, key=lambda event: event['numEntrants'])
+
+        added_event = False
+
+        potential_weekly = "not checked"
+
+        if skip_weekly_check_matcher.search(tournament['name']):
+            potential_weekly = "skip"
+
+        tournament_match = event_classifier.match_tournament(tournament['name'])
+
+        ladder_potential = None
+        ladder_rule = None
+
+        blacklisted = len(events) > 0 and check_blacklist(tournament)
+
+        for event in events:
+            # if iter_ == 7:
+            #     print(event['slug'])
+            if blacklisted:
+                rows.append({'Tournament': tournament['name'],
+                             'Event': event['name'],
+                             'Slug': event['slug'],
+                             'Used': 'False',
+                             'Skip Reason': 'Tournament Creator Blacklisted'})
+                continue
+
+            rule = event_classifier.classify(event['name'], tournament_match)
+
+            if rule is not None and rule.action == 'skip':
+                rows.append({'Tournament': tournament['name'],
+                             'Event': event['name'],
+                             'Slug': event['slug'],
+                             'Used': 'False',
+                             'Skip Reason': rule.skip_reason})
+                continue
+
+            if rule is not None and rule.action == 'ladder':
+                ladder_potential = event
+                ladder_rule = rule
+                continue
+
+            if added_event:
+                rows.append({'Tournament': tournament['name'],
+                             'Event': event['name'],
+                             'Slug': event['slug'],
+                             'Used': 'False',
+                             'Skip Reason': 'Other Larger Event in Tournament'})
+                continue
+
+            if rule is not None and rule.action == 'monthly':
+                rows.append({'Tournament': tournament['name'],
+                             'Event': event['name'],
+                             'Slug': event['slug'],
+                             'Used': 'True'})
+
+                slugs.append(event['slug'])
+                added_event = True
+                continue
+
+            if potential_weekly == "not checked":
+                potential_weekly = find_probable_weekly(tournament, series_index, similarity_check)
+
+            if isinstance(potential_weekly, Tournament):
+                days_since = str(
+                    round(potential_weekly.time_since / (24 * 60 * 60)))
+
+                rows.append({'Tournament': tournament['name'],
+                             'Event': event['name'],
+                             'Slug': event['slug'],
+                             'Used': 'False',
+                             'Skip Reason': 'Probable Weekly [{:.5f}] (found tournament {} [{}] which precedes by {} days)'.format(potential_weekly.similarity, potential_weekly.name, potential_weekly.slug, days_since)})
+                added_event = True
+
+                continue
+
+            rows.append({'Tournament': tournament['name'],
+                         'Event': event['name'],
+                         'Slug': event['slug'],
+                         'Used': 'True'})
+
+            slugs.append(event['slug'])
+            added_event = True
+
+        if ladder_potential:
+            if added_event:
+                rows.append({'Tournament': tournament['name'],
+                             'Event': ladder_potential['name'],
+                             'Slug': ladder_potential['slug'],
+                             'Used': 'False',
+                             'Skip Reason': ladder_rule.skip_reason})
+            else:
+                rows.append({'Tournament': tournament['name'],
+                             'Event': ladder_potential['name'],
+                             'Slug': ladder_potential['slug'],
+                             'Used': 'True'})
+
+                slugs.append(ladder_potential['slug'])
+                added_event = True
+    except Exception as e:
+        print(e)
+        print(tournament['slug'])
+        traceback.print_exc()
+
+    return rows, slugs
+
+
+class SearchState:
+    """What the previous search found, so the next one can skip tournaments that haven't changed.
+
+    Keeps the last window searched, the time the search started (the watermark) and, for
+    each tournament in that window, the tournament as returned by the API along with the
+    events.csv rows and slugs it produced.
+    """
+
+    def __init__(self):
+        self.start_time = None
+        self.end_time = None
+        self.watermark = None
+        self.tournaments = {}
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding='utf-8') as state_file:
+            state = json.load(state_file)
+
+        self.start_time = state['start_time']
+        self.end_time = state['end_time']
+        self.watermark = state['watermark']
+        self.tournaments = state['tournaments']
+
+    def save(self, path):
+        with open(path, mode='w', encoding='utf-8') as state_file:
+            json.dump({'start_time': self.start_time,
+                       'end_time': self.end_time,
+                       'watermark': self.watermark,
+                       'tournaments': self.tournaments}, state_file)
+
+    def overlaps(self, start_time, end_time):
+        return self.watermark is not None and self.start_time <= end_time and start_time <= self.end_time
+
+    def window_tournaments(self, start_time, end_time):
+        """Returns the saved tournaments starting inside a window."""
+
+        return [entry['tournament'] for entry in self.tournaments.values()
+                if entry['tournament']['startAt'] is not None and start_time <= entry['tournament']['startAt'] <= end_time]
+
+
+class BasicCacheSource:
+    """Finds tournaments in the dashboard's basic-cache.json instead of searching start.gg.
+
+    The cache has every Ultimate tournament with its Ultimate events' entrant counts, but
+    not the event slugs and types, the owner or whether the tournament is offline. Those
+    are fetched, 75 tournaments per request, only for tournaments with entrants, and kept
+    in tournament_details.json with the time they were fetched. Details fetched before a
+    tournament settled are checked again with one request per 75 tournaments, and only
+    the tournaments updated since are fetched again. Parts of the window before or after
+    the cache's tournaments are searched on start.gg as usual.
+    """
+
+    def __init__(self, path, details_path=os.path.join('tts_values', TOURNAMENT_DETAILS_FILE)):
+        with open(path, encoding='utf-8') as cache_file:
+            cache = json.load(cache_file)
+
+        # The dashboard stores the API's {"tournaments": {"nodes": [...]}} shape
+        nodes = cache['tournaments']['nodes'] if isinstance(cache, dict) else cache
+
+        self.nodes = sorted([node for node in nodes if node.get('startAt') is not None and node.get('slug')],
+                            key=lambda node: node['startAt'])
+        self.start_times = [node['startAt'] for node in self.nodes]
+
+        self.details_path = details_path
+        self.details = {}
+
+        if os.path.exists(details_path):
+            with open(details_path, encoding='utf-8') as details_file:
+                self.details = json.load(details_file)
+
+    def save_details(self):
+        with open(self.details_path, mode='w', encoding='utf-8') as details_file:
+            json.dump(self.details, details_file)
+
+    def is_settled(self, entry):
+        # Entries saved before fetch times were kept were only saved once settled
+        return entry.get('fetched_at') is None or entry['fetched_at'] >= entry['start_at'] + SETTLED_DAYS * 24 * 60 * 60
+
+    def fetch_details(self, nodes):
+        """Fetches the search's fields for a batch of cached tournaments. Online tournaments come back as None."""
+
+        fetched_at = int(time.time())
+
+        query, variables = tournament_details_query([node['id'] for node in nodes])
+        resp = send_request(query, variables, quiet=True)
+
+        found = {tournament['slug']: tournament for tournament in resp['data']['tournaments']['nodes']}
+
+        for node in nodes:
+            self.details[node['slug']] = {'start_at': node['startAt'], 'fetched_at': fetched_at,
+                                          'tournament': found.get(node['slug'])}
+
+    def find_changed(self, nodes):
+        """Returns the slugs of a batch of cached tournaments that were updated since their details were fetched."""
+
+        updated_after = min(self.details[node['slug']]['fetched_at'] for node in nodes)
+
+        query, variables = tournament_changes_query([node['id'] for node in nodes], updated_after)
+        resp = send_request(query, variables, quiet=True)
+
+        return [tournament['slug'] for tournament in resp['data']['tournaments']['nodes']]
+
+    def discover(self, start_time, end_time, workers=DISCOVERY_WORKERS):
+        if len(self.nodes) == 0:
+            return discover_tournaments(start_time, end_time)
+
+        tournaments = {}
+
+        # Search start.gg for whatever the cache doesn't reach
+        gaps = []
+        if start_time < self.start_times[0]:
+            gaps.append((start_time, min(end_time, self.start_times[0])))
+        if end_time > self.start_times[-1]:
+            gaps.append((max(start_time, self.start_times[-1]), end_time))
+
+        for gap_start, gap_end in gaps:
+            for tournament in discover_tournaments(gap_start, gap_end):
+                tournaments[tournament['slug']] = tournament
+
+        lower = bisect.bisect_left(self.start_times, start_time)
+        upper = bisect.bisect_right(self.start_times, end_time)
+
+        # Tournaments without entrants wouldn't have any events to check
+        cached = [node for node in self.nodes[lower:upper]
+                  if any(event.get('numEntrants') is not None for event in node.get('events') or [])]
+
+        unsettled = [node for node in cached if node['slug'] in self.details and node.get('id') is not None
+                     and not self.is_settled(self.details[node['slug']])]
+        batches = [unsettled[index:index + DETAILS_PER_REQUEST] for index in range(0, len(unsettled), DETAILS_PER_REQUEST)]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            changed = set(slug for slugs in pool.map(self.find_changed, batches) for slug in slugs)
+
+        missing = [node for node in cached if (node['slug'] not in self.details or node['slug'] in changed)
+                   and node.get('id') is not None]
+        batches = [missing[index:index + DETAILS_PER_REQUEST] for index in range(0, len(missing), DETAILS_PER_REQUEST)]
+
+        print('{} tournaments in basic cache, {} changed since their details were fetched, fetching details for {}'.format(
+            len(cached), len(changed), len(missing)))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(self.fetch_details, batches))
+
+        for node in cached:
+            entry = self.details.get(node['slug'])
+
+            if entry is not None and entry['tournament'] is not None:
+                tournaments[node['slug']] = entry['tournament']
+
+        self.save_details()
+
+        return sorted(tournaments.values(), key=lambda tournament: (tournament['startAt'] or 0, tournament['slug']))
+
+
+def discover_changed_tournaments(state, start_time, end_time):
+    """Retrieves the tournaments in the window that the saved state doesn't have up to date.
+
+    The part of the window the state covers only asks for tournaments updated since its
+    watermark; the rest of the window is searched in full.
+    """
+
+    covered_start = max(start_time, state.start_time)
+    covered_end = min(end_time, state.end_time)
+
+    tournaments = discover_tournaments(covered_start, covered_end, updated_after=state.watermark)
+
+    if start_time < covered_start:
+        tournaments.extend(discover_tournaments(start_time, covered_start))
+    if covered_end < end_time:
+        tournaments.extend(discover_tournaments(covered_end, end_time))
+
+    return tournaments
+
+
+def search_events(start_time, end_time, directory='tts_values', incremental=False, slug_queue=None, source=None):
+    """Searches for tournaments, writes events.csv and returns (slugs to use, slugs whose tournament changed).
+
+    With `incremental`, a window overlapping the previous search only fetches tournaments
+    updated since that search, and only tournaments that differ from the saved copy are
+    classified again. The others keep their saved rows, so a tournament is not rechecked
+    when a new tournament would change its weekly check; run a full search for that.
+
+    With `slug_queue`, a slug object for each slug to use is put in the queue as soon as
+    its tournament has been checked.
+
+    With `source` (a BasicCacheSource), tournaments are found in the dashboard's cache.
+    """
+
+    slugs = []
+    changed_slugs = []
+
     if not os.path.isdir(directory):
         os.mkdir(directory)
 
+    search_started = int(time.time())
+
+    owner_histories.load(os.path.join(directory, OWNER_HISTORY_FILE))
+    owner_histories.begin(int((datetime.fromtimestamp(start_time) - timedelta(days=WEEKLY_LOOKBACK_DAYS)).timestamp()))
+
+    state = SearchState()
+    if incremental:
+        state.load(os.path.join(directory, SEARCH_STATE_FILE))
+
+    resuming = incremental and state.overlaps(start_time, end_time)
+
+    with profiler.stage('discovery'):
+        if source is not None:
+            fetched = source.discover(start_time, end_time)
+        elif resuming:
+            fetched = discover_changed_tournaments(state, start_time, end_time)
+            print('{} tournaments changed since the last search'.format(len(fetched)))
+        else:
+            fetched = discover_tournaments(start_time, end_time)
+
+    if resuming:
+        window = {tournament['slug']: tournament for tournament in state.window_tournaments(start_time, end_time)}
+    else:
+        window = {}
+        state = SearchState()
+
+    # Only this window is kept, so the saved state doesn't grow with every search
+    state.start_time = start_time
+    state.end_time = end_time
+
+    for tournament in fetched:
+        window[tournament['slug']] = tournament
+
+    tournaments = sorted(window.values(), key=lambda tournament: (tournament['startAt'] or 0, tournament['slug']))
+
+    with profiler.stage('series index'):
+        series_index = build_series_index(tournaments)
+        similarity_check = WeeklySimilarityCheck(tournaments)
+        event_classifier = EventClassifier(load_event_rules())
+
+    print('checking {} tournaments'.format(len(tournaments)))
+
     with open(os.path.join(directory, 'events.csv'), newline='', mode='w') as events_file:
         writer = csv.DictWriter(
-            events_file, ['Tournament', 'Event', 'Slug', 'Used', 'Skip Reason'])
+            events_file, EVENTS_FIELDS)
         writer.writeheader()
-        # iter_ = 0
-        while True:
-            # iter_ += 1
-            query, variables = tournaments_query(
-                start_time, end_time, page=page)
-            resp = send_request(query, variables, quiet=True)
-
-            print('checking {} tournaments'.format(len(resp['data']['tournaments']['nodes'])))
-
-            for tournament in resp['data']['tournaments']['nodes']:
-                try:
-                    events = [event for event in tournament['events'] if (
-                        event['type'] == 1 and event['videogame']['id'] == 1386 and event['numEntrants'] != None)]
-
-                    events.sort(
-                        reverse=True, key=lambda event: event['numEntrants'])
-
-                    added_event = False
-
-                    potential_weekly = "not checked"
-                    
-                    for skip in skip_weekly_check:
-                        if skip.lower() in tournament['name'].lower():
-                            potential_weekly = "skip"
-
-                    ladder_potential = None
-
-                    for event in events:
-                        # if iter_ == 7:
-                        #     print(event['slug'])
-                        if check_blacklist(tournament['slug']):
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Tournament Creator Blacklisted'})
-                            continue
-
-                        if tournament['name'].lower().find('weekly') != -1 or event['name'].lower().find('weekly') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Weekly (contains string "weekly")'})
-                            continue
-
-                        if tournament['name'].lower().find('weeklies') != -1 or event['name'].lower().find('weeklies') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Weekly (contains string "weeklies")'})
-                            continue
-
-                        if tournament['name'].lower().find('arcadian') != -1 or event['name'].lower().find('arcadian') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Arcadian (contains string "arcadian")'})
-                            continue
-
-                        if event['name'].lower().find('ladder') != -1:
-                            ladder_potential = event
-                            continue
-
-                        if event['name'].lower().find('redemption') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "redemption")'})
-                            continue
-
-                        if event['name'].lower().find('resurrection') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "resurrection")'})
-                            continue
-
-                        if event['name'].lower().find('buster') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "buster")'})
-                            continue
-
-                        if event['name'].lower().find('amateur') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "amateur")'})
-                            continue
-
-                        if event['name'].lower().find('squad') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "squad")'})
-                            continue
-
-                        if event['name'].lower().find('random') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "random")'})
-                            continue
-
-                        if event['name'].lower().find('cpu') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "cpu")'})
-                            continue
-
-                        if event['name'].lower().find('amiibo') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "amiibo")'})
-                            continue
-
-                        if event['name'].lower().find('hdr') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "hdr")'})
-                            continue
-
-                        if event['name'].lower().find('wait') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Waitlist (contains string "wait")'})
-                            continue
-
-                        if added_event:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Other Larger Event in Tournament'})
-                            continue
-
-                        if tournament['name'].lower().find('monthly') != -1 or event['name'].lower().find('monthly') != -1:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'True'})
-
-                            slugs.append(event['slug'])
-                            added_event = True
-                            continue
-
-                        if potential_weekly == "not checked":
-                            potential_weekly = check_potential_weekly(tournament['slug'])
-
-                        if isinstance(potential_weekly, Tournament):
-                            days_since = str(
-                                round(potential_weekly.time_since / (24 * 60 * 60)))
-
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': event['name'],
-                                             'Slug': event['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Weekly [{:.5f}] (found tournament {} [{}] which precedes by {} days)'.format(potential_weekly.similarity, potential_weekly.name, potential_weekly.slug, days_since)})
-                            added_event = True
-
-                            continue
-
-                        writer.writerow({'Tournament': tournament['name'],
-                                         'Event': event['name'],
-                                         'Slug': event['slug'],
-                                         'Used': 'True'})
-
-                        slugs.append(event['slug'])
-                        added_event = True
-
-                    if ladder_potential:
-                        if added_event:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': ladder_potential['name'],
-                                             'Slug': ladder_potential['slug'],
-                                             'Used': 'False',
-                                             'Skip Reason': 'Probable Side Event (contains string "ladder")'})
-                        else:
-                            writer.writerow({'Tournament': tournament['name'],
-                                             'Event': ladder_potential['name'],
-                                             'Slug': ladder_potential['slug'],
-                                             'Used': 'True'})
-
-                            slugs.append(ladder_potential['slug'])
-                            added_event = True
-                except Exception as e:
-                    print(e)
-                    print(tournament['slug'])
-                    traceback.print_exc()
-
-            if page >= resp['data']['tournaments']['pageInfo']['totalPages']:
-                break
-            page += 1
+
+        for tournament in tournaments:
+            saved = state.tournaments.get(tournament['slug'])
+
+            changed = saved is None or saved['tournament'] != tournament
+
+            if not changed:
+                rows, tournament_slugs = saved['rows'], saved['slugs']
+            else:
+                with profiler.stage('classification'):
+                    rows, tournament_slugs = classify_tournament(tournament, series_index, similarity_check,
+                                                                 event_classifier)
+                changed_slugs.extend(tournament_slugs)
+
+                state.tournaments[tournament['slug']] = {'tournament': tournament,
+                                                         'rows': rows,
+                                                         'slugs': tournament_slugs}
+
+            writer.writerows(rows)
+            slugs.extend(tournament_slugs)
+
+            if slug_queue is not None:
+                for slug in tournament_slugs:
+                    # Only an incremental search knows what changed; a fresh search finds every tournament new
+                    slug_queue.put({'slug': slug, 'invit': False, 'rescore': incremental and changed})
+
+    owner_histories.save(os.path.join(directory, OWNER_HISTORY_FILE))
+
+    state.tournaments = {slug: state.tournaments[slug] for slug in window}
+    state.watermark = search_started
+    state.save(os.path.join(directory, SEARCH_STATE_FILE))
+
+    return slugs, changed_slugs
+
+
+def retrieve_event_slugs(start_time, end_time, directory='tts_values', incremental=False):
+    slugs, _ = search_events(start_time, end_time, directory, incremental)
+
+    return slugs
+
+
+def search_and_score(start_time, end_time, directory='tts_values', incremental=False, resume=False, source=None,
+                     cache=None):
+    """Searches, then scores every slug that was used, returning the slugs.
+
+    With `incremental`, slugs whose tournament changed are scored again and the others are
+    taken from the journal. Otherwise `resume` skips every slug already in the journal.
+    """
+
+    slugs, changed_slugs = search_events(start_time, end_time, directory, incremental, source=source)
+
+    changed_slugs = set(changed_slugs) if incremental else set()
+
+    print('discovered {} tournaments'.format(len(slugs)))
+    stream_score([{'slug': slug, 'invit': False, 'rescore': slug in changed_slugs} for slug in slugs], directory,
+                 resume=resume or incremental, cache=cache)
+
+    return slugs
+
+
+def iter_queue(slug_queue):
+    """Yields slug objects from a queue until it yields None."""
+
+    while True:
+        slug_obj = slug_queue.get()
+
+        if slug_obj is None:
+            return
+
+        yield slug_obj
+
+
+def pipelined_search(start_time, end_time, directory='tts_values', incremental=False, resume=False, source=None,
+                     cache=None):
+    """Searches and scores at the same time, returning the slugs that were used.
+
+    Tournaments are still all listed before any is checked, since the weekly checks need
+    the whole window, but each qualifying slug is scored as soon as its tournament has been
+    checked. The queue between the two is bounded, and both share the API's rate budget.
+    """
+
+    slug_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    def search():
+        try:
+            return search_events(start_time, end_time, directory, incremental, slug_queue, source)
+        finally:
+            slug_queue.put(None)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        searching = pool.submit(search)
+
+        try:
+            stream_score(iter_queue(slug_queue), directory, resume=resume or incremental, cache=cache)
+        except BaseException:
+            # Let the search finish so it still saves its state
+            for _ in iter_queue(slug_queue):
+                pass
+            raise
+
+        slugs, _ = searching.result()
 
     return slugs
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Searches start.gg for tournaments and tiers the ones that qualify.')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip slugs already completed in tts_values/journal.jsonl')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch tournaments updated since the last search, and only rescore events that changed')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='start scoring events while the search is still checking tournaments')
+    parser.add_argument('--basic-cache', metavar='PATH',
+                        help='find tournaments in the dashboard\'s basic-cache.json instead of searching start.gg')
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse results of finished events from tts_values/result_cache.sqlite')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each stage and write tts_values/profile.folded')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile, also write a cProfile to tts_values/profile.prof')
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler.enable(cprofile=args.cprofile)
+
+    cache = ResultCache() if args.cache else None
+
+    source = None
+    if args.basic_cache is not None:
+        if not os.path.isdir('tts_values'):
+            os.mkdir('tts_values')
+
+        source = BasicCacheSource(args.basic_cache)
+
     start_time_str = input('input starting time for search: ')
     start_time = dateparser.parse(start_time_str)
     start_timestamp = int(start_time.timestamp())
@@ -446,8 +1165,13 @@ if __name__ == '__main__':
     print('using start timestamp {} and end timestamp {}'.format(
         str(start_timestamp), str(end_timestamp)))
 
-    slugs = retrieve_event_slugs(start_timestamp, end_timestamp)
+    if args.pipeline:
+        slugs = pipelined_search(start_timestamp, end_timestamp, incremental=args.incremental, resume=args.resume,
+                                 source=source, cache=cache)
 
-    print('discovered {} tournaments'.format(len(slugs)))
-    results = bulk_score([{'slug': slug, 'invit': False} for slug in slugs])
-    write_results(results)
\ No newline at end of file
+        print('discovered {} tournaments'.format(len(slugs)))
+    else:
+        search_and_score(start_timestamp, end_timestamp, incremental=args.incremental, resume=args.resume, source=source,
+                         cache=cache)
+
+    profiler.finish()
@@ -0,0 +1,265 @@
+"""Season totals per player and region, kept up to date as events are scored.
+
+A season is a named date range. Every result written to a `SeasonAggregator` adds
+its event to the season's totals; a result for an event that was already added
+replaces the earlier contribution instead of adding to it, so totals never need
+to be rebuilt from every event. Only events that meet the requirements count
+towards player totals; region totals count every event.
+
+A player's total is the sum of the UltRank points they were valued at across
+qualifying events, so it measures attendance weighted by value, not results.
+Placements aren't part of a tiering result, so this is not a season ranking.
+
+Usage:
+ python ultrank_seasons.py create <season> <start date> <end date>
+ python ultrank_seasons.py build <season> [--store tts_values/results.sqlite]
+                                               adds every stored event in the season's range
+ python ultrank_seasons.py players <season> [-n 25]
+ python ultrank_seasons.py regions <season> [-n 25]
+"""
+
+from ultrank_tiering import TournamentTieringResult, _date_to_str, _str_to_date
+from ultrank_store import ResultStore
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+
+DEFAULT_SEASONS = os.path.join('tts_values', 'seasons.sqlite')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS seasons (
+    season TEXT PRIMARY KEY,
+    start_date TEXT,
+    end_date TEXT
+);
+CREATE TABLE IF NOT EXISTS season_events (
+    season TEXT,
+    slug TEXT,
+    region TEXT,
+    score INTEGER,
+    entrants INTEGER,
+    meets_reqs INTEGER,
+    PRIMARY KEY (season, slug)
+);
+CREATE TABLE IF NOT EXISTS season_event_players (
+    season TEXT,
+    slug TEXT,
+    player_id TEXT,
+    tag TEXT,
+    points INTEGER
+);
+CREATE TABLE IF NOT EXISTS player_totals (
+    season TEXT,
+    player_id TEXT,
+    tag TEXT,
+    events INTEGER,
+    points INTEGER,
+    PRIMARY KEY (season, player_id)
+);
+CREATE TABLE IF NOT EXISTS region_totals (
+    season TEXT,
+    region TEXT,
+    events INTEGER,
+    qualified INTEGER,
+    entrants INTEGER,
+    score INTEGER,
+    PRIMARY KEY (season, region)
+);
+CREATE INDEX IF NOT EXISTS season_event_players_event ON season_event_players (season, slug);
+CREATE INDEX IF NOT EXISTS player_totals_points ON player_totals (season, points);
+CREATE INDEX IF NOT EXISTS region_totals_score ON region_totals (season, score);
+'''
+
+
+class SeasonAggregator:
+    """Adds results to one season's player and region totals in batched transactions.
+
+    Can be used as a sink for `ultrank_bulk.stream_score`.
+    """
+
+    def __init__(self, season, path=DEFAULT_SEASONS, batch_size=50):
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+        row = self.connection.execute('SELECT start_date, end_date FROM seasons WHERE season = ?', (season,)).fetchone()
+        if row is None:
+            raise ValueError('unknown season {} (create it with ultrank_seasons.py create)'.format(season))
+
+        self.season = season
+        self.start_date = _str_to_date(row[0])
+        self.end_date = _str_to_date(row[1])
+        self.batch_size = batch_size
+        self.pending = 0
+
+    def in_season(self, date):
+        return self.start_date <= date < self.end_date
+
+    def write(self, result):
+        """Adds a result to the totals, replacing the event's earlier contribution. Failed slugs are ignored."""
+
+        if not isinstance(result, TournamentTieringResult):
+            return
+
+        # An event whose date moved out of the season is only removed
+        self.remove_event(result.slug)
+        if self.in_season(result.date):
+            self.add_event(result)
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def add_event(self, result):
+        cursor = self.connection.cursor()
+        meets_reqs = result.should_count()
+        region = result.region.note
+
+        cursor.execute('INSERT INTO season_events VALUES (?, ?, ?, ?, ?, ?)',
+                       (self.season, result.slug, region, result.score, result.entrants, int(meets_reqs)))
+        cursor.execute('INSERT INTO region_totals VALUES (?, ?, 1, ?, ?, ?) '
+                       'ON CONFLICT (season, region) DO UPDATE SET events = events + 1, qualified = qualified + excluded.qualified, '
+                       'entrants = entrants + excluded.entrants, score = score + excluded.score',
+                       (self.season, region, int(meets_reqs), result.entrants, result.score))
+
+        if not meets_reqs:
+            return
+
+        players = [(self.season, result.slug, str(value.id_), value.tag, value.points) for value in result.values]
+
+        cursor.executemany('INSERT INTO season_event_players VALUES (?, ?, ?, ?, ?)', players)
+        cursor.executemany('INSERT INTO player_totals VALUES (?, ?, ?, 1, ?) '
+                           'ON CONFLICT (season, player_id) DO UPDATE SET tag = excluded.tag, events = events + 1, '
+                           'points = points + excluded.points',
+                           [(season, player_id, tag, points) for season, _, player_id, tag, points in players])
+
+    def remove_event(self, slug):
+        """Takes an event's contribution back out of the totals, if it was added before."""
+
+        cursor = self.connection.cursor()
+
+        row = cursor.execute('SELECT region, score, entrants, meets_reqs FROM season_events WHERE season = ? AND slug = ?',
+                             (self.season, slug)).fetchone()
+        if row is None:
+            return
+
+        region, score, entrants, meets_reqs = row
+
+        cursor.execute('UPDATE region_totals SET events = events - 1, qualified = qualified - ?, entrants = entrants - ?, '
+                       'score = score - ? WHERE season = ? AND region = ?',
+                       (meets_reqs, entrants, score, self.season, region))
+        cursor.executemany('UPDATE player_totals SET events = events - 1, points = points - ? WHERE season = ? AND player_id = ?',
+                           [(points, self.season, player_id) for player_id, points in cursor.execute(
+                               'SELECT player_id, points FROM season_event_players WHERE season = ? AND slug = ?',
+                               (self.season, slug)).fetchall()])
+
+        cursor.execute('DELETE FROM player_totals WHERE season = ? AND events = 0', (self.season,))
+        cursor.execute('DELETE FROM region_totals WHERE season = ? AND events = 0', (self.season,))
+        cursor.execute('DELETE FROM season_event_players WHERE season = ? AND slug = ?', (self.season, slug))
+        cursor.execute('DELETE FROM season_events WHERE season = ? AND slug = ?', (self.season, slug))
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def create_season(season, start_date, end_date, path=DEFAULT_SEASONS):
+    """Defines a season as the dates from `start_date` up to, but not including, `end_date`."""
+
+    directory = os.path.dirname(path)
+    if directory != '' and not os.path.isdir(directory):
+        os.mkdir(directory)
+
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.execute('INSERT OR REPLACE INTO seasons VALUES (?, ?, ?)',
+                       (season, _date_to_str(start_date), _date_to_str(end_date)))
+    connection.commit()
+    connection.close()
+
+
+def top_players(season, limit=25, path=DEFAULT_SEASONS):
+    """Returns (player id, tag, events, points) for the players with the most points counted in a season."""
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT player_id, tag, events, points FROM player_totals WHERE season = ? '
+                              'ORDER BY points DESC LIMIT ?', (season, limit)).fetchall()
+    connection.close()
+
+    return rows
+
+
+def top_regions(season, limit=25, path=DEFAULT_SEASONS):
+    """Returns (region, events, qualified events, entrants, score) for the highest scoring regions in a season."""
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT region, events, qualified, entrants, score FROM region_totals WHERE season = ? '
+                              'ORDER BY score DESC LIMIT ?', (season, limit)).fetchall()
+    connection.close()
+
+    return rows
+
+
+def build_from_store(aggregator, store_path):
+    """Adds every event in the results store that falls in the aggregator's season."""
+
+    store = ResultStore(store_path)
+    slugs = [slug for (slug,) in store.connection.execute(
+        'SELECT slug FROM events WHERE date >= ? AND date < ?',
+        (_date_to_str(aggregator.start_date), _date_to_str(aggregator.end_date)))]
+
+    for slug in slugs:
+        aggregator.write(store.load_result(slug))
+
+    store.close()
+
+    return len(slugs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keeps season totals per player and region.')
+    parser.add_argument('--seasons', default=DEFAULT_SEASONS, help='path of the season totals database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    create_parser = subparsers.add_parser('create', help='define a season by its start and (exclusive) end date')
+    create_parser.add_argument('season')
+    create_parser.add_argument('start', type=datetime.date.fromisoformat)
+    create_parser.add_argument('end', type=datetime.date.fromisoformat)
+    build_parser = subparsers.add_parser('build', help='add every event of the results store in the season')
+    build_parser.add_argument('season')
+    build_parser.add_argument('--store', default=os.path.join('tts_values', 'results.sqlite'))
+    for command, description in [('players', 'players with the most points counted at qualifying events'),
+                                 ('regions', 'highest scoring regions')]:
+        top_parser = subparsers.add_parser(command, help='list the season\'s {}'.format(description))
+        top_parser.add_argument('season')
+        top_parser.add_argument('-n', type=int, default=25, help='how many to list')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        create_season(args.season, args.start, args.end, args.seasons)
+        print('created season {} ({} to {})'.format(args.season, args.start, args.end))
+    elif args.command == 'build':
+        if not os.path.exists(args.store):
+            print('store doesn\'t exist!')
+            sys.exit()
+
+        aggregator = SeasonAggregator(args.season, args.seasons)
+        count = build_from_store(aggregator, args.store)
+        aggregator.close()
+        print('added {} events'.format(count))
+    elif args.command == 'players':
+        # Not a ranking: these are the player values counted at each event, not placements
+        for player_id, tag, events, points in top_players(args.season, args.n, args.seasons):
+            print('{} (id {}) - {} points counted at {} events'.format(tag, player_id, points, events))
+    elif args.command == 'regions':
+        for position, (region, events, qualified, entrants, score) in enumerate(top_regions(args.season, args.n, args.seasons)):
+            print('{}. {} - {} points, {} entrants, {} of {} events qualified'.format(
+                position + 1, region, score, entrants, qualified, events))
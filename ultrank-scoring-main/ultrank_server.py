@@ -0,0 +1,247 @@
+"""Local HTTP service for tiering events.
+
+Keeps the dataset, scored results, tournament info and geocoded addresses in memory
+between requests, so a finished event that was already scored comes back after one
+check of its phases. Events still in progress are scored again on every request.
+Results of finished events are also kept in tts_values/result_cache.sqlite across restarts.
+New exports of the CSVs are picked up without restarting.
+
+Usage:
+ python ultrank_server.py [--host 127.0.0.1] [--port 8765]
+
+Endpoints (all respond with JSON):
+ GET  /tier?slug=<event slug or url>&invitational=<true|false>
+ POST /bulk                  body: a list of slugs, or of {"slug": ..., "invit": ...} objects
+ GET  /search?start=<time>&end=<time>
+                             times are unix timestamps or anything dateparser understands
+ GET  /stats                 request counts, including duplicates absorbed by coalescing
+"""
+
+from startgg_toolkit import SingleFlightMemo, isolate_slug, InvalidEventUrlException
+from ultrank_bulk import score_slug, true_values
+from ultrank_tiering import datasets, coalescing_stats, event_state, EventNotFoundException
+from ultrank_search import search_events
+from ultrank_cache import ResultCache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import argparse
+import concurrent.futures
+import dateparser
+import json
+import threading
+import traceback
+
+DEFAULT_PORT = 8765
+
+# Events scored at once for a /bulk request
+BULK_WORKERS = 4
+
+# Results of finished events kept in memory; older ones are still in the result cache
+RESULTS_KEPT = 2000
+
+
+class RequestError(Exception):
+    """An error caused by the request, answered with its status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ScoringFailure(Exception):
+    pass
+
+
+# Results of finished events by (slug, invitational, phase state, dataset version); failures aren't kept
+results = SingleFlightMemo(max_size=RESULTS_KEPT)
+
+# Results of finished events, kept across restarts
+result_cache = None
+
+# Searches write tts_values/events.csv, so only one runs at a time
+search_lock = threading.Lock()
+
+
+def result_json(result):
+    data = result.to_dict()
+    data['max_potential_score'] = result.max_potential_score()
+    data['meets_reqs'] = result.should_count()
+
+    return data
+
+
+def normalize_slug(slug):
+    try:
+        return isolate_slug(slug)
+    except InvalidEventUrlException:
+        raise RequestError(400, 'not an event slug or url: {}'.format(slug))
+
+
+def tier(slug, invit):
+    """Returns the result for an event, scoring it unless it is finished and was scored with the current dataset."""
+
+    slug = normalize_slug(slug)
+
+    def score(cache, state=None):
+        record, result = score_slug(slug, invit, cache, state)
+
+        if record['status'] != 'scored':
+            raise ScoringFailure(record.get('error', record['status']))
+
+        return result
+
+    try:
+        state = event_state(slug)
+    except EventNotFoundException as e:
+        raise RequestError(404, str(e))
+
+    # Sets of an event in progress still change, so its result isn't kept (or looked up in the cache)
+    if state is None:
+        return score(None)
+
+    return results.get((slug, invit, state, datasets.current.version), lambda: score(result_cache, state))
+
+
+def tier_entry(slug_obj):
+    """Scores one entry of a /bulk request, reporting failures in the entry instead of failing the request."""
+
+    if isinstance(slug_obj, str):
+        slug_obj = {'slug': slug_obj, 'invit': False}
+
+    if not isinstance(slug_obj, dict) or not isinstance(slug_obj.get('slug'), str):
+        return {'slug': None, 'status': 'failed', 'error': 'entry must be a slug or an object with a slug: {}'.format(
+            json.dumps(slug_obj))}
+
+    try:
+        result = tier(slug_obj['slug'], bool(slug_obj.get('invit', False)))
+    except (RequestError, ScoringFailure) as e:
+        return {'slug': slug_obj['slug'], 'status': 'failed', 'error': str(e)}
+
+    return {'slug': result.slug, 'status': 'scored', 'result': result_json(result)}
+
+
+def parse_time(value, name):
+    if value is None:
+        raise RequestError(400, 'missing parameter {}'.format(name))
+
+    if value.isdigit():
+        return int(value)
+
+    parsed = dateparser.parse(value)
+    if parsed is None:
+        raise RequestError(400, 'could not understand {} time {}'.format(name, value))
+
+    return int(parsed.timestamp())
+
+
+class TieringRequestHandler(BaseHTTPRequestHandler):
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_errors(self, handler):
+        try:
+            self.send_json(200, handler())
+        except RequestError as e:
+            self.send_json(e.status, {'error': str(e)})
+        except ScoringFailure as e:
+            self.send_json(502, {'error': 'scoring failed: {}'.format(e)})
+        except Exception as e:
+            traceback.print_exc()
+            self.send_json(500, {'error': str(e)})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/tier':
+            self.handle_errors(lambda: self.get_tier(params))
+        elif url.path == '/search':
+            self.handle_errors(lambda: self.get_search(params))
+        elif url.path == '/stats':
+            self.handle_errors(stats)
+        else:
+            self.send_json(404, {'error': 'unknown path {}'.format(url.path)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+
+        if url.path == '/bulk':
+            self.handle_errors(self.post_bulk)
+        else:
+            self.send_json(404, {'error': 'unknown path {}'.format(url.path)})
+
+    def get_tier(self, params):
+        if 'slug' not in params:
+            raise RequestError(400, 'missing parameter slug')
+
+        invit = params.get('invitational', 'false').lower() in true_values
+
+        return result_json(tier(params['slug'], invit))
+
+    def post_bulk(self):
+        length = int(self.headers.get('Content-Length', 0))
+
+        try:
+            slugs = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            raise RequestError(400, 'body is not JSON')
+
+        if not isinstance(slugs, list):
+            raise RequestError(400, 'body must be a list of slugs')
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=BULK_WORKERS) as pool:
+            return list(pool.map(tier_entry, slugs))
+
+    def get_search(self, params):
+        start_time = parse_time(params.get('start'), 'start')
+        end_time = parse_time(params.get('end'), 'end')
+
+        with search_lock:
+            slugs, _ = search_events(start_time, end_time)
+
+        return {'start': start_time, 'end': end_time, 'slugs': slugs}
+
+
+def stats():
+    data = coalescing_stats()
+    data['results_absorbed'] = results.absorbed
+    data['dataset_version'] = datasets.current.version
+
+    if result_cache is not None:
+        data.update(result_cache.stats())
+
+    return data
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT):
+    global result_cache
+
+    datasets.watch()
+    result_cache = ResultCache()
+
+    server = ThreadingHTTPServer((host, port), TieringRequestHandler)
+    server.daemon_threads = True
+
+    print('serving on http://{}:{}'.format(host, port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves tiering results over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    args = parser.parse_args()
+
+    serve(args.host, args.port)
@@ -0,0 +1,35 @@
+"""Batched Jaro-Winkler similarity for weekly detection.
+
+Compares a batch of tournament names against another batch in native code
+instead of a Python loop. Uses a single `cdist` call when numpy is installed,
+and one `extract` call per name otherwise.
+"""
+
+from rapidfuzz import process
+from rapidfuzz.distance import JaroWinkler
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def similarity_rows(queries, choices, score_cutoff):
+    """Returns one {choice index: similarity} dict per query.
+
+    Only similarities of at least `score_cutoff` are kept; pairs that can't reach it
+    are abandoned early by rapidfuzz.
+    """
+
+    if len(queries) == 0 or len(choices) == 0:
+        return [{} for _ in queries]
+
+    if numpy is not None:
+        matrix = process.cdist(queries, choices, scorer=JaroWinkler.similarity,
+                               score_cutoff=score_cutoff, dtype=numpy.float64, workers=-1)
+
+        return [{int(index): float(row[index]) for index in numpy.nonzero(row)[0]} for row in matrix]
+
+    return [{index: score for _, score, index in process.extract(query, choices, scorer=JaroWinkler.similarity,
+                                                                 score_cutoff=score_cutoff, limit=None)}
+            for query in queries]
@@ -0,0 +1,287 @@
+"""SQLite store for tiering results.
+
+Keeps every scored event, its valued players, DQs and potentially mismatched
+players as normalized tables, so questions like "all events where player X
+counted" are indexed queries instead of a grep over the txt files.
+
+Usage:
+ python ultrank_store.py render <slug>      prints the txt breakdown of an event
+ python ultrank_store.py player <id>        lists every event a player counted at
+ python ultrank_store.py parquet <dir>      exports the tables as Parquet (needs pyarrow)
+"""
+
+from ultrank_tiering import TournamentTieringResult, RegionValue, PlayerValue, CountedValue, DisqualificationValue, \
+    PotentialMatchWithDqs, _date_to_str, _str_to_date
+from startgg_toolkit import isolate_slug, InvalidEventUrlException
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    slug TEXT PRIMARY KEY,
+    tournament TEXT,
+    event TEXT,
+    is_invitational INTEGER,
+    date TEXT,
+    score INTEGER,
+    max_potential_score INTEGER,
+    entrants INTEGER,
+    dq_count INTEGER,
+    meets_reqs INTEGER,
+    region_multiplier INTEGER,
+    region_note TEXT,
+    region TEXT,
+    phases TEXT,
+    dataset_version TEXT
+);
+CREATE TABLE IF NOT EXISTS valued_players (
+    slug TEXT,
+    position INTEGER,
+    player_id,
+    hex TEXT,
+    tag TEXT,
+    alt_tag TEXT,
+    points INTEGER,
+    category TEXT,
+    note TEXT,
+    start_time TEXT,
+    end_time TEXT
+);
+CREATE TABLE IF NOT EXISTS dqs (
+    slug TEXT,
+    position INTEGER,
+    counted INTEGER,
+    player_id,
+    hex TEXT,
+    tag TEXT,
+    alt_tag TEXT,
+    points INTEGER,
+    category TEXT,
+    note TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    dqs INTEGER
+);
+CREATE TABLE IF NOT EXISTS potential_matches (
+    slug TEXT,
+    position INTEGER,
+    player_id,
+    tag TEXT,
+    actual_tag TEXT,
+    points INTEGER,
+    note TEXT,
+    dqs INTEGER
+);
+CREATE TABLE IF NOT EXISTS failures (
+    slug TEXT PRIMARY KEY
+);
+CREATE INDEX IF NOT EXISTS valued_players_player ON valued_players (player_id);
+CREATE INDEX IF NOT EXISTS valued_players_slug ON valued_players (slug);
+CREATE INDEX IF NOT EXISTS dqs_player ON dqs (player_id);
+CREATE INDEX IF NOT EXISTS dqs_slug ON dqs (slug);
+CREATE INDEX IF NOT EXISTS potential_matches_player ON potential_matches (player_id);
+CREATE INDEX IF NOT EXISTS potential_matches_slug ON potential_matches (slug);
+CREATE INDEX IF NOT EXISTS events_date ON events (date);
+'''
+
+TABLES = ['events', 'valued_players', 'dqs', 'potential_matches', 'failures']
+
+
+def _failure_slug(slug):
+    # Failures are keyed like results, so a later successful rescore clears them
+    try:
+        return isolate_slug(str(slug))
+    except InvalidEventUrlException:
+        return str(slug)
+
+
+def _player_value_columns(player_value):
+    return (player_value.id_, player_value.hex_, player_value.tag, player_value.category, player_value.note,
+            _date_to_str(player_value.start_time), _date_to_str(player_value.end_time))
+
+
+class ResultStore:
+    """Writes tiering results to SQLite in batched transactions.
+
+    Can be used as a sink for `ultrank_bulk.stream_score`.
+    """
+
+    def __init__(self, path=os.path.join('tts_values', 'results.sqlite'), batch_size=50):
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+        # Stores created before results recorded their dataset version
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(events)')]
+        if 'dataset_version' not in columns:
+            self.connection.execute('ALTER TABLE events ADD COLUMN dataset_version TEXT')
+
+        self.batch_size = batch_size
+        self.pending = 0
+
+    def write(self, result):
+        """Stores a result (or a failed slug), replacing any earlier version of the same event."""
+
+        if isinstance(result, TournamentTieringResult):
+            self.insert_result(result)
+        else:
+            self.connection.execute('INSERT OR REPLACE INTO failures (slug) VALUES (?)', (_failure_slug(result),))
+
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def insert_result(self, result):
+        cursor = self.connection.cursor()
+
+        for table in ['events', 'valued_players', 'dqs', 'potential_matches', 'failures']:
+            cursor.execute('DELETE FROM {} WHERE slug = ?'.format(table), (result.slug,))
+
+        cursor.execute('INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (result.slug, result.tournament, result.event, int(result.is_invitational), _date_to_str(result.date),
+                        result.score, result.max_potential_score(), result.entrants, result.dq_count, int(result.should_count()),
+                        result.region.multiplier, result.region.note, json.dumps(result.region.to_dict()), json.dumps(result.phases),
+                        result.dataset_version))
+
+        cursor.executemany('INSERT INTO valued_players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           [(result.slug, position, value.id_, value.player_value.hex_, value.tag, value.alt_tag, value.points,
+                             value.player_value.category, value.player_value.note,
+                             _date_to_str(value.player_value.start_time), _date_to_str(value.player_value.end_time))
+                            for position, value in enumerate(result.values)])
+
+        dq_rows = []
+        for position, dq in enumerate(result.dqs):
+            if isinstance(dq.value, CountedValue):
+                id_, hex_, tag, category, note, start_time, end_time = _player_value_columns(dq.value.player_value)
+                dq_rows.append((result.slug, position, 1, id_, hex_, tag, dq.value.alt_tag, dq.value.points,
+                                category, note, start_time, end_time, dq.dqs))
+            else:
+                id_, hex_, tag, category, note, start_time, end_time = _player_value_columns(dq.value)
+                dq_rows.append((result.slug, position, 0, id_, hex_, tag, '', dq.value.points,
+                                category, note, start_time, end_time, dq.dqs))
+        cursor.executemany('INSERT INTO dqs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', dq_rows)
+
+        cursor.executemany('INSERT INTO potential_matches VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           [(result.slug, position, match.id_, match.tag, match.actual_tag, match.points, match.note, match.dqs)
+                            for position, match in enumerate(result.potential)])
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def load_result(self, slug):
+        """Rebuilds the stored result for an event slug, or returns None if it isn't stored."""
+
+        row = self.connection.execute(
+            'SELECT slug, tournament, event, is_invitational, date, score, entrants, dq_count, region, phases, dataset_version '
+            'FROM events WHERE slug = ?',
+            (slug,)).fetchone()
+
+        if row is None:
+            return None
+
+        slug, tournament, event, is_invitational, date, score, entrants, dq_count, region, phases, dataset_version = row
+
+        values = [CountedValue(PlayerValue(id_, hex_, tag, points, category, note, _str_to_date(start_time), _str_to_date(end_time)),
+                               points, alt_tag)
+                  for id_, hex_, tag, alt_tag, points, category, note, start_time, end_time in self.connection.execute(
+                      'SELECT player_id, hex, tag, alt_tag, points, category, note, start_time, end_time FROM valued_players '
+                      'WHERE slug = ? ORDER BY position', (slug,))]
+
+        dqs = []
+        for counted, id_, hex_, tag, alt_tag, points, category, note, start_time, end_time, num_dqs in self.connection.execute(
+                'SELECT counted, player_id, hex, tag, alt_tag, points, category, note, start_time, end_time, dqs FROM dqs '
+                'WHERE slug = ? ORDER BY position', (slug,)):
+            value = PlayerValue(id_, hex_, tag, points, category, note, _str_to_date(start_time), _str_to_date(end_time))
+            if counted:
+                value = CountedValue(value, points, alt_tag)
+            dqs.append(DisqualificationValue(value, num_dqs))
+
+        potential = [PotentialMatchWithDqs(tag, id_, points, note, actual_tag, num_dqs)
+                     for id_, tag, actual_tag, points, note, num_dqs in self.connection.execute(
+                         'SELECT player_id, tag, actual_tag, points, note, dqs FROM potential_matches '
+                         'WHERE slug = ? ORDER BY position', (slug,))]
+
+        return TournamentTieringResult(slug, score, entrants, RegionValue.from_dict(json.loads(region)), values, dqs, potential,
+                                       _str_to_date(date), is_invitational=bool(is_invitational), phases=json.loads(phases),
+                                       dq_count=dq_count, tournament=tournament, event=event, dataset_version=dataset_version)
+
+    def render(self, slug, filelike=None):
+        """Writes the txt breakdown of a stored event."""
+
+        result = self.load_result(slug)
+        if result is None:
+            raise KeyError(slug)
+
+        result.write_result(filelike)
+
+    def events_for_player(self, player_id):
+        """Returns (slug, tournament, event, date, points) for every event the player counted at."""
+
+        return self.connection.execute(
+            'SELECT events.slug, events.tournament, events.event, events.date, valued_players.points '
+            'FROM valued_players JOIN events ON events.slug = valued_players.slug '
+            'WHERE valued_players.player_id = ? ORDER BY events.date', (player_id,)).fetchall()
+
+    def export_parquet(self, directory):
+        """Writes each table to a Parquet file. Requires pyarrow."""
+
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export requires pyarrow: pip install pyarrow')
+
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+
+        for table in TABLES:
+            cursor = self.connection.execute('SELECT * FROM {}'.format(table))
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+
+            # Player ids are ints, or tags for players without a start.gg id
+            data = {column: [row[i] if column != 'player_id' else str(row[i]) for row in rows]
+                    for i, column in enumerate(columns)}
+
+            pyarrow.parquet.write_table(pyarrow.table(data), os.path.join(directory, '{}.parquet'.format(table)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Queries the tiering results store.')
+    parser.add_argument('--db', default=os.path.join('tts_values', 'results.sqlite'), help='path to the results store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    render_parser = subparsers.add_parser('render', help='print the txt breakdown of an event')
+    render_parser.add_argument('slug')
+    player_parser = subparsers.add_parser('player', help='list every event a player counted at')
+    player_parser.add_argument('player_id')
+    parquet_parser = subparsers.add_parser('parquet', help='export the tables as Parquet')
+    parquet_parser.add_argument('directory')
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+
+    if args.command == 'render':
+        try:
+            store.render(args.slug)
+        except KeyError:
+            print('slug not in store')
+            sys.exit(1)
+    elif args.command == 'player':
+        player_id = int(args.player_id) if args.player_id.isdigit() else args.player_id
+        for slug, tournament, event, date, points in store.events_for_player(player_id):
+            print('{} - {} - {} ({}): {} points'.format(date, tournament, event, slug, points))
+    elif args.command == 'parquet':
+        store.export_parquet(args.directory)
+
+    store.close()
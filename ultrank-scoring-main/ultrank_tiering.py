@@ -7,15 +7,29 @@ Requirements:
   ultrank_players.csv
   ultrank_regions.csv
   ultrank_invitational.csv
+
+The CSVs are read from the directory of this script, or from ULTRANK_DATA_DIR if it is
+set. They are compiled into ultrank_dataset.pickle next to them the first time they are
+read, and recompiled whenever one of them changes. Long-running processes can pick up new CSVs
+without restarting through `datasets`, the module's DatasetManager.
 """
 
-from startgg_toolkit import send_request, isolate_slug
+from startgg_toolkit import send_request, isolate_slug, SingleFlightMemo, RateLimiter, request_coalescer
+from ultrank_profile import profiler
 from geopy.geocoders import Nominatim
+import argparse
+import asyncio
 import csv
+import hashlib
+import os
+import pickle
 import re
 import sys
 import json
 import datetime
+import threading
+import time
+import traceback
 
 NUM_PLAYERS_FLOOR = 2
 
@@ -31,8 +45,46 @@ ENTRANT_FLOOR = {
     3: 32
 }
 
+# Entrants counted again in x2 and x3 regions under the new multiplier system
+ENTRANT_CAPS = [256, 128]
+
 NEW_MULT_SYSTEM_DATE = datetime.date.fromisoformat('2024-12-16')
 
+DATASET_FILES = ['ultrank_players.csv', 'ultrank_tags.csv', 'ultrank_invitational.csv', 'ultrank_regions.csv']
+DATASET_CACHE = 'ultrank_dataset.pickle'
+
+# Directory holding the dataset CSVs and their compiled snapshot
+DATA_DIRECTORY = os.environ.get('ULTRANK_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# Bump when the compiled layout changes so old snapshots are recompiled
+DATASET_FORMAT = 1
+
+# How often a watching DatasetManager checks the CSVs for changes
+DATASET_POLL_SECONDS = 30
+
+# Tournament-level data and geocoded addresses, shared by every event in a run
+tournament_info = SingleFlightMemo()
+geocoded_addresses = SingleFlightMemo()
+
+# Nominatim allows one request per second
+geocode_budget = RateLimiter(60, 1)
+
+
+class GeocodingException(Exception):
+    pass
+
+
+class EventNotFoundException(Exception):
+    pass
+
+
+def _date_to_str(date):
+    return date.isoformat() if date is not None else None
+
+
+def _str_to_date(date_str):
+    return datetime.date.fromisoformat(date_str) if date_str is not None else None
+
 
 class PotentialMatchWithDqs:
     def __init__(self, tag, id_, points, note, actual_tag='', dqs=0):
@@ -49,6 +101,14 @@ class PotentialMatchWithDqs:
             self.dqs, 's' if self.dqs == 1 else '')
         return '{} (id {}) - {}{} points [{}]{}'.format(self.tag, self.id_, actual_tag_portion, self.points, self.note, dq_portion)
 
+    def to_dict(self):
+        return {'tag': self.tag, 'id': self.id_, 'points': self.points, 'note': self.note,
+                'actual_tag': self.actual_tag, 'dqs': self.dqs}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['tag'], data['id'], data['points'], data['note'], data['actual_tag'], data['dqs'])
+
 
 class DisqualificationValue:
     """Stores a player value with DQ count."""
@@ -60,6 +120,18 @@ class DisqualificationValue:
     def __str__(self):
         return '{} - {} DQ{}'.format(str(self.value), str(self.dqs), '' if self.dqs == 1 else 's')
 
+    def to_dict(self):
+        kind = 'counted' if isinstance(self.value, CountedValue) else 'player'
+        return {'kind': kind, 'value': self.value.to_dict(), 'dqs': self.dqs}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data['kind'] == 'counted':
+            value = CountedValue.from_dict(data['value'])
+        else:
+            value = PlayerValue.from_dict(data['value'])
+        return cls(value, data['dqs'])
+
 
 class CountedValue:
     """Stores a counted player value with additional data."""
@@ -81,6 +153,13 @@ class CountedValue:
 
         return '{} - {} points [{}]'.format(full_tag, self.points, self.player_value.note)
 
+    def to_dict(self):
+        return {'player_value': self.player_value.to_dict(), 'points': self.points, 'alt_tag': self.alt_tag}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(PlayerValue.from_dict(data['player_value']), data['points'], data['alt_tag'])
+
 
 class PlayerValue:
     """Stores scores for players."""
@@ -106,6 +185,16 @@ class PlayerValue:
 
         return True
 
+    def to_dict(self):
+        return {'id': self.id_, 'hex': self.hex_, 'tag': self.tag, 'points': self.points,
+                'category': self.category, 'note': self.note,
+                'start_time': _date_to_str(self.start_time), 'end_time': _date_to_str(self.end_time)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['hex'], data['tag'], data['points'], data['category'], data['note'],
+                   _str_to_date(data['start_time']), _str_to_date(data['end_time']))
+
 
 class PlayerValueGroup:
     """Stores multiple scores for players."""
@@ -118,16 +207,24 @@ class PlayerValueGroup:
         self.invitational_values = []
         self.other_tags = [tag_.lower() for tag_ in other_tags]
 
-    def add_value(self, points, category='', note='', start_time=None, end_time=None):
+    def add_value(self, points, category='', note='', start_time=None, end_time=None, keep_sorted=True):
         self.values.append(PlayerValue(
             self.id_, self.hex_, self.tag, points, category, note, start_time, end_time))
 
-        self.values.sort(reverse=True, key=lambda val: val.points)
+        if keep_sorted:
+            self.values.sort(reverse=True, key=lambda val: val.points)
 
-    def add_invitational_value(self, points, note='', start_time=None, end_time=None):
+    def add_invitational_value(self, points, note='', start_time=None, end_time=None, keep_sorted=True):
         self.invitational_values.append(PlayerValue(
             self.id_, self.hex_, self.tag, points, 'Invitational Value', note, start_time, end_time))
 
+        if keep_sorted:
+            self.invitational_values.sort(reverse=True, key=lambda val: val.points)
+
+    def sort_values(self):
+        """Sorts values added with `keep_sorted=False`. Ties keep the order they were added in."""
+
+        self.values.sort(reverse=True, key=lambda val: val.points)
         self.invitational_values.sort(reverse=True, key=lambda val: val.points)
 
     def retrieve_value(self, tournament, invitational=False):
@@ -152,7 +249,8 @@ class PlayerValueGroup:
 
 
 class TournamentTieringResult:
-    def __init__(self, slug, score, entrants, region, values, dqs, potential, date, is_invitational=False, phases=[], dq_count=-1):
+    def __init__(self, slug, score, entrants, region, values, dqs, potential, date, is_invitational=False, phases=[], dq_count=-1,
+                 tournament=None, event=None, dataset_version=None):
         self.slug = slug
         self.score = score
         self.values = values
@@ -165,33 +263,35 @@ class TournamentTieringResult:
         self.dq_count = dq_count
         self.phases = phases
         self.max_score = None
+        self.dataset_version = dataset_version
 
-        name = get_name(slug)
-        self.tournament = name['tournament']
-        self.event = name['event']
+        if tournament is None or event is None:
+            name = get_name(slug)
+            tournament = name['tournament']
+            event = name['event']
+
+        self.tournament = tournament
+        self.event = event
 
     def using_new_tiering_system(self):
         return self.date > NEW_MULT_SYSTEM_DATE
 
     def write_result(self, filelike=None):
-        original_stdout = sys.stdout
-
-        if filelike != None:
-            sys.stdout = filelike
+        out = filelike if filelike != None else sys.stdout
 
         print('{} - {} ({}){}'.format(self.tournament, self.event,
-                                      self.slug, ' (invitational)' if self.is_invitational else ''))
-        print('Phases used: {}'.format(str(self.phases)))
-        print()
+                                      self.slug, ' (invitational)' if self.is_invitational else ''), file=out)
+        print('Phases used: {}'.format(str(self.phases)), file=out)
+        print(file=out)
 
         if not self.should_count():
             print('WARNING: This tournament does not meet the criteria of at least {} entrants or a score of at least {} with {} qualified players'.format(
-                self.region.entrant_floor, self.region.score_floor, NUM_PLAYERS_FLOOR))
-            print()
+                self.region.entrant_floor, self.region.score_floor, NUM_PLAYERS_FLOOR), file=out)
+            print(file=out)
         elif not self.should_count_strict():
             print('WARNING: This tournament may not meet the criteria of at least {} entrants or a score of at least {} with {} qualified players'.format(
-                self.region.entrant_floor, self.region.score_floor, NUM_PLAYERS_FLOOR))
-            print()
+                self.region.entrant_floor, self.region.score_floor, NUM_PLAYERS_FLOOR), file=out)
+            print(file=out)
 
         participants_string = '{} - {} DQs = {}'.format(
             self.entrants + self.dq_count, self.dq_count, self.entrants) if self.dq_count != -1 else str(self.entrants)
@@ -201,44 +301,42 @@ class TournamentTieringResult:
             print_str += participants_string
             entrants_score = self.entrants
             if self.region.multiplier >= 2:
-                print_str += ' + {} (x2)'.format(str(min(256, self.entrants)))
-                entrants_score += min(256, self.entrants)
+                print_str += ' + {} (x2)'.format(str(min(ENTRANT_CAPS[0], self.entrants)))
+                entrants_score += min(ENTRANT_CAPS[0], self.entrants)
             if self.region.multiplier >= 3:
-                print_str += ' + {} (x3)'.format(str(min(128, self.entrants)))
-                entrants_score += min(128, self.entrants)
+                print_str += ' + {} (x3)'.format(str(min(ENTRANT_CAPS[1], self.entrants)))
+                entrants_score += min(ENTRANT_CAPS[1], self.entrants)
             if self.region.multiplier == 1:
                 print_str += ' (x1)'
             print_str += f' = {entrants_score} [x{self.region.multiplier}, {self.region.note}]'
-            print(print_str)
+            print(print_str, file=out)
 
         else:
             print('Entrants: {} x {} [{}] = {}'.format(
-                participants_string, self.region.multiplier, self.region.note, self.entrants * self.region.multiplier))
+                participants_string, self.region.multiplier, self.region.note, self.entrants * self.region.multiplier), file=out)
 
-        print()
-        print('Top Player Points: ')
+        print(file=out)
+        print('Top Player Points: ', file=out)
 
         for participant in self.values:
-            print('  {}'.format(str(participant)))
+            print('  {}'.format(str(participant)), file=out)
 
-        print()
-        print('Total Score: {}'.format(self.score))
+        print(file=out)
+        print('Total Score: {}'.format(self.score), file=out)
 
         if len(self.dqs) > 0:
-            print()
-            print('-----')
-            print('DQs')
+            print(file=out)
+            print('-----', file=out)
+            print('DQs', file=out)
             for dq in self.dqs:
-                print('  {}'.format(str(dq)))
+                print('  {}'.format(str(dq)), file=out)
 
         if len(self.potential) > 0:
-            print()
-            print('-----')
-            print('Potentially Mismatched Players')
+            print(file=out)
+            print('-----', file=out)
+            print('Potentially Mismatched Players', file=out)
             for match in self.potential:
-                print('  {}'.format(str(match)))
-
-        sys.stdout = original_stdout
+                print('  {}'.format(str(match)), file=out)
 
     def max_potential_score(self):
         if self.max_score != None:
@@ -281,6 +379,36 @@ class TournamentTieringResult:
     def should_count(self):
         return self.entrants >= self.region.entrant_floor or (self.max_potential_score() >= self.region.score_floor and len(self.values) + len(self.potential) + len(self.dqs) >= NUM_PLAYERS_FLOOR)
 
+    def to_dict(self):
+        """Serializes the result to JSON-compatible primitives."""
+
+        return {'slug': self.slug,
+                'tournament': self.tournament,
+                'event': self.event,
+                'score': self.score,
+                'entrants': self.entrants,
+                'region': self.region.to_dict(),
+                'values': [value.to_dict() for value in self.values],
+                'dqs': [dq.to_dict() for dq in self.dqs],
+                'potential': [match.to_dict() for match in self.potential],
+                'date': _date_to_str(self.date),
+                'is_invitational': self.is_invitational,
+                'phases': self.phases,
+                'dq_count': self.dq_count,
+                'dataset_version': self.dataset_version}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuilds a result from `to_dict` output without touching the network."""
+
+        return cls(data['slug'], data['score'], data['entrants'], RegionValue.from_dict(data['region']),
+                   [CountedValue.from_dict(value) for value in data['values']],
+                   [DisqualificationValue.from_dict(dq) for dq in data['dqs']],
+                   [PotentialMatchWithDqs.from_dict(match) for match in data['potential']],
+                   _str_to_date(data['date']), is_invitational=data['is_invitational'], phases=data['phases'],
+                   dq_count=data['dq_count'], tournament=data['tournament'], event=data['event'],
+                   dataset_version=data.get('dataset_version'))
+
 
 class RegionValue:
     """Stores region multipliers."""
@@ -362,6 +490,17 @@ class RegionValue:
     def __hash__(self):
         return hash(self.get_equality_measures())
 
+    def to_dict(self):
+        return {'country_code': self.country_code, 'iso2': self.iso2, 'county': self.county, 'city': self.city,
+                'state_district': self.state_district, 'jp_postal': self.jp_postal, 'multiplier': self.multiplier,
+                'note': self.note, 'start_time': _date_to_str(self.start_time), 'end_time': _date_to_str(self.end_time)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['country_code'], data['iso2'], data['county'], data['city'], data['state_district'],
+                   data['jp_postal'], data['multiplier'], data['note'],
+                   _str_to_date(data['start_time']), _str_to_date(data['end_time']))
+
     def __str__(self):
         ret = ''
         if self.country_code != '':
@@ -387,6 +526,21 @@ class RegionValue:
         return ret
 
 
+def find_region(regions, address, time=None):
+    """Returns the region that best matches an address at a given time, or None if none match."""
+
+    best_match = 0
+    best_region = None
+
+    for region in regions:
+        match = region.match(address, time=time)
+        if match > best_match:
+            best_region = region
+            best_match = match
+
+    return best_region
+
+
 class Entrant:
     """Wrapper class to store player ids and tags."""
 
@@ -409,31 +563,61 @@ class Entrant:
 class Tournament:
     """Stores tournament info/metadata."""
 
-    def __init__(self, event_slug, is_invitational=False, location=True):
-        """Populates tournament metadata with tournament slug/invitational status."""
+    def __init__(self, event_slug, is_invitational=False, location=True, fetch=True):
+        """Populates tournament metadata with tournament slug/invitational status.
+
+        With `fetch=False` nothing is fetched yet; `Tournament.fetch` uses this to fetch concurrently.
+        """
 
         self.event_slug = isolate_slug(event_slug)
+        self.tournament_slug = get_tournament_slug(self.event_slug)
         self.is_invitational = is_invitational
         self.tier = None
 
+        if not location:
+            self.address = {'country_code': 'us'}
+
+        if not fetch:
+            return
+
         self.gather_entrant_counts()
         if location:
             self.gather_location_info()
-        else:
-            self.address = {'country_code': 'us'}
         self.retrieve_start_time()
+        self.retrieve_tournament_name()
+
+    @classmethod
+    async def fetch(cls, event_slug, is_invitational=False, location=True):
+        """Creates a Tournament in an event loop, running its independent fetches concurrently.
+
+        Each fetch runs in a worker thread. Requests still go through `send_request`, so
+        they share its rate budget with everything else in the process.
+        """
+
+        tournament = cls(event_slug, is_invitational, location, fetch=False)
+
+        fetches = [tournament.gather_entrant_counts, tournament.retrieve_start_time, tournament.retrieve_tournament_name]
+        if location:
+            fetches.append(tournament.gather_location_info)
+
+        await asyncio.gather(*[asyncio.to_thread(fetch) for fetch in fetches])
+
+        return tournament
 
     def gather_entrant_counts(self):
         # Check if the event has progressed enough to detect DQs.
         self.total_dqs = -1  # Placeholder value
 
-        event_progressed = check_phase_completed(self.event_slug)
+        with profiler.stage('phase check'):
+            event_progressed = check_phase_completed(self.event_slug)
 
         if event_progressed:
-            self.phases = collect_phases(self.event_slug)
+            with profiler.stage('phase check'):
+                self.phases = collect_phases(self.event_slug)
 
-            self.dq_list, self.participants = get_dqs(
-                self.event_slug, phase_ids=[phase['id'] for phase in self.phases])
+            with profiler.stage('get_dqs'):
+                self.dq_list, self.participants = get_dqs(
+                    self.event_slug, phase_ids=[phase['id'] for phase in self.phases])
 
             self.total_dqs = 0
 
@@ -446,7 +630,8 @@ class Tournament:
             self.total_entrants = len(self.participants) + self.total_dqs
 
         else:
-            self.participants = get_entrants(self.event_slug)
+            with profiler.stage('entrant pagination'):
+                self.participants = get_entrants(self.event_slug)
             self.dq_list = {}
             self.total_dqs = -1
             self.total_entrants = len(self.participants)
@@ -456,130 +641,155 @@ class Tournament:
         self.total_dqs = -1
 
     def gather_location_info(self):
-        geo = Nominatim(user_agent='ultrank', timeout=10)
+        with profiler.stage('tournament info'):
+            info = get_tournament_info(self.tournament_slug)
 
-        query, variables = location_query(self.event_slug)
-        resp = send_request(query, variables)
+        self.lat = info['lat']
+        self.lng = info['lng']
 
-        try:
-            self.lat = resp['data']['event']['tournament']['lat']
-            self.lng = resp['data']['event']['tournament']['lng']
-        except Exception as e:
-            print(e)
-            print(resp)
-            raise e
-
-        if self.lat < -80:
-            self.address = {'country_code': 'aq'}
-            return
-
-        # Try 10 times
-        for i in range(5):
-            try:
-                self.address = geo.reverse('{}, {}'.format(
-                    self.lat, self.lng)).raw['address']
-                break
-            except Exception:
-                print(f'Nominatim error {i}')
-                pass
+        with profiler.stage('geocoding'):
+            self.address = get_address(self.lat, self.lng)
 
         # print(self.address)
 
     def retrieve_start_time(self):
         query, variables = time_query(self.event_slug)
-        resp = send_request(query, variables)
+        with profiler.stage('start time'):
+            resp = send_request(query, variables)
 
         try:
             self.start_time = datetime.date.fromtimestamp(
                 resp['data']['event']['startAt'])
+            self.event_name = resp['data']['event']['name']
         except Exception as e:
             print(e)
             print(resp)
             raise e
 
+    def retrieve_tournament_name(self):
+        with profiler.stage('tournament info'):
+            self.tournament_name = get_tournament_info(self.tournament_slug)['name']
+
+    def to_inputs(self):
+        """Serializes everything `score` needs to JSON-compatible primitives."""
+
+        return {'event_slug': self.event_slug,
+                'tournament_name': self.tournament_name,
+                'event_name': self.event_name,
+                'start_time': _date_to_str(self.start_time),
+                'address': self.address,
+                'phases': self.phases,
+                'total_entrants': self.total_entrants,
+                'total_dqs': self.total_dqs,
+                'participants': [[participant.id_, participant.tag] for participant in self.participants],
+                'dq_list': [[player_id, participant.id_, participant.tag, num_dqs]
+                            for player_id, (participant, num_dqs) in self.dq_list.items()]}
+
+    @classmethod
+    def from_inputs(cls, inputs, is_invitational=False):
+        """Rebuilds a fetched Tournament from `to_inputs` output without touching the network."""
+
+        tournament = cls(inputs['event_slug'], is_invitational, fetch=False)
+
+        tournament.tournament_name = inputs['tournament_name']
+        tournament.event_name = inputs['event_name']
+        tournament.start_time = _str_to_date(inputs['start_time'])
+        tournament.address = inputs['address']
+        tournament.phases = inputs['phases']
+        tournament.total_entrants = inputs['total_entrants']
+        tournament.total_dqs = inputs['total_dqs']
+        tournament.participants = set(Entrant(id_, tag) for id_, tag in inputs['participants'])
+        tournament.dq_list = {player_id: [Entrant(id_, tag), num_dqs] for player_id, id_, tag, num_dqs in inputs['dq_list']}
+
+        return tournament
+
     def calculate_tier(self):
         """Calculates point value of event."""
 
         if self.tier != None:
             return self.tier
 
+        self.tier = self.score()
+
+        return self.tier
+
+    def score(self, dataset=None):
+        """Scores the fetched event against a dataset (the current one by default) without any network access."""
+
+        # Use one version of the dataset throughout, even if a new one is swapped in meanwhile
+        if dataset is None:
+            dataset = datasets.current
+
         # add things up
         total_score = 0
 
         # Entrant score
-        best_match = 0
-        best_region = None
-
-        for region in region_mults:
-            match = region.match(self.address, time=self.start_time)
-            # if match != 0:
-            #     print('{} {}'.format(match, str(region)))
-            if match > best_match:
-                best_region = region
-                best_match = match
+        with profiler.stage('region matching'):
+            best_region = find_region(dataset.regions, self.address, self.start_time)
 
         if self.start_time > NEW_MULT_SYSTEM_DATE:
             total_score += self.total_entrants
 
             if best_region.multiplier >= 2:
-                total_score += min(256, self.total_entrants)
+                total_score += min(ENTRANT_CAPS[0], self.total_entrants)
             if best_region.multiplier >= 3:
-                total_score += min(128, self.total_entrants)
+                total_score += min(ENTRANT_CAPS[1], self.total_entrants)
         else:
             total_score += self.total_entrants * best_region.multiplier
 
         # Player values
-        valued_participants = []
-        potential_matches = []
-
-        for participant in self.participants:
-            if participant.id_ in self.dq_list:
-                # Only count fully participating players towards points
-
-                continue
-            if participant.id_ in scored_players:
-                player_value = scored_players[participant.id_].retrieve_value(
-                    self, invitational=self.is_invitational)
-
-                if player_value != None:
-                    score = player_value.points
-
-                    total_score += score
-
-                    valued_participants.append(CountedValue(
-                        player_value, score, participant.tag))
-            elif participant.tag.lower() in scored_tags:
-                for player_value_group in scored_players.values():
-                    if player_value_group.match_tag(participant.tag):
-                        player_value = player_value_group.retrieve_value(self, invitational=self.is_invitational)
-
-                        if player_value != None:
-                            score = player_value.points
-                            potential_matches.append(PotentialMatchWithDqs(
-                                participant.tag, participant.id_, score, player_value.note, player_value.tag))
-
-        # Loop through players with DQs
-        participants_with_dqs = []
-
-        for participant, num_dqs in self.dq_list.values():
-            if participant.id_ in scored_players:
-                player_value = scored_players[participant.id_].retrieve_value(
-                    self, invitational=self.is_invitational)
-
-                if player_value != None:
-                    score = player_value.points
-
-                    participants_with_dqs.append(DisqualificationValue(
-                        CountedValue(player_value, score, participant.tag), num_dqs))
-            elif participant.tag.lower() in scored_tags:
-                for player_value_group in scored_players.values():
-                    if player_value_group.match_tag(participant.tag):
-                        player_value = player_value_group.retrieve_value(self, invitational=self.is_invitational)
-
-                        if player_value != None:
-                            score = player_value.points
-                            potential_matches.append(PotentialMatchWithDqs(
-                                participant.tag, participant.id_, score, player_value.note, player_value.tag, num_dqs))
+        with profiler.stage('player matching'):
+            valued_participants = []
+            potential_matches = []
+
+            for participant in self.participants:
+                if participant.id_ in self.dq_list:
+                    # Only count fully participating players towards points
+
+                    continue
+                if participant.id_ in dataset.players:
+                    player_value = dataset.players[participant.id_].retrieve_value(
+                        self, invitational=self.is_invitational)
+
+                    if player_value != None:
+                        score = player_value.points
+
+                        total_score += score
+
+                        valued_participants.append(CountedValue(
+                            player_value, score, participant.tag))
+                elif participant.tag.lower() in dataset.tags:
+                    for player_value_group in dataset.players.values():
+                        if player_value_group.match_tag(participant.tag):
+                            player_value = player_value_group.retrieve_value(self, invitational=self.is_invitational)
+
+                            if player_value != None:
+                                score = player_value.points
+                                potential_matches.append(PotentialMatchWithDqs(
+                                    participant.tag, participant.id_, score, player_value.note, player_value.tag))
+
+            # Loop through players with DQs
+            participants_with_dqs = []
+
+            for participant, num_dqs in self.dq_list.values():
+                if participant.id_ in dataset.players:
+                    player_value = dataset.players[participant.id_].retrieve_value(
+                        self, invitational=self.is_invitational)
+
+                    if player_value != None:
+                        score = player_value.points
+
+                        participants_with_dqs.append(DisqualificationValue(
+                            CountedValue(player_value, score, participant.tag), num_dqs))
+                elif participant.tag.lower() in dataset.tags:
+                    for player_value_group in dataset.players.values():
+                        if player_value_group.match_tag(participant.tag):
+                            player_value = player_value_group.retrieve_value(self, invitational=self.is_invitational)
+
+                            if player_value != None:
+                                score = player_value.points
+                                potential_matches.append(PotentialMatchWithDqs(
+                                    participant.tag, participant.id_, score, player_value.note, player_value.tag, num_dqs))
 
         # Sort for readability
         valued_participants.sort(key=lambda p: (-1 * p.points, p.player_value.category, p.player_value.note))
@@ -587,11 +797,11 @@ class Tournament:
             reverse=True, key=lambda p: (p.dqs, p.value.points))
         potential_matches.sort(key=lambda m: (m.dqs, m.tag))
 
-        self.tier = TournamentTieringResult(self.event_slug, total_score, self.total_entrants, best_region, valued_participants,
-                                            participants_with_dqs, potential_matches, self.start_time, is_invitational=self.is_invitational,
-                                            phases=[phase['name'] for phase in self.phases], dq_count=self.total_dqs)
-
-        return self.tier
+        return TournamentTieringResult(self.event_slug, total_score, self.total_entrants, best_region, valued_participants,
+                                       participants_with_dqs, potential_matches, self.start_time, is_invitational=self.is_invitational,
+                                       phases=[phase['name'] for phase in self.phases], dq_count=self.total_dqs,
+                                       tournament=self.tournament_name, event=self.event_name,
+                                       dataset_version=dataset.version)
 
 
 def entrants_query(event_slug, page_num=1, per_page=200):
@@ -710,11 +920,12 @@ def location_query(event_slug):
 
 
 def time_query(event_slug):
-    """Generates a query to retrieve the start time of an event.
+    """Generates a query to retrieve the start time and name of an event.
     """
 
     query = '''query getLoc($eventSlug: String!) {
   event(slug: $eventSlug) {
+    name
     startAt
   }
 }'''
@@ -725,6 +936,28 @@ def time_query(event_slug):
     return query, variables
 
 
+def tournament_info_query(tournament_slug):
+    """Generates a query to retrieve the tournament-level data shared by all of its events."""
+
+    query = '''query tournamentInfoQuery($tournamentSlug: String!) {
+  tournament(slug: $tournamentSlug) {
+    name
+    startAt
+    lat
+    lng
+    owner {
+      id
+      discriminator
+    }
+  }
+}'''
+    variables = '''{{
+        "tournamentSlug": "{}"
+    }}'''.format(tournament_slug)
+
+    return query, variables
+
+
 def name_query(event_slug):
     """Generates a query to retrieve tournament and event name given a slug."""
 
@@ -753,7 +986,8 @@ def get_sets_in_phases(event_slug, phase_ids):
     while True:
         query, variables = sets_query(
             event_slug, page_num=page, phases=phase_ids)
-        resp = send_request(query, variables)
+        with profiler.stage('set pagination'):
+            resp = send_request(query, variables)
 
         try:
             sets.extend(resp['data']['event']['sets']['nodes'])
@@ -788,6 +1022,29 @@ def check_phase_completed(event_slug):
     return False
 
 
+def event_state(event_slug):
+    """Returns a key describing a finished event's phases, or None if the event isn't finished.
+
+    A finished event's sets aren't expected to change, so the key only changes if the
+    event is reopened or its phases are edited. Raises EventNotFoundException if start.gg
+    has no such event.
+    """
+
+    query, variables = phase_list_query(event_slug)
+    resp = send_request(query, variables)
+
+    event = (resp.get('data') or {}).get('event')
+    if event is None:
+        raise EventNotFoundException('no event found for {}'.format(event_slug))
+
+    phases = [phase for phase in event['phases'] if not phase['isExhibition']]
+
+    if len(phases) == 0 or any(phase['state'] != 'COMPLETED' for phase in phases):
+        return None
+
+    return json.dumps([[phase['id'], phase['state']] for phase in phases])
+
+
 def collect_phases(event_slug):
     """Collects phases that are part of the main tournament.
     (Hopefully) excludes amateur brackets.
@@ -880,6 +1137,74 @@ def get_dqs(event_slug, phase_ids=None):
     return dq_list, participants
 
 
+def get_tournament_slug(event_slug):
+    """Returns the tournament slug (tournament/xyz) that an event slug belongs to."""
+
+    return event_slug.split('/event/')[0]
+
+
+def fetch_tournament_info(tournament_slug):
+    query, variables = tournament_info_query(tournament_slug)
+    resp = send_request(query, variables)
+
+    try:
+        tournament = resp['data']['tournament']
+        owner = tournament['owner'] if tournament['owner'] is not None else {}
+
+        return {'name': tournament['name'],
+                'start_at': tournament['startAt'],
+                'lat': tournament['lat'],
+                'lng': tournament['lng'],
+                'owner_id': owner.get('id'),
+                'owner_discriminator': owner.get('discriminator')}
+    except Exception as e:
+        print(e)
+        print(resp)
+        raise e
+
+
+def get_tournament_info(tournament_slug):
+    """Returns the name, start time, location and owner of a tournament.
+
+    Fetched once per tournament per run and shared by all of its events.
+    """
+
+    return tournament_info.get(tournament_slug, lambda: fetch_tournament_info(tournament_slug))
+
+
+def reverse_geocode(lat, lng):
+    if lat < -80:
+        return {'country_code': 'aq'}
+
+    geo = Nominatim(user_agent='ultrank', timeout=10)
+
+    # Try 5 times
+    for i in range(5):
+        geocode_budget.acquire()
+
+        try:
+            return geo.reverse('{}, {}'.format(lat, lng)).raw['address']
+        except Exception:
+            print(f'Nominatim error {i}')
+
+    raise GeocodingException('could not reverse geocode {}, {}'.format(lat, lng))
+
+
+def get_address(lat, lng):
+    """Returns the Nominatim address of a location, geocoding each location once per run."""
+
+    return geocoded_addresses.get((lat, lng), lambda: reverse_geocode(lat, lng))
+
+
+def coalescing_stats():
+    """Returns how many duplicate calls concurrent callers avoided by sharing one."""
+
+    return {'requests_sent': request_coalescer.calls,
+            'requests_absorbed': request_coalescer.absorbed,
+            'tournament_info_absorbed': tournament_info.absorbed,
+            'geocodes_absorbed': geocoded_addresses.absorbed}
+
+
 def get_name(event_slug):
     query, variables = name_query(event_slug)
     resp = send_request(query, variables)
@@ -887,13 +1212,21 @@ def get_name(event_slug):
     return {'event': resp['data']['event']['name'], 'tournament': resp['data']['event']['tournament']['name']}
 
 
-def read_players():
+async def calculate_tier_async(event_slug, is_invitational=False, location=True):
+    """Fetches and scores an event without blocking the event loop."""
+
+    tournament = await Tournament.fetch(event_slug, is_invitational, location)
+
+    return tournament.calculate_tier()
+
+
+def read_players(directory=DATA_DIRECTORY):
     players = {}
     tags = set()
     alt_tags = {}
 
     try:
-        with open('ultrank_tags.csv', newline='', encoding='utf-8') as tags_file:
+        with open(os.path.join(directory, 'ultrank_tags.csv'), newline='', encoding='utf-8') as tags_file:
             reader = csv.reader(tags_file)
 
             for row in reader:
@@ -911,7 +1244,7 @@ def read_players():
     except FileNotFoundError:
         pass
 
-    with open('ultrank_players.csv', newline='', encoding='utf-8') as players_file:
+    with open(os.path.join(directory, 'ultrank_players.csv'), newline='', encoding='utf-8') as players_file:
         reader = csv.DictReader(players_file)
 
         for row in reader:
@@ -939,11 +1272,11 @@ def read_players():
                     id_, slug, tag, other_tags=alt_tags.get(row['Player'], []))
                 players[id_] = player_value_group
 
-            players[id_].add_value(points, row['Category'], row['Note'], start_date, end_date)
+            players[id_].add_value(points, row['Category'], row['Note'], start_date, end_date, keep_sorted=False)
 
             tags.add(tag.lower())
 
-    with open('ultrank_invitational.csv', newline='', encoding='utf-8') as invit_file:
+    with open(os.path.join(directory, 'ultrank_invitational.csv'), newline='', encoding='utf-8') as invit_file:
         reader = csv.DictReader(invit_file)
 
         for row in reader:
@@ -966,15 +1299,19 @@ def read_players():
                 players[id_] = player_value_group
 
             players[id_].add_invitational_value(
-                    int(row['Additional Points']), note=row['Rank'], start_time=start_date, end_time=end_date)
+                    int(row['Additional Points']), note=row['Rank'], start_time=start_date, end_time=end_date,
+                    keep_sorted=False)
+
+    for player_value_group in players.values():
+        player_value_group.sort_values()
 
     return players, tags
 
 
-def read_regions():
+def read_regions(directory=DATA_DIRECTORY):
     regions = set()
 
-    with open('ultrank_regions.csv', newline='') as regions_file:
+    with open(os.path.join(directory, 'ultrank_regions.csv'), newline='') as regions_file:
         reader = csv.DictReader(regions_file)
 
         for row in reader:
@@ -989,10 +1326,207 @@ def read_regions():
     return regions
 
 
-scored_players, scored_tags = read_players()
-region_mults = read_regions()
+def hash_dataset_files(directory=DATA_DIRECTORY):
+    """Returns a hash of the dataset CSVs' contents. Missing files hash differently from empty ones."""
+
+    digest = hashlib.sha256(str(DATASET_FORMAT).encode())
+
+    for name in DATASET_FILES:
+        # Only the file name is hashed, so the version doesn't depend on where the data lives
+        digest.update(name.encode() + b'\0')
+        path = os.path.join(directory, name)
+
+        if os.path.exists(path):
+            with open(path, 'rb') as dataset_file:
+                digest.update(hashlib.sha256(dataset_file.read()).digest())
+        else:
+            digest.update(b'missing')
+
+    return digest.hexdigest()
+
+
+def compile_dataset(directory=DATA_DIRECTORY):
+    """Reads the CSVs into plain tuples that can be pickled regardless of which script is running."""
+
+    players, tags = read_players(directory)
+    regions = read_regions(directory)
+
+    # Share one object per distinct date so the pickle stores each date once
+    dates = {}
+
+    def intern(date):
+        return dates.setdefault(date, date)
+
+    compiled_players = [(group.id_, group.hex_, group.tag, group.other_tags,
+                         [(value.points, value.category, value.note, intern(value.start_time), intern(value.end_time))
+                          for value in group.values],
+                         [(value.points, value.note, intern(value.start_time), intern(value.end_time))
+                          for value in group.invitational_values])
+                        for group in players.values()]
+
+    compiled_regions = [(region.country_code, region.iso2, region.county, region.city, region.state_district,
+                         region.jp_postal, region.multiplier, region.note, intern(region.start_time),
+                         intern(region.end_time))
+                        for region in regions]
+
+    return {'players': compiled_players, 'tags': tags, 'regions': compiled_regions}
+
+
+def unpack_dataset(compiled):
+    """Rebuilds (players, tags, regions) from `compile_dataset` output."""
+
+    players = {}
+
+    for id_, hex_, tag, other_tags, values, invitational_values in compiled['players']:
+        group = PlayerValueGroup(id_, hex_, tag, other_tags)
+
+        # Values were compiled in sorted order
+        group.values = [PlayerValue(id_, hex_, tag, points, category, note, start_time, end_time)
+                        for points, category, note, start_time, end_time in values]
+        group.invitational_values = [PlayerValue(id_, hex_, tag, points, 'Invitational Value', note, start_time, end_time)
+                                     for points, note, start_time, end_time in invitational_values]
+
+        players[id_] = group
+
+    regions = set(RegionValue(*region) for region in compiled['regions'])
+
+    return players, compiled['tags'], regions
+
+
+def load_dataset(directory=DATA_DIRECTORY, cache_path=None):
+    """Returns (players, tags, regions, dataset hash), from the compiled snapshot when it matches the CSVs.
+
+    The snapshot (next to the CSVs by default) is rewritten whenever the CSVs' hash changes.
+    """
+
+    if cache_path is None:
+        cache_path = os.path.join(directory, DATASET_CACHE)
+
+    dataset_hash = hash_dataset_files(directory)
+
+    compiled = None
+
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                cached = pickle.loads(cache_file.read())
+
+            if cached['hash'] == dataset_hash:
+                compiled = cached['dataset']
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            compiled = None
+
+    if compiled is None:
+        compiled = compile_dataset(directory)
+
+        try:
+            temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+            with open(temp_path, 'wb') as cache_file:
+                pickle.dump({'hash': dataset_hash, 'dataset': compiled}, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print('could not save {}: {}'.format(cache_path, e))
+
+    players, tags, regions = unpack_dataset(compiled)
+
+    return players, tags, regions, dataset_hash
+
+
+class Dataset:
+    """One version of the player, tag and region data."""
+
+    def __init__(self, players, tags, regions, version):
+        self.players = players
+        self.tags = tags
+        self.regions = regions
+        self.version = version
+
+
+class DatasetManager:
+    """Holds the current dataset and swaps in a new one when the CSVs change.
+
+    Calculations take `current` once and use it throughout, so a swap never changes
+    the data under a calculation that is already running.
+    """
+
+    def __init__(self, directory=DATA_DIRECTORY, cache_path=None):
+        self.directory = directory
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.watcher = None
+
+        self.mtimes = self.read_mtimes()
+        self.current = None
+        self.swap(self.load())
+
+    def read_mtimes(self):
+        paths = [os.path.join(self.directory, name) for name in DATASET_FILES]
+
+        return [os.path.getmtime(path) if os.path.exists(path) else None for path in paths]
+
+    def load(self):
+        players, tags, regions, version = load_dataset(self.directory, self.cache_path)
+
+        return Dataset(players, tags, regions, version)
+
+    def swap(self, dataset):
+        self.current = dataset
+
+    def reload_if_changed(self):
+        """Loads and swaps in the CSVs if they changed. Returns True if a new version was swapped in.
+
+        If the new CSVs can't be read (for example while one is still being written),
+        the current version stays and the next call tries again.
+        """
+
+        with self.lock:
+            mtimes = self.read_mtimes()
+            if mtimes == self.mtimes:
+                return False
+
+            swapped = False
+
+            if hash_dataset_files(self.directory) != self.current.version:
+                self.swap(self.load())
+                print('loaded dataset version {}'.format(self.current.version[:12]))
+                swapped = True
+
+            self.mtimes = mtimes
+
+            return swapped
+
+    def watch(self, interval=DATASET_POLL_SECONDS):
+        """Checks the CSVs for changes every `interval` seconds in a background thread."""
+
+        if self.watcher is not None:
+            return
+
+        def poll():
+            while True:
+                time.sleep(interval)
+
+                try:
+                    self.reload_if_changed()
+                except Exception:
+                    traceback.print_exc()
+
+        self.watcher = threading.Thread(target=poll, daemon=True)
+        self.watcher.start()
+
+
+datasets = DatasetManager()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiers a single event.')
+    parser.add_argument('--profile', action='store_true',
+                        help='time each stage and write tts_values/profile.folded')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile, also write a cProfile to tts_values/profile.prof')
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler.enable(cprofile=args.cprofile)
+
     event_slug = input('input event url: ')
 
     is_invitational = input('is this an invitational? (y/n) ')
@@ -1006,3 +1540,5 @@ if __name__ == '__main__':
     print()
     print('Maximum potential total: {}'.format(
         int(result.max_potential_score())))
+
+    profiler.finish()